@@ -1,24 +1,305 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from datetime import datetime, timezone, timedelta
 import os
+import contextvars
 import logging
-from earthquake_data_fetcher import EarthquakeDataFetcher
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from earthquake_data_fetcher import get_fetcher
+from event_store import EventStore, EventSync, to_epoch_ms
+from spatial_index import SpatialIndex, RecentEventIndex, bounding_box, annotate_distance
+from heatmap import HeatmapTileCache, cell_size_for_zoom, viewport_cell_count, MAX_ZOOM
+from response_cache import ResponseCache
+from http_session import HttpClient
+from streaming import OUTPUT_FORMATS, batched, stream_response
+from event_batch import EventBatch
+from model_registry import RegionModelRegistry
+from training_jobs import JobStore, TrainingQueue
+import forecasters
+import event_stats
+from live_feed import FeedPoller, FeedFilter, USGS_HOUR_FEED, sse_events
+import json_codec
+from compression import ResponseCompressor, etag_for
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS, PROFILE_HEADER, timed, start_profile, stop_profile, server_timing
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    Flask's JSON provider encoding through json_codec (orjson when it's installed), with response serialization
+    timed as a metrics stage. Pretty-printed output, as in debug mode, still goes through the json module.
+    """
+
+    def dumps(self, obj, **kwargs):
+        with timed("serialization"):
+            if kwargs.keys() - {"separators"}:
+                return super().dumps(obj, **kwargs)
+            return json_codec.dumps(obj, default=self.default, sort_keys=self.sort_keys)
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s) if not kwargs else super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        with timed("serialization"):
+            body = json_codec.dumps_bytes(obj, default=self.default, sort_keys=self.sort_keys)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)
 
 DEFAULT_MAGNITUDE = float(os.environ.get("DEFAULT_MAGNITUDE", 3.0))
 DEFAULT_DAYS = int(os.environ.get("DEFAULT_DAYS", 7))
+WARM_UP_MODEL = os.environ.get("WARM_UP_MODEL", "false").lower() == "true"
+
+# Local event store, kept in sync with the USGS catalog by a background thread
+EVENT_STORE_ENABLED = os.environ.get("EVENT_STORE_ENABLED", "true").lower() == "true"
+EVENT_STORE_PATH = os.environ.get("EVENT_STORE_PATH", os.path.join(app.instance_path, "event_store.db"))  # Not the app's earthquake.db
+EVENT_SYNC_INTERVAL = int(os.environ.get("EVENT_SYNC_INTERVAL", 60))  # Seconds between incremental syncs
+EVENT_SYNC_HISTORY_DAYS = int(os.environ.get("EVENT_SYNC_HISTORY_DAYS", 365 * 5))
+EVENT_SYNC_MIN_MAGNITUDE = os.environ.get("EVENT_SYNC_MIN_MAGNITUDE")
+EVENT_SYNC_MIN_MAGNITUDE = float(EVENT_SYNC_MIN_MAGNITUDE) if EVENT_SYNC_MIN_MAGNITUDE else None
+# Seconds without a successful sync before queries go back to the API, a few missed intervals by default
+EVENT_STORE_MAX_SYNC_AGE = int(os.environ.get("EVENT_STORE_MAX_SYNC_AGE", EVENT_SYNC_INTERVAL * 5))
+
+event_store = EventStore(EVENT_STORE_PATH, EVENT_STORE_MAX_SYNC_AGE) if EVENT_STORE_ENABLED else None
+get_fetcher().event_store = event_store
+
+# Upstream HTTP settings, a slow USGS response fails after the read timeout instead of holding the worker
+USGS_CONNECT_TIMEOUT = float(os.environ.get("USGS_CONNECT_TIMEOUT", 3.05))
+USGS_READ_TIMEOUT = float(os.environ.get("USGS_READ_TIMEOUT", 30))
+USGS_RETRIES = int(os.environ.get("USGS_RETRIES", 3))
+USGS_POOL_SIZE = int(os.environ.get("USGS_POOL_SIZE", 10))
+USGS_CONDITIONAL_CACHE_MB = int(os.environ.get("USGS_CONDITIONAL_CACHE_MB", 32))  # Bodies kept for If-None-Match revalidation
+get_fetcher().http_client = HttpClient(USGS_CONNECT_TIMEOUT, USGS_READ_TIMEOUT, USGS_POOL_SIZE, USGS_RETRIES,
+                                       USGS_CONDITIONAL_CACHE_MB * 1024 * 1024)
+
+# Windows of at least SLICED_FETCH_MIN_DAYS are fetched as FETCH_WORKERS parallel time slices
+get_fetcher().max_fetch_workers = int(os.environ.get("FETCH_WORKERS", 4))
+get_fetcher().sliced_fetch_min_days = int(os.environ.get("SLICED_FETCH_MIN_DAYS", 30))
+
+# Cache of fetch results shared by identical queries, see /earthquakes/cache/stats
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 60))
+RESPONSE_CACHE_MAX_MB = int(os.environ.get("RESPONSE_CACHE_MAX_MB", 256))
+QUERY_TIME_QUANTUM = int(os.environ.get("QUERY_TIME_QUANTUM", 60))  # Seconds, query windows are rounded to this
+
+if RESPONSE_CACHE_ENABLED:
+    get_fetcher().response_cache = ResponseCache(RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_MB * 1024 * 1024)
+    get_fetcher().query_time_quantum = QUERY_TIME_QUANTUM
+
+# Response encoding: the JSON backend, gzip/brotli compression negotiated per request, and ETags for 304s
+JSON_BACKEND = json_codec.set_backend(os.environ.get("JSON_BACKEND", "orjson"))  # orjson falls back to json if not installed
+RESPONSE_COMPRESSION = os.environ.get("RESPONSE_COMPRESSION", "true").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+RESPONSE_ETAGS = os.environ.get("RESPONSE_ETAGS", "true").lower() == "true"
+
+response_compressor = ResponseCompressor(COMPRESSION_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY) if RESPONSE_COMPRESSION else None
+
+# Prediction models are trained and stored per MODEL_CELL_DEG x MODEL_CELL_DEG region
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", os.path.join(app.instance_path, "models"))
+MODEL_CELL_DEG = float(os.environ.get("MODEL_CELL_DEG", 2))
+MODEL_CACHE_SIZE = int(os.environ.get("MODEL_CACHE_SIZE", 16))  # Region models kept in memory
+PREDICT_BATCH_MAX_LOCATIONS = int(os.environ.get("PREDICT_BATCH_MAX_LOCATIONS", 100))  # Per /earthquakes/predict/batch request
+PREDICT_BATCH_FETCH_WORKERS = int(os.environ.get("PREDICT_BATCH_FETCH_WORKERS", 8))  # Locations whose history is fetched at once
+PREDICTION_HISTORY_DAYS = int(os.environ.get("PREDICTION_HISTORY_DAYS", 730))  # Past 2 years
+DEFAULT_FORECAST_ENGINE = os.environ.get("DEFAULT_FORECAST_ENGINE", "stats")  # stats needs no TensorFlow, lstm does
+# Input columns of newly trained models, comma separated from mag, depth and interval; mag is the prediction target
+MODEL_FEATURES = tuple(feature.strip() for feature in os.environ.get("MODEL_FEATURES", "mag").split(",") if feature.strip())
+get_fetcher().region_models = RegionModelRegistry(MODEL_REGISTRY_DIR, MODEL_CELL_DEG, MODEL_CACHE_SIZE)
+# Not the fetcher's slice executor: each region fetch waits on slices submitted there, which could deadlock it
+region_fetch_executor = ThreadPoolExecutor(max_workers=PREDICT_BATCH_FETCH_WORKERS, thread_name_prefix="region-fetch")
+get_fetcher().feature_columns = MODEL_FEATURES
+
+# Models are trained by TRAINING_WORKERS background processes, see /earthquakes/train
+TRAINING_ENABLED = os.environ.get("TRAINING_ENABLED", "true").lower() == "true"
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", 1))
+TRAINING_JOB_DB_PATH = os.environ.get("TRAINING_JOB_DB_PATH", os.path.join(app.instance_path, "training_jobs.db"))
+TRAINING_JOB_TIMEOUT = int(os.environ.get("TRAINING_JOB_TIMEOUT", 3600))  # Seconds before an unfinished job is considered lost
+training_queue = TrainingQueue(JobStore(TRAINING_JOB_DB_PATH, TRAINING_JOB_TIMEOUT), get_fetcher().region_models,
+                               TRAINING_WORKERS, MODEL_FEATURES) if TRAINING_ENABLED else None
+
+# One shared poller of the USGS real-time feed pushes new events to /earthquakes/stream clients
+LIVE_FEED_URL = os.environ.get("LIVE_FEED_URL", USGS_HOUR_FEED)
+LIVE_FEED_INTERVAL = int(os.environ.get("LIVE_FEED_INTERVAL", 30))  # Seconds between polls while clients are connected
+_feed_poller = None
+_feed_poller_lock = threading.Lock()
+
+NEARBY_DAYS = int(os.environ.get("NEARBY_DAYS", 150))
+NEARBY_RADIUS_KM = float(os.environ.get("NEARBY_RADIUS_KM", 222))  # Roughly the old ±2° box
+REGION_RADIUS_KM = float(os.environ.get("REGION_RADIUS_KM", 111))  # Roughly the old ±1° box
+HEATMAP_TILE_TTL = int(os.environ.get("HEATMAP_TILE_TTL", 60))  # Seconds a precomputed heatmap grid is reused
+HEATMAP_MAX_CELLS = int(os.environ.get("HEATMAP_MAX_CELLS", 64 * 64 * 64))  # Per aggregated response, about 64 map tiles
+HEATMAP_PRECOMPUTE_ZOOMS = [int(zoom) for zoom in os.environ.get("HEATMAP_PRECOMPUTE_ZOOMS", "").split(",") if zoom.strip()]
+heatmap_tiles = HeatmapTileCache(ttl_seconds=HEATMAP_TILE_TTL)
+nearby_index = RecentEventIndex(event_store, NEARBY_DAYS, EVENT_SYNC_INTERVAL) if event_store is not None else None
+_event_sync = None
+_event_sync_lock = threading.Lock()
+
+
+@app.before_request
+def start_request_timer():
+    """
+    Times every request for /metrics. Requests sending the X-Profile header also collect their stage timings,
+    returned in a Server-Timing header.
+    """
+    g.request_started = time.perf_counter()
+    g.profile = start_profile() if request.headers.get(PROFILE_HEADER) else None
+    if g.profile is None:
+        stop_profile()  # Server threads are reused, don't inherit a previous request's profile
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed bodies are produced after this point, so their time isn't included
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, endpoint=endpoint, status=response.status_code)
+    if g.get('profile') is not None:
+        response.headers['Server-Timing'] = server_timing(g.profile, elapsed)
+        stop_profile()
+    return response
+
+
+@app.after_request
+def encode_response(response):
+    """
+    Tags complete 200 responses with an ETag, answering 304 when the client already has that version, and
+    compresses the body for clients accepting gzip or brotli. Streamed bodies are compressed on the fly, without ETag.
+    Registered after record_request_metrics so that it runs first and its time is included.
+    """
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200 or response.direct_passthrough \
+            or 'Content-Encoding' in response.headers:
+        return response
+
+    encoding = None
+    if response_compressor is not None and response_compressor.compressible(response.mimetype):
+        response.vary.add('Accept-Encoding')
+        encoding = response_compressor.negotiate(request.headers.get('Accept-Encoding'))
+
+    if response.is_streamed:
+        if encoding is not None:
+            response.response = response_compressor.compress_chunks(response.response, encoding)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_BYTES:
+        encoding = None
+    if RESPONSE_ETAGS:
+        with timed("etag"):
+            response.set_etag(etag_for(body, encoding))
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response  # Nothing to compress
+    if encoding is not None:
+        with timed("compression"):
+            response.set_data(response_compressor.compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@REGISTRY.collector
+def collect_cache_stats():
+    """
+    Response cache and live feed state, read when /metrics is scraped.
+    """
+    response_cache = get_fetcher().response_cache
+    if response_cache is not None:
+        stats = response_cache.stats()
+        yield "earthquake_response_cache_hits_total", "counter", "Response cache hits.", stats["hits"]
+        yield "earthquake_response_cache_misses_total", "counter", "Response cache misses.", stats["misses"]
+        yield "earthquake_response_cache_coalesced_total", "counter", "Cache misses that waited for an identical in-flight load.", stats["coalesced"]
+        yield "earthquake_response_cache_evictions_total", "counter", "Entries evicted to stay under the memory bound.", stats["evictions"]
+        yield "earthquake_response_cache_entries", "gauge", "Entries in the response cache.", stats["entries"]
+        yield "earthquake_response_cache_bytes", "gauge", "Approximate memory held by the response cache.", stats["approx_bytes"]
+    if _feed_poller is not None:
+        yield "earthquake_stream_subscribers", "gauge", "Connected /earthquakes/stream clients.", _feed_poller.subscriber_count
+
+
+@app.before_request
+def start_event_sync():
+    """
+    Starts the background sync with the first request, so the reloader's parent process never runs one.
+    """
+    global _event_sync
+    if event_store is None or _event_sync is not None:
+        return
+    with _event_sync_lock:
+        if _event_sync is None:
+            _event_sync = EventSync(event_store, get_fetcher(),
+                                    interval_seconds=EVENT_SYNC_INTERVAL,
+                                    history_days=EVENT_SYNC_HISTORY_DAYS,
+                                    min_magnitude=EVENT_SYNC_MIN_MAGNITUDE)
+            _event_sync.start()
+
+
+def get_feed_poller():
+    """
+    Starts the feed poller with the first stream subscriber, like the event sync it never runs in the reloader's parent.
+    """
+    global _feed_poller
+    if _feed_poller is None:
+        with _feed_poller_lock:
+            if _feed_poller is None:
+                _feed_poller = FeedPoller(get_fetcher().http_client, LIVE_FEED_URL, LIVE_FEED_INTERVAL)
+                _feed_poller.start()
+    return _feed_poller
+
+
+def warm_up():
+    """
+    Loads the prediction model and precomputes heatmap grids. Called by the server at startup, before it accepts
+    requests (see __main__ below and the ASGI lifespan), or from a worker's post-fork hook. Not at import:
+    spawned training processes import this module again.
+    """
+    fetcher = get_fetcher()
+    if WARM_UP_MODEL:
+        if fetcher.model_registry.warm_up():
+            logging.info("Prediction model warmed up")
+        else:
+            logging.warning("No prediction model available to warm up")
+    for zoom in HEATMAP_PRECOMPUTE_ZOOMS:
+        if get_heatmap_grid(cell_size_for_zoom(zoom)) is None:
+            logging.warning(f"Could not precompute heatmap grid for zoom {zoom}")
+
+
+def parse_fields(value):
+    """
+    Property names from a comma separated fields parameter, e.g. "mag,time,place", or None to keep every property.
+    """
+    fields = tuple(field.strip() for field in (value or "").split(",") if field.strip())
+    return fields or None
+
+
+def select_fields(earthquakes, fields):
+    """
+    Copies of the earthquakes keeping only the listed properties, the id and geometry are always kept.
+    Lazy, so it can wrap a stream; without fields the earthquakes are passed through untouched.
+    """
+    if fields is None:
+        return earthquakes
+    return ({**earthquake, 'properties': {name: earthquake['properties'][name] for name in fields
+                                          if name in earthquake.get('properties', {})}}
+            for earthquake in earthquakes)
 
 
 @app.route('/earthquakes')
 def get_earthquakes():
     try:
-        fetcher = EarthquakeDataFetcher()
+        fetcher = get_fetcher()
 
         start_time = request.args.get('starttime')
         end_time = request.args.get('endtime')
@@ -35,6 +316,14 @@ def get_earthquakes():
         orderby = request.args.get('orderby')
         user_latitude = request.args.get('user_latitude', type=float)
         user_longitude = request.args.get('user_longitude', type=float)
+        output_format = request.args.get('format', 'json')
+        fields = parse_fields(request.args.get('fields'))  # Properties to keep, all by default
+
+        if output_format not in OUTPUT_FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(OUTPUT_FORMATS)}."}), 400
+        if user_latitude is not None and user_longitude is not None:
+            if not -90 <= user_latitude <= 90 or not -180 <= user_longitude <= 180:
+                return jsonify({"error": "user_latitude must be between -90 and 90, user_longitude between -180 and 180."}), 400
 
         if not start_time or not end_time:
             now = datetime.now(timezone.utc)
@@ -50,8 +339,21 @@ def get_earthquakes():
         except ValueError:
             return jsonify({"error": "Invalid starttime or endtime format. Use ISO 8601 format."}), 400
 
+        if output_format != "json" and limit is None and orderby in (None, "time", "time-asc"):
+            # Streamed one time slice at a time without building the full list, newest first by default like json
+            try:
+                earthquakes = fetcher.iter_earthquakes_sliced(start_time, end_time, min_magnitude, max_magnitude,
+                                                              min_latitude, max_latitude, min_longitude, max_longitude,
+                                                              descending=orderby != "time-asc")
+                if user_latitude is not None and user_longitude is not None:
+                    earthquakes = fetcher.iter_annotated_distances(user_latitude, user_longitude, earthquakes)
+                return stream_response(select_fields(earthquakes, fields), output_format)
+            except Exception as e:
+                logging.error(f"Error fetching earthquakes: {e}")
+                return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
+
         try:
-            earthquakes = fetcher.fetch_earthquakes(
+            earthquakes = fetcher.fetch_earthquakes_sliced(
                 start_time=start_time,
                 end_time=end_time,
                 min_magnitude=min_magnitude,
@@ -71,15 +373,11 @@ def get_earthquakes():
             return jsonify({"error": "Could not retrieve earthquake data"}), 500
 
         if user_latitude is not None and user_longitude is not None:
-            for earthquake in earthquakes:
-                try:
-                    distance = fetcher.calculate_distance(user_latitude, user_longitude, earthquake)
-                    earthquake['properties']['distance_km'] = distance if distance is not None else None
-                except Exception as e:
-                    logging.warning(f"Error calculating distance for earthquake {earthquake.get('id')}: {e}")
-                    earthquake['properties']['distance_km'] = None
+            earthquakes = fetcher.annotate_distances(user_latitude, user_longitude, earthquakes)
 
-        return jsonify(earthquakes)
+        if output_format != "json":
+            return stream_response(select_fields(earthquakes, fields), output_format)
+        return jsonify(list(select_fields(earthquakes, fields)))
 
     except ValueError as e:
         return jsonify({"error": f"Invalid parameter type: {e}"}), 400
@@ -88,10 +386,27 @@ def get_earthquakes():
         return jsonify({"error": "An internal server error occurred"}), 500
 
 
+def get_heatmap_grid(cell_deg, min_magnitude=None, max_magnitude=None):
+    """
+    Returns the worldwide HeatmapGrid of the last DEFAULT_DAYS, computed once per HEATMAP_TILE_TTL and shared between
+    requests. The window is aligned to the TTL so that requests share a cache entry.
+    """
+    now = datetime.fromtimestamp(int(datetime.now(timezone.utc).timestamp()) // HEATMAP_TILE_TTL * HEATMAP_TILE_TTL, tz=timezone.utc)
+    start_time = (now - timedelta(days=DEFAULT_DAYS)).isoformat()
+    end_time = now.isoformat()
+
+    def compute():
+        earthquakes = get_fetcher().fetch_event_batch(start_time=start_time, end_time=end_time,
+                                                      min_magnitude=min_magnitude, max_magnitude=max_magnitude)
+        return get_fetcher().get_heatmap_grid(earthquakes, cell_deg) if earthquakes is not None else None
+
+    return heatmap_tiles.get_or_compute((cell_deg, start_time, end_time, min_magnitude, max_magnitude), compute)
+
+
 @app.route('/earthquakes/heatmap')
 def get_earthquake_heatmap_data():
     try:
-        fetcher = EarthquakeDataFetcher()
+        fetcher = get_fetcher()
 
         start_time = request.args.get('starttime')
         end_time = request.args.get('endtime')
@@ -106,13 +421,45 @@ def get_earthquake_heatmap_data():
 
         limit = request.args.get('limit', type=int)
 
+        # Aggregated mode: one row per grid cell instead of one per event
+        zoom = request.args.get('zoom', type=int)
+        cell_deg = request.args.get('cell_deg', type=float)
+
+        if zoom is not None or cell_deg is not None:
+            if cell_deg is None:
+                if not 0 <= zoom <= MAX_ZOOM:
+                    return jsonify({"error": f"zoom must be between 0 and {MAX_ZOOM}."}), 400
+                cell_deg = cell_size_for_zoom(zoom)
+            elif not cell_size_for_zoom(MAX_ZOOM) <= cell_deg <= 180:
+                # Finer cells would make the grid for a worldwide window too large to hold
+                return jsonify({"error": f"cell_deg must be between {cell_size_for_zoom(MAX_ZOOM):g} and 180."}), 400
+            if viewport_cell_count(cell_deg, min_latitude, max_latitude, min_longitude, max_longitude) > HEATMAP_MAX_CELLS:
+                return jsonify({"error": f"The viewport spans more than {HEATMAP_MAX_CELLS} cells at this zoom, pass a smaller "
+                                         "minlatitude/maxlatitude/minlongitude/maxlongitude box or a lower zoom."}), 400
+            try:
+                if start_time and end_time:
+                    # A requested window is only fetched for the viewport, the shared worldwide grid is the default window's
+                    earthquakes = fetcher.fetch_event_batch(start_time=start_time, end_time=end_time,
+                                                            min_magnitude=min_magnitude, max_magnitude=max_magnitude,
+                                                            min_latitude=min_latitude, max_latitude=max_latitude,
+                                                            min_longitude=min_longitude, max_longitude=max_longitude)
+                    grid = fetcher.get_heatmap_grid(earthquakes, cell_deg) if earthquakes is not None else None
+                else:
+                    grid = get_heatmap_grid(cell_deg, min_magnitude, max_magnitude)
+            except Exception as e:
+                logging.error(f"Error aggregating earthquakes for heatmap: {e}")
+                return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
+            if grid is None:
+                return jsonify({"error": "Could not retrieve earthquake data"}), 500
+            return jsonify(grid.to_json(min_latitude, max_latitude, min_longitude, max_longitude))
+
         if not start_time or not end_time:
             now = datetime.now(timezone.utc)
             start_time = (now - timedelta(days=DEFAULT_DAYS)).isoformat()
             end_time = now.isoformat()
 
         try:
-            earthquakes = fetcher.fetch_earthquakes(
+            earthquakes = fetcher.fetch_event_batch(
                 start_time=start_time,
                 end_time=end_time,
                 min_magnitude=min_magnitude,
@@ -144,78 +491,149 @@ def get_earthquake_heatmap_data():
 @app.route('/earthquakes/nearby')
 def get_earthquakes_nearby():
     try:
-        fetcher = EarthquakeDataFetcher()
+        fetcher = get_fetcher()
 
         latitude = request.args.get('latitude', type=float)
         longitude = request.args.get('longitude', type=float)
+        radius_km = request.args.get('radius_km', type=float)
+        k = request.args.get('k', type=int)  # Only return the k nearest, at any distance unless radius_km is given
+        fields = parse_fields(request.args.get('fields'))
 
         if latitude is None or longitude is None:
             return jsonify({"error": "Latitude and longitude are required parameters."}), 400
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            return jsonify({"error": "Latitude must be between -90 and 90, longitude between -180 and 180."}), 400
+        if (radius_km is not None and radius_km <= 0) or (k is not None and k <= 0):
+            return jsonify({"error": "radius_km and k must be positive."}), 400
 
         now = datetime.now(timezone.utc)
-        start_time = (now - timedelta(days=150)).isoformat()
+        start_time = now - timedelta(days=NEARBY_DAYS)
 
-        # Define a wider search radius (in degrees)
-        search_radius = 2  # Increased from 1 to 2 degrees
-
-        try:
-            earthquakes = fetcher.fetch_earthquakes(
-                start_time=start_time,
-                end_time=now.isoformat(),
-                min_latitude=latitude - search_radius,  # Wider range
-                max_latitude=latitude + search_radius,  # Wider range
-                min_longitude=longitude - search_radius,  # Wider range
-                max_longitude=longitude + search_radius   # Wider range
-            )
-        except Exception as e:
-            logging.error(f"Error fetching nearby earthquakes: {e}")
-            return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
-
-        if earthquakes is None:
-            return jsonify({"error": "Could not retrieve earthquake data"}), 500
-
-        # Calculate distance and add to response
-        for earthquake in earthquakes:
+        # Answer from the shared index over recent events when the event store has them
+        index = nearby_index.get() if nearby_index is not None else None
+        if index is None:
+            # Without the index only the default radius is fetched, the k nearest anywhere would need the whole catalog
+            min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude,
+                                                                                    radius_km or NEARBY_RADIUS_KM)
             try:
-                distance = fetcher.calculate_distance(latitude, longitude, earthquake)
-                earthquake['properties']['distance_km'] = distance if distance is not None else None
+                earthquakes = fetcher.fetch_earthquakes_sliced(  # Split in slices if the API's search limit is hit
+                    start_time=start_time.isoformat(),
+                    end_time=now.isoformat(),
+                    min_latitude=min_latitude,
+                    max_latitude=max_latitude,
+                    min_longitude=min_longitude,
+                    max_longitude=max_longitude
+                )
             except Exception as e:
-                logging.warning(f"Error calculating distance for earthquake {earthquake.get('id')}: {e}")
-                earthquake['properties']['distance_km'] = None
+                logging.error(f"Error fetching nearby earthquakes: {e}")
+                return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
+
+            if earthquakes is None:
+                return jsonify({"error": "Could not retrieve earthquake data"}), 500
+            index = SpatialIndex(earthquakes)
 
-        return jsonify(earthquakes)
+        # The shared index may be up to one refresh interval old, so trim to the exact window
+        start_ms = int(start_time.timestamp() * 1000)
+        if k is not None and radius_km is None:
+            matches = index.nearest(latitude, longitude, k)
+        else:
+            matches = index.within_radius(latitude, longitude, radius_km or NEARBY_RADIUS_KM, k=k)
+        return jsonify(list(select_fields((annotate_distance(earthquake, distance) for earthquake, distance in matches
+                                           if earthquake['properties']['time'] >= start_ms), fields)))
 
     except ValueError as e:
         return jsonify({"error": f"Invalid parameter type: {e}"}), 400
     except Exception as e:
         logging.exception(f"An unhandled error occurred: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
-    
+
+
+def prediction_window():
+    """
+    (start, end) datetimes of the history predictions are made from.
+    """
+    now = datetime.now(timezone.utc)
+    return now - timedelta(days=PREDICTION_HISTORY_DAYS), now
+
+
+def fetch_region_events(fetcher, latitude, longitude, window=None):
+    """
+    Events of the prediction window within REGION_RADIUS_KM of the point, as an EventBatch, which the prediction
+    models are trained and run on. Returns None if the data couldn't be retrieved.
+    """
+    start, end = window or prediction_window()
+    start_time = start.isoformat()
+    end_time = end.isoformat()
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, REGION_RADIUS_KM)
+
+    earthquakes = fetcher.fetch_event_batch(
+        start_time=start_time,
+        end_time=end_time,
+        min_latitude=min_latitude,
+        max_latitude=max_latitude,
+        min_longitude=min_longitude,
+        max_longitude=max_longitude,
+        orderby="time"  # Important: Order by time for prediction
+    )
+    if earthquakes is None:
+        return None
+
+    # Keep the events within a true radius, the box above is only a coarse prefilter
+    return earthquakes.take(fetcher.calculate_distances(latitude, longitude, earthquakes.coordinates) <= REGION_RADIUS_KM)
+
+
+def predict_from_events(fetcher, earthquakes, latitude, longitude, engine, retrain, window):
+    """
+    The /earthquakes/predict response for the region's events, as (payload, status). Shared with the ASGI app.
+    """
+    if len(earthquakes) < 2:
+        return {"error": "Not enough earthquakes to make a prediction. Need at least 2"}, 200
+
+    if engine == "stats":
+        with timed("forecast"):
+            prediction = forecasters.forecast(earthquakes, *(int(moment.timestamp() * 1000) for moment in window))
+        if prediction is None:
+            return {"error": "Not enough earthquakes with a magnitude to make a prediction."}, 200
+        return prediction, 200
+
+    region = fetcher.region_models.cell_for(latitude, longitude) if fetcher.region_models is not None else None
+    if training_queue is None or region is None:
+        prediction = fetcher.predict_next_earthquake_ml(earthquakes, retrain, region) #Pass the earthquakes into the ml predictor
+        if prediction is None:
+            return {"error": "Could not generate prediction."}, 500
+        return prediction, 200
+
+    # Training runs in the background, meanwhile predictions come from the last good model or the shared one
+    job = None
+    if retrain or not fetcher.has_region_model(region):
+        job = training_queue.submit(region, earthquakes)
+    if not fetcher.has_model(region):
+        return {"message": "No model is available for this region yet, training has started.", "job": job}, 202
+
+    prediction = fetcher.predict_next_earthquake_ml(earthquakes, False, region)
+    if prediction is None:
+        return {"error": "Could not generate prediction."}, 500
+    if job is not None:
+        prediction["training_job"] = job
+    return prediction, 200
+
 
 @app.route('/earthquakes/predict')
 def predict_earthquake():
     try:
-        fetcher = EarthquakeDataFetcher()
+        fetcher = get_fetcher()
         latitude = request.args.get('latitude', type=float)
         longitude = request.args.get('longitude', type=float)
         retrain = request.args.get('retrain', type=bool, default=False) #Added retrain boolean
+        engine = request.args.get('engine', DEFAULT_FORECAST_ENGINE)
         if latitude is None or longitude is None:
             return jsonify({"error": "Latitude and longitude are required parameters."}), 400
+        if engine not in forecasters.FORECAST_ENGINES:
+            return jsonify({"error": f"engine must be one of {', '.join(forecasters.FORECAST_ENGINES)}."}), 400
 
-        now = datetime.now(timezone.utc)
-        start_time = (now - timedelta(days=730)).isoformat()  # Past 2 years (730 days)
-        end_time = now.isoformat()
-
+        window = prediction_window()
         try:
-            earthquakes = fetcher.fetch_earthquakes(
-                start_time=start_time,
-                end_time=end_time,
-                min_latitude=latitude - 1,  # Adjust the range as needed
-                max_latitude=latitude + 1,
-                min_longitude=longitude - 1,
-                max_longitude=longitude + 1,
-                orderby="time"  # Important: Order by time for prediction
-            )
+            earthquakes = fetch_region_events(fetcher, latitude, longitude, window)
         except Exception as e:
             logging.error(f"Error fetching earthquakes for prediction: {e}")
             return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
@@ -223,61 +641,221 @@ def predict_earthquake():
         if earthquakes is None:
             return jsonify({"error": "Could not retrieve earthquake data"}), 500
 
-        if len(earthquakes) < 2:
-            return jsonify({"error": "Not enough earthquakes to make a prediction. Need at least 2"})
+        payload, status = predict_from_events(fetcher, earthquakes, latitude, longitude, engine, retrain, window)
+        return jsonify(payload), status
+
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter type: {e}"}), 400
+    except Exception as e:
+        logging.exception(f"An unhandled error occurred during prediction: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/earthquakes/predict/batch', methods=['POST'])
+def predict_earthquakes_batch():
+    """
+    Predictions for a list of locations, e.g. {"locations": [{"latitude": 35.6, "longitude": 139.7}, ...]}.
+    Locations sharing a model are predicted in one batched model call; results come back in request order.
+    """
+    try:
+        fetcher = get_fetcher()
+        body = request.get_json(silent=True) or {}
+        locations = body.get('locations')
+        compiled = body.get('compiled', True)
+        engine = body.get('engine', DEFAULT_FORECAST_ENGINE)
+        if not isinstance(locations, list) or not locations:
+            return jsonify({"error": "locations must be a non-empty list of {latitude, longitude} objects."}), 400
+        if len(locations) > PREDICT_BATCH_MAX_LOCATIONS:
+            return jsonify({"error": f"At most {PREDICT_BATCH_MAX_LOCATIONS} locations can be predicted at once."}), 400
+        if engine not in forecasters.FORECAST_ENGINES:
+            return jsonify({"error": f"engine must be one of {', '.join(forecasters.FORECAST_ENGINES)}."}), 400
 
-        prediction = fetcher.predict_next_earthquake_ml(earthquakes, retrain) #Pass the earthquakes into the ml predictor
+        points = []
+        for location in locations:
+            if not isinstance(location, dict) or location.get('latitude') is None or location.get('longitude') is None:
+                return jsonify({"error": "Each location needs a latitude and a longitude."}), 400
+            latitude, longitude = float(location['latitude']), float(location['longitude'])
+            if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+                return jsonify({"error": "Latitude must be between -90 and 90, longitude between -180 and 180."}), 400
+            points.append((latitude, longitude))
 
-        if prediction is None:
-            return jsonify({"error": "Could not generate prediction."}), 500
+        window = prediction_window()
+        try:
+            # Concurrently, identical regions share one upstream request through the response cache
+            futures = [region_fetch_executor.submit(contextvars.copy_context().run, fetch_region_events, fetcher,
+                                                    latitude, longitude, window) for latitude, longitude in points]
+            batches = [future.result() for future in futures]
+        except Exception as e:
+            logging.error(f"Error fetching earthquakes for prediction: {e}")
+            return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
 
-        return jsonify(prediction)
+        if any(earthquakes is None for earthquakes in batches):
+            return jsonify({"error": "Could not retrieve earthquake data"}), 500
+
+        if engine == "stats":
+            start_ms, end_ms = (int(moment.timestamp() * 1000) for moment in window)
+            results = []
+            for (latitude, longitude), earthquakes in zip(points, batches):
+                result = {"latitude": latitude, "longitude": longitude}
+                result.update(forecasters.forecast(earthquakes, start_ms, end_ms) or
+                              {"error": "Not enough earthquakes to make a prediction."})
+                results.append(result)
+            return jsonify({"predictions": results})
+
+        regions = None
+        if fetcher.region_models is not None:
+            regions = [fetcher.region_models.cell_for(latitude, longitude) for latitude, longitude in points]
+        predictions = fetcher.predict_batch(batches, regions, compiled=bool(compiled))
+
+        results = []
+        for index, ((latitude, longitude), prediction) in enumerate(zip(points, predictions)):
+            result = {"latitude": latitude, "longitude": longitude}
+            region = regions[index] if regions is not None else None
+            if prediction is None and fetcher.has_model(region):
+                result["error"] = "Not enough earthquakes to make a prediction."
+                results.append(result)
+                continue
+
+            job = None
+            if training_queue is not None and not fetcher.has_region_model(region) and region is not None:
+                job = training_queue.submit(region, batches[index])  # Even when the shared model answered meanwhile
+            if prediction is not None:
+                result.update(prediction)
+                if job is not None:
+                    result["training_job"] = job
+            else:
+                result["error"] = "No model is available for this location."
+                if job is not None:
+                    result["job"] = job
+            results.append(result)
+
+        return jsonify({"predictions": results})
 
     except ValueError as e:
         return jsonify({"error": f"Invalid parameter type: {e}"}), 400
     except Exception as e:
-        logging.exception(f"An unhandled error occurred during prediction: {e}")
+        logging.exception(f"An unhandled error occurred during batch prediction: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
 
 
+@app.route('/earthquakes/train', methods=['POST'])
+def submit_training():
+    """
+    Queues training of the model for the region containing latitude and longitude (query or JSON body).
+    A region that is already being trained returns its existing job.
+    """
+    try:
+        if training_queue is None:
+            return jsonify({"error": "Background training is disabled."}), 404
+        fetcher = get_fetcher()
+        params = request.get_json(silent=True) or request.args
+        if params.get('latitude') is None or params.get('longitude') is None:
+            return jsonify({"error": "Latitude and longitude are required parameters."}), 400
+        latitude = float(params.get('latitude'))
+        longitude = float(params.get('longitude'))
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            return jsonify({"error": "Latitude must be between -90 and 90, longitude between -180 and 180."}), 400
+
+        try:
+            earthquakes = fetch_region_events(fetcher, latitude, longitude)
+        except Exception as e:
+            logging.error(f"Error fetching earthquakes for training: {e}")
+            return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
+
+        if earthquakes is None:
+            return jsonify({"error": "Could not retrieve earthquake data"}), 500
+
+        job = training_queue.submit(fetcher.region_models.cell_for(latitude, longitude), earthquakes)
+        return jsonify(job), 202, {"Location": f"/earthquakes/train/{job['id']}"}
+
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter type: {e}"}), 400
+    except Exception as e:
+        logging.exception(f"An unhandled error occurred while submitting training: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/earthquakes/train/<job_id>')
+def get_training_job(job_id):
+    if training_queue is None:
+        return jsonify({"error": "Background training is disabled."}), 404
+    job = training_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Training job not found."}), 404
+    return jsonify(job)
+
+
+@app.route('/earthquakes/train/<job_id>/result')
+def get_training_result(job_id):
+    """
+    The model version a finished job produced. Unfinished jobs answer 202 with their status.
+    """
+    if training_queue is None:
+        return jsonify({"error": "Background training is disabled."}), 404
+    job = training_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Training job not found."}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": f"Training failed: {job['error']}", "job": job}), 500
+    if job["status"] != "succeeded":
+        return jsonify(job), 202
+    return jsonify({"region": job["region"], "model_version": job["model_version"], "finished_at": job["finished_at"]})
+
+
 @app.route('/earthquakes/data')
 def earthquake_data():
     try:
-        fetcher = EarthquakeDataFetcher()
+        fetcher = get_fetcher()
         latitude = request.args.get('latitude', type=float)
         longitude = request.args.get('longitude', type=float)
+        output_format = request.args.get('format', 'json')
+        fields = parse_fields(request.args.get('fields'))
 
         if latitude is None or longitude is None:
             return jsonify({"error": "Latitude and longitude are required parameters."}), 400
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            return jsonify({"error": "Latitude must be between -90 and 90, longitude between -180 and 180."}), 400
+        if output_format not in OUTPUT_FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(OUTPUT_FORMATS)}."}), 400
 
         now = datetime.now(timezone.utc)
         start_time = (now - timedelta(days=365 * 5)).isoformat()  # Fetch past 5 years of data
         end_time = now.isoformat()
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, REGION_RADIUS_KM)
+
+        if output_format != "json":
+            return stream_earthquake_data(fetcher, latitude, longitude, start_time, end_time, min_latitude,
+                                          max_latitude, min_longitude, max_longitude, output_format, fields)
 
         try:
-            earthquakes = fetcher.fetch_earthquakes(
+            earthquakes = fetcher.fetch_earthquakes_sliced(
                 start_time=start_time,
                 end_time=end_time,
-                min_latitude=latitude - 1,
-                max_latitude=latitude + 1,
-                min_longitude=longitude - 1,
-                max_longitude=longitude + 1,
+                min_latitude=min_latitude,
+                max_latitude=max_latitude,
+                min_longitude=min_longitude,
+                max_longitude=max_longitude,
                 orderby="time"
             )
         except Exception as e:
             logging.error(f"Error fetching earthquake data: {e}")
             return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
 
+        if earthquakes is not None:
+            distances = fetcher.calculate_distances(latitude, longitude, fetcher.extract_coordinates(earthquakes))
+            earthquakes = [earthquake for earthquake, distance in zip(earthquakes, distances.tolist())
+                           if distance <= REGION_RADIUS_KM]  # False for NaN
+
         if earthquakes is None or len(earthquakes) == 0:
             return jsonify({
                 "earthquakes": [],
                 "highest_magnitude": 0
             })
 
-        highest_magnitude = max(earthquake['properties']['mag'] for earthquake in earthquakes if 'properties' in earthquake and 'mag' in earthquake['properties'])
+        highest_magnitude = EventBatch.from_features(earthquakes).highest_magnitude()
 
         return jsonify({
-            "earthquakes": earthquakes,
+            "earthquakes": list(select_fields(earthquakes, fields)),
             "highest_magnitude": highest_magnitude
         })
     
@@ -287,7 +865,165 @@ def earthquake_data():
         logging.exception(f"An unhandled error occurred: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
 
+
+def iter_earthquakes_in_radius(fetcher, latitude, longitude, start_time, end_time, min_latitude, max_latitude,
+                               min_longitude, max_longitude, highest):
+    """
+    Yields the events within REGION_RADIUS_KM of a point newest first, filtered one batch at a time, and keeps
+    highest["magnitude"] up to date for the end of the stream.
+    """
+    earthquakes = fetcher.iter_earthquakes_sliced(start_time, end_time, min_latitude=min_latitude,
+                                                  max_latitude=max_latitude, min_longitude=min_longitude,
+                                                  max_longitude=max_longitude, descending=True)
+    for batch in batched(earthquakes, 1000):
+        distances = fetcher.calculate_distances(latitude, longitude, fetcher.extract_coordinates(batch))
+        for earthquake, distance in zip(batch, distances.tolist()):
+            if distance <= REGION_RADIUS_KM:  # False for NaN
+                magnitude = earthquake.get('properties', {}).get('mag')
+                if magnitude is not None and magnitude > highest["magnitude"]:
+                    highest["magnitude"] = magnitude
+                yield earthquake
+
+
+def stream_earthquake_data(fetcher, latitude, longitude, start_time, end_time, min_latitude, max_latitude,
+                           min_longitude, max_longitude, output_format, fields=None):
+    """
+    Streamed /earthquakes/data: events newest first like the json response, with highest_magnitude written once
+    all of them have been sent.
+    """
+    highest = {"magnitude": 0}
+    earthquakes = iter_earthquakes_in_radius(fetcher, latitude, longitude, start_time, end_time, min_latitude,
+                                             max_latitude, min_longitude, max_longitude, highest)
+    try:
+        return stream_response(select_fields(earthquakes, fields), output_format,
+                               prefix='{"earthquakes":[',
+                               suffix=lambda: '],"highest_magnitude":' + json_codec.dumps(highest["magnitude"]) + '}',
+                               trailer=lambda: {"highest_magnitude": highest["magnitude"]})
+    except Exception as e:
+        logging.error(f"Error fetching earthquake data: {e}")
+        return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
+
+
+@app.route('/earthquakes/stats')
+def get_earthquake_stats():
+    """
+    Server-side summaries instead of raw events: time-bucketed counts, max magnitude and energy, magnitude and
+    depth histograms and totals. The area is a bounding box, or latitude/longitude with radius_km.
+    """
+    try:
+        fetcher = get_fetcher()
+
+        start_time = request.args.get('starttime')
+        end_time = request.args.get('endtime')
+        min_magnitude = request.args.get('minmagnitude', type=float)
+        max_magnitude = request.args.get('maxmagnitude', type=float)
+
+        min_latitude = request.args.get('minlatitude', type=float)
+        max_latitude = request.args.get('maxlatitude', type=float)
+        min_longitude = request.args.get('minlongitude', type=float)
+        max_longitude = request.args.get('maxlongitude', type=float)
+        latitude = request.args.get('latitude', type=float)
+        longitude = request.args.get('longitude', type=float)
+        radius_km = request.args.get('radius_km', type=float, default=REGION_RADIUS_KM)
+
+        bucket = request.args.get('bucket', '1d')
+        magnitude_bin = request.args.get('magnitude_bin', type=float, default=0.5)
+        depth_bin = request.args.get('depth_bin', type=float, default=10.0)
+        if magnitude_bin <= 0 or depth_bin <= 0:
+            return jsonify({"error": "magnitude_bin and depth_bin must be positive."}), 400
+
+        if (latitude is None) != (longitude is None):
+            return jsonify({"error": "latitude and longitude must be given together."}), 400
+        if latitude is not None:
+            if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+                return jsonify({"error": "Latitude must be between -90 and 90, longitude between -180 and 180."}), 400
+            if radius_km <= 0:
+                return jsonify({"error": "radius_km must be positive."}), 400
+            min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+
+        if not start_time or not end_time:
+            now = datetime.now(timezone.utc)
+            start_time = (now - timedelta(days=DEFAULT_DAYS)).isoformat()
+            end_time = now.isoformat()
+
+        start_ms, end_ms = to_epoch_ms(start_time), to_epoch_ms(end_time)
+        try:
+            bucket_ms = event_stats.parse_bucket(bucket)
+            event_stats.count_buckets(start_ms, end_ms, bucket_ms)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            earthquakes = fetcher.fetch_event_batch(
+                start_time=start_time,
+                end_time=end_time,
+                min_magnitude=min_magnitude,
+                max_magnitude=max_magnitude,
+                min_latitude=min_latitude,
+                max_latitude=max_latitude,
+                min_longitude=min_longitude,
+                max_longitude=max_longitude
+            )
+        except Exception as e:
+            logging.error(f"Error fetching earthquakes for statistics: {e}")
+            return jsonify({"error": "Failed to fetch earthquake data from the API"}), 500
+
+        if earthquakes is None:
+            return jsonify({"error": "Could not retrieve earthquake data"}), 500
+
+        if latitude is not None:
+            earthquakes = earthquakes.take(fetcher.calculate_distances(latitude, longitude, earthquakes.coordinates) <= radius_km)
+
+        return jsonify(event_stats.summarize(earthquakes, start_ms, end_ms, bucket_ms, magnitude_bin, depth_bin))
+
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter type: {e}"}), 400
+    except Exception as e:
+        logging.exception(f"An unhandled error occurred while computing statistics: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/earthquakes/stream')
+def stream_earthquakes():
+    """
+    Server-Sent Events of new and updated earthquakes, filtered by minmagnitude and an optional bounding box
+    (minlongitude > maxlongitude crosses the antimeridian). Reconnecting clients resume from Last-Event-ID.
+    """
+    try:
+        feed_filter = FeedFilter(
+            min_magnitude=request.args.get('minmagnitude', type=float),
+            min_latitude=request.args.get('minlatitude', type=float),
+            max_latitude=request.args.get('maxlatitude', type=float),
+            min_longitude=request.args.get('minlongitude', type=float),
+            max_longitude=request.args.get('maxlongitude', type=float),
+        )
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+        return Response(sse_events(get_feed_poller(), feed_filter, last_event_id), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})  # No proxy buffering
+
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter type: {e}"}), 400
+    except Exception as e:
+        logging.exception(f"An unhandled error occurred while opening the stream: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/earthquakes/cache/stats')
+def get_cache_stats():
+    response_cache = get_fetcher().response_cache
+    if response_cache is None:
+        return jsonify({"error": "The response cache is disabled."}), 404
+    return jsonify(response_cache.stats())
+
 if __name__ == '__main__':
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":  # In the reloader's child, which serves, not its parent
+        warm_up()
     app.run(debug=True, host='0.0.0.0')
 
 
@@ -0,0 +1,395 @@
+"""
+Async serving mode for the API. The upstream-bound routes (/earthquakes, /earthquakes/data and /earthquakes/predict)
+run the shared EarthquakeDataFetcher and their CPU work (distances, prediction, serialization) on a bounded pool of
+ASGI_FETCH_THREADS, and stream their large responses slice by slice. /earthquakes/stream is served on the event loop,
+so open streams hold no thread. Every other route is served by the Flask app, mounted as WSGI on ASGI_WSGI_THREADS
+threads. Configuration is shared with app.py through the same environment variables.
+
+    pip install starlette uvicorn a2wsgi
+    python asgi_app.py                          # ASGI_HOST, ASGI_PORT, ASGI_WORKERS
+    uvicorn asgi_app:app --workers 4
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from a2wsgi import WSGIMiddleware  # pip install a2wsgi
+from starlette.applications import Starlette  # pip install starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+import app as wsgi_app
+from earthquake_data_fetcher import get_fetcher
+from event_batch import EventBatch
+from spatial_index import bounding_box
+from streaming import OUTPUT_FORMATS, ndjson_lines, json_array_chunks, prime
+from live_feed import FeedFilter, async_sse_events
+import forecasters
+import json_codec
+from compression import etag_for
+from metrics import HTTP_REQUEST_SECONDS, PROFILE_HEADER, UPSTREAM_REQUESTS, timed, start_profile, stop_profile, server_timing
+
+ASGI_HOST = os.environ.get("ASGI_HOST", "0.0.0.0")
+ASGI_PORT = int(os.environ.get("ASGI_PORT", 8000))
+ASGI_WORKERS = int(os.environ.get("ASGI_WORKERS", 1))  # Processes, each with its own event loop
+ASGI_FETCH_THREADS = int(os.environ.get("ASGI_FETCH_THREADS", 32))  # Threads for upstream fetches and CPU work per process
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 10))  # Threads serving the mounted Flask routes per process
+
+
+def query_arg(request, name, type=None, default=None):
+    """
+    Like Flask's request.args.get: a value that doesn't convert falls back to the default.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    if type is None:
+        return value
+    try:
+        return type(value)
+    except ValueError:
+        return default
+
+
+class AsyncFetcher:
+    """
+    Runs the EarthquakeDataFetcher in a thread pool, so the async routes answer through the same event store,
+    response cache, coalescing, slicing, retries and conditional requests as the Flask routes, without blocking
+    the event loop.
+    """
+
+    def __init__(self, fetcher, executor):
+        self.fetcher = fetcher
+        self.executor = executor
+
+    async def run(self, function, *args, **kwargs):
+        context = contextvars.copy_context()  # Keeps the request's profile in the worker thread
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(context.run, function, *args, **kwargs))
+
+    async def fetch_earthquakes_sliced(self, *args, **kwargs):
+        return await self.run(self.fetcher.fetch_earthquakes_sliced, *args, **kwargs)
+
+    async def fetch_event_batch(self, *args, **kwargs):
+        return await self.run(self.fetcher.fetch_event_batch, *args, **kwargs)
+
+
+def instrumented(handler):
+    """
+    Records the route's request time for /metrics, and returns a Server-Timing breakdown when the request
+    sends the X-Profile header, like the Flask routes do.
+    """
+    @functools.wraps(handler)
+    async def wrapper(request):
+        started = time.perf_counter()
+        profile = start_profile() if request.headers.get(PROFILE_HEADER) else None
+        try:
+            response = await handler(request)
+        finally:
+            stop_profile()
+        elapsed = time.perf_counter() - started
+        HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, endpoint=request.url.path, status=response.status_code)
+        if profile is not None:
+            response.headers['Server-Timing'] = server_timing(profile, elapsed)
+        return response
+    return wrapper
+
+
+def encode_body(payload, status_code, accept_encoding, if_none_match):
+    """
+    Serializes the payload and applies the ETag and compression rules of app.encode_response.
+    Returns (status code, body, headers).
+    """
+    with timed("serialization"):
+        body = json_codec.dumps_bytes(payload)
+    if status_code != 200:
+        return status_code, body, {}
+
+    compressor = wsgi_app.response_compressor
+    headers = {"Vary": "Accept-Encoding"} if compressor is not None else {}
+    encoding = compressor.negotiate(accept_encoding) if compressor is not None and len(body) >= wsgi_app.COMPRESSION_MIN_BYTES else None
+    if wsgi_app.RESPONSE_ETAGS:
+        with timed("etag"):
+            headers["ETag"] = f'"{etag_for(body, encoding)}"'
+        if parse_etags(if_none_match).contains_weak(headers["ETag"].strip('"')):
+            return 304, b"", headers
+    if encoding is not None:
+        with timed("compression"):
+            body = compressor.compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return status_code, body, headers
+
+
+async def json_response(request, payload, status_code=200):
+    """
+    Serializes and compresses in the thread pool, large event lists take a while to encode.
+    """
+    status_code, body, headers = await request.app.state.fetcher.run(
+        encode_body, payload, status_code, request.headers.get("accept-encoding"), request.headers.get("if-none-match"))
+    if status_code == 304:
+        return Response(status_code=304, headers=headers)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def streaming_response(request, items, output_format, prefix="[", suffix="]", trailer=None):
+    if output_format == "ndjson":
+        chunks, media_type = ndjson_lines(items, trailer), "application/x-ndjson"
+    else:
+        chunks, media_type = json_array_chunks(items, prefix, suffix), "application/json"
+    compressor = wsgi_app.response_compressor
+    if compressor is None:
+        return StreamingResponse(chunks, media_type=media_type)
+    encoding = compressor.negotiate(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return StreamingResponse(chunks, media_type=media_type, headers={"Vary": "Accept-Encoding"})
+    return StreamingResponse(compressor.compress_chunks(chunks, encoding), media_type=media_type,
+                             headers={"Vary": "Accept-Encoding", "Content-Encoding": encoding})
+
+
+async def get_earthquakes(request):
+    try:
+        fetcher = request.app.state.fetcher
+
+        start_time = query_arg(request, 'starttime')
+        end_time = query_arg(request, 'endtime')
+        min_magnitude = query_arg(request, 'minmagnitude', float)
+        max_magnitude = query_arg(request, 'maxmagnitude', float)
+        min_latitude = query_arg(request, 'minlatitude', float)
+        max_latitude = query_arg(request, 'maxlatitude', float)
+        min_longitude = query_arg(request, 'minlongitude', float)
+        max_longitude = query_arg(request, 'maxlongitude', float)
+        limit = query_arg(request, 'limit', int)
+        orderby = query_arg(request, 'orderby')
+        user_latitude = query_arg(request, 'user_latitude', float)
+        user_longitude = query_arg(request, 'user_longitude', float)
+        output_format = query_arg(request, 'format', default='json')
+        fields = wsgi_app.parse_fields(query_arg(request, 'fields'))
+
+        if output_format not in OUTPUT_FORMATS:
+            return JSONResponse({"error": f"format must be one of {', '.join(OUTPUT_FORMATS)}."}, 400)
+        if user_latitude is not None and user_longitude is not None:
+            if not -90 <= user_latitude <= 90 or not -180 <= user_longitude <= 180:
+                return JSONResponse({"error": "user_latitude must be between -90 and 90, user_longitude between -180 and 180."}, 400)
+
+        if not start_time or not end_time:
+            now = datetime.now(timezone.utc)
+            start_time = (now - timedelta(days=wsgi_app.DEFAULT_DAYS)).isoformat()
+            end_time = now.isoformat()
+        try:
+            datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+            datetime.fromisoformat(end_time.replace('Z', '+00:00'))
+        except ValueError:
+            return JSONResponse({"error": "Invalid starttime or endtime format. Use ISO 8601 format."}, 400)
+
+        sync_fetcher = fetcher.fetcher
+        if output_format != "json" and limit is None and orderby in (None, "time", "time-asc"):
+            # Streamed one time slice at a time like the Flask route, the first slice is fetched before the status is sent
+            try:
+                earthquakes = sync_fetcher.iter_earthquakes_sliced(start_time, end_time, min_magnitude, max_magnitude,
+                                                                   min_latitude, max_latitude, min_longitude,
+                                                                   max_longitude, descending=orderby != "time-asc")
+                if user_latitude is not None and user_longitude is not None:
+                    earthquakes = sync_fetcher.iter_annotated_distances(user_latitude, user_longitude, earthquakes)
+                earthquakes = await fetcher.run(prime, wsgi_app.select_fields(earthquakes, fields))
+            except Exception as e:
+                logging.error(f"Error fetching earthquakes: {e}")
+                return JSONResponse({"error": "Failed to fetch earthquake data from the API"}, 500)
+            return streaming_response(request, earthquakes, output_format)
+
+        try:
+            earthquakes = await fetcher.fetch_earthquakes_sliced(start_time, end_time, min_magnitude, max_magnitude,
+                                                                 min_latitude, max_latitude, min_longitude,
+                                                                 max_longitude, limit, orderby)
+        except Exception as e:
+            logging.error(f"Error fetching earthquakes: {e}")
+            return JSONResponse({"error": "Failed to fetch earthquake data from the API"}, 500)
+
+        if earthquakes is None:
+            return JSONResponse({"error": "Could not retrieve earthquake data"}, 500)
+
+        if user_latitude is not None and user_longitude is not None:
+            earthquakes = await fetcher.run(sync_fetcher.annotate_distances, user_latitude, user_longitude, earthquakes)
+
+        if output_format != "json":
+            return streaming_response(request, wsgi_app.select_fields(earthquakes, fields), output_format)
+        if fields is not None:
+            earthquakes = list(wsgi_app.select_fields(earthquakes, fields))
+        return await json_response(request, earthquakes)
+
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid parameter type: {e}"}, 400)
+    except Exception as e:
+        logging.exception(f"An unhandled error occurred: {e}")
+        return JSONResponse({"error": "An internal server error occurred"}, 500)
+
+
+async def earthquake_data(request):
+    try:
+        fetcher = request.app.state.fetcher
+        latitude = query_arg(request, 'latitude', float)
+        longitude = query_arg(request, 'longitude', float)
+        output_format = query_arg(request, 'format', default='json')
+        fields = wsgi_app.parse_fields(query_arg(request, 'fields'))
+
+        if latitude is None or longitude is None:
+            return JSONResponse({"error": "Latitude and longitude are required parameters."}, 400)
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            return JSONResponse({"error": "Latitude must be between -90 and 90, longitude between -180 and 180."}, 400)
+        if output_format not in OUTPUT_FORMATS:
+            return JSONResponse({"error": f"format must be one of {', '.join(OUTPUT_FORMATS)}."}, 400)
+
+        now = datetime.now(timezone.utc)
+        start_time = (now - timedelta(days=365 * 5)).isoformat()  # Fetch past 5 years of data
+        end_time = now.isoformat()
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, wsgi_app.REGION_RADIUS_KM)
+
+        if output_format != "json":
+            # Filtered and streamed one slice at a time like the Flask route, newest first like the json response
+            highest = {"magnitude": 0}
+            try:
+                earthquakes = await fetcher.run(prime, wsgi_app.select_fields(wsgi_app.iter_earthquakes_in_radius(
+                    fetcher.fetcher, latitude, longitude, start_time, end_time, min_latitude, max_latitude,
+                    min_longitude, max_longitude, highest), fields))
+            except Exception as e:
+                logging.error(f"Error fetching earthquake data: {e}")
+                return JSONResponse({"error": "Failed to fetch earthquake data from the API"}, 500)
+            return streaming_response(request, earthquakes, output_format,
+                                      prefix='{"earthquakes":[',
+                                      suffix=lambda: '],"highest_magnitude":' + json_codec.dumps(highest["magnitude"]) + '}',
+                                      trailer=lambda: {"highest_magnitude": highest["magnitude"]})
+
+        try:
+            earthquakes = await fetcher.fetch_earthquakes_sliced(start_time, end_time, None, None, min_latitude,
+                                                                 max_latitude, min_longitude, max_longitude,
+                                                                 orderby="time")
+        except Exception as e:
+            logging.error(f"Error fetching earthquake data: {e}")
+            return JSONResponse({"error": "Failed to fetch earthquake data from the API"}, 500)
+
+        if earthquakes is None:
+            return JSONResponse({"error": "Failed to fetch earthquake data from the API"}, 500)
+
+        def in_radius():
+            sync_fetcher = fetcher.fetcher
+            distances = sync_fetcher.calculate_distances(latitude, longitude, sync_fetcher.extract_coordinates(earthquakes))
+            selected = [earthquake for earthquake, distance in zip(earthquakes, distances.tolist())
+                        if distance <= wsgi_app.REGION_RADIUS_KM]  # False for NaN
+            return list(wsgi_app.select_fields(selected, fields)), EventBatch.from_features(selected).highest_magnitude()
+
+        earthquakes, highest_magnitude = await fetcher.run(in_radius)
+        return await json_response(request, {"earthquakes": earthquakes, "highest_magnitude": highest_magnitude})
+
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid parameter type: {e}"}, 400)
+    except Exception as e:
+        logging.exception(f"An unhandled error occurred: {e}")
+        return JSONResponse({"error": "An internal server error occurred"}, 500)
+
+
+async def predict_earthquake(request):
+    try:
+        fetcher = request.app.state.fetcher
+        latitude = query_arg(request, 'latitude', float)
+        longitude = query_arg(request, 'longitude', float)
+        retrain = query_arg(request, 'retrain', bool, False)
+        engine = query_arg(request, 'engine', default=wsgi_app.DEFAULT_FORECAST_ENGINE)
+        if latitude is None or longitude is None:
+            return JSONResponse({"error": "Latitude and longitude are required parameters."}, 400)
+        if engine not in forecasters.FORECAST_ENGINES:
+            return JSONResponse({"error": f"engine must be one of {', '.join(forecasters.FORECAST_ENGINES)}."}, 400)
+
+        window = wsgi_app.prediction_window()
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, wsgi_app.REGION_RADIUS_KM)
+        try:
+            earthquakes = await fetcher.fetch_event_batch(window[0].isoformat(), window[1].isoformat(),
+                                                          min_latitude=min_latitude, max_latitude=max_latitude,
+                                                          min_longitude=min_longitude, max_longitude=max_longitude,
+                                                          orderby="time")
+        except Exception as e:
+            logging.error(f"Error fetching earthquakes for prediction: {e}")
+            return JSONResponse({"error": "Failed to fetch earthquake data from the API"}, 500)
+
+        if earthquakes is None:
+            return JSONResponse({"error": "Could not retrieve earthquake data"}, 500)
+
+        def predict():
+            sync_fetcher = fetcher.fetcher
+            in_radius = earthquakes.take(sync_fetcher.calculate_distances(latitude, longitude, earthquakes.coordinates)
+                                         <= wsgi_app.REGION_RADIUS_KM)
+            return wsgi_app.predict_from_events(sync_fetcher, in_radius, latitude, longitude, engine, retrain, window)
+
+        payload, status = await fetcher.run(predict)
+        return await json_response(request, payload, status)
+
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid parameter type: {e}"}, 400)
+    except Exception as e:
+        logging.exception(f"An unhandled error occurred during prediction: {e}")
+        return JSONResponse({"error": "An internal server error occurred"}, 500)
+
+
+async def stream_earthquakes(request):
+    """
+    Same as the Flask /earthquakes/stream, served on the event loop: an open stream holds no thread,
+    where through the WSGI mount every client would hold one of the ASGI_WSGI_THREADS.
+    """
+    try:
+        feed_filter = FeedFilter(
+            min_magnitude=query_arg(request, 'minmagnitude', float),
+            min_latitude=query_arg(request, 'minlatitude', float),
+            max_latitude=query_arg(request, 'maxlatitude', float),
+            min_longitude=query_arg(request, 'minlongitude', float),
+            max_longitude=query_arg(request, 'maxlongitude', float),
+        )
+        try:
+            last_event_id = int(request.headers.get('last-event-id'))
+        except (TypeError, ValueError):
+            last_event_id = None
+
+        return StreamingResponse(async_sse_events(wsgi_app.get_feed_poller(), feed_filter, last_event_id),
+                                 media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    except Exception as e:
+        logging.exception(f"An unhandled error occurred while opening the stream: {e}")
+        return JSONResponse({"error": "An internal server error occurred"}, 500)
+
+
+@asynccontextmanager
+async def lifespan(asgi):
+    executor = ThreadPoolExecutor(max_workers=ASGI_FETCH_THREADS, thread_name_prefix="asgi-fetch")
+    asgi.state.fetcher = AsyncFetcher(get_fetcher(), executor)
+    wsgi_app.start_event_sync()  # Flask starts it with its first request, which may never come here
+    await asyncio.get_running_loop().run_in_executor(executor, wsgi_app.warm_up)  # Before the first request is accepted
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/earthquakes', instrumented(get_earthquakes)),
+        Route('/earthquakes/data', instrumented(earthquake_data)),
+        Route('/earthquakes/predict', instrumented(predict_earthquake)),
+        Route('/earthquakes/stream', stream_earthquakes),
+        Mount('/', app=WSGIMiddleware(wsgi_app.app, workers=ASGI_WSGI_THREADS)),  # Everything else is served by the Flask routes
+    ],
+    middleware=[
+        # Same policy as CORS(app) in app.py, which only covers the mounted Flask routes
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn  # pip install uvicorn
+    uvicorn.run("asgi_app:app", host=ASGI_HOST, port=ASGI_PORT, workers=ASGI_WORKERS)
@@ -0,0 +1,40 @@
+"""
+Compares the per-feature calculate_distance loop with the vectorized calculate_distances.
+
+Run from the backend directory:  python -m benchmarks.bench_distance
+"""
+import time
+from earthquake_data_fetcher import EarthquakeDataFetcher
+from benchmarks.synthetic import make_earthquakes
+
+USER_LATITUDE, USER_LONGITUDE = 9.03, 38.74  # Addis Ababa
+
+
+def best_of(function, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    fetcher = EarthquakeDataFetcher()
+    print(f"{'events':>8} {'loop (ms)':>12} {'vectorized (ms)':>16} {'speedup':>8}")
+    for count in (10_000, 100_000):
+        earthquakes = make_earthquakes(count)
+
+        def loop():
+            return [fetcher.calculate_distance(USER_LATITUDE, USER_LONGITUDE, earthquake) for earthquake in earthquakes]
+
+        def vectorized():
+            return fetcher.calculate_distances(USER_LATITUDE, USER_LONGITUDE, fetcher.extract_coordinates(earthquakes))
+
+        loop_seconds = best_of(loop)
+        vectorized_seconds = best_of(vectorized)
+        print(f"{count:>8} {loop_seconds * 1000:>12.1f} {vectorized_seconds * 1000:>16.1f} {loop_seconds / vectorized_seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
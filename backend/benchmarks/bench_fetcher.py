@@ -0,0 +1,61 @@
+"""
+Micro-benchmarks of the EarthquakeDataFetcher hot paths at increasing catalog sizes: distance annotation,
+heatmap extraction and model input preparation, each from GeoJSON features and from an EventBatch.
+
+Run from the backend directory:  python -m benchmarks.bench_fetcher [--events 1000 10000 100000 200000]
+"""
+import argparse
+from sklearn.preprocessing import MinMaxScaler
+from earthquake_data_fetcher import EarthquakeDataFetcher, MODEL_FEATURES
+from event_batch import EventBatch
+from benchmarks.bench_distance import best_of, USER_LATITUDE, USER_LONGITUDE
+from benchmarks.synthetic import make_earthquakes
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 200_000)
+SEQUENCE_LENGTH = 30
+
+
+def cases(fetcher, earthquakes, events):
+    """
+    (name, callable) pairs timed for one catalog, as GeoJSON features and as the equivalent EventBatch.
+    """
+    return [
+        ("calculate_distance (per feature)",
+         lambda: [fetcher.calculate_distance(USER_LATITUDE, USER_LONGITUDE, earthquake) for earthquake in earthquakes]),
+        ("calculate_distances (features)",
+         lambda: fetcher.calculate_distances(USER_LATITUDE, USER_LONGITUDE, fetcher.extract_coordinates(earthquakes))),
+        ("calculate_distances (batch)",
+         lambda: fetcher.calculate_distances(USER_LATITUDE, USER_LONGITUDE, events.coordinates)),
+        ("get_heatmap_data (features)", lambda: fetcher.get_heatmap_data(earthquakes)),
+        ("get_heatmap_data (batch)", lambda: fetcher.get_heatmap_data(events)),
+        ("prepare_data_for_model (features)",
+         lambda: fetcher.prepare_data_for_model(earthquakes, SEQUENCE_LENGTH, MinMaxScaler())),
+        ("prepare_data_for_model (batch)",
+         lambda: fetcher.prepare_data_for_model(events, SEQUENCE_LENGTH, MinMaxScaler())),
+        (f"prepare_data_for_model ({len(MODEL_FEATURES)} features)",
+         lambda: fetcher.prepare_data_for_model(events, SEQUENCE_LENGTH, MinMaxScaler(), features=MODEL_FEATURES)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the fetcher's per-event processing at several catalog sizes.")
+    parser.add_argument("--events", type=int, nargs="+", default=DEFAULT_SIZES, help="Catalog sizes to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the best one is reported")
+    args = parser.parse_args()
+
+    fetcher = EarthquakeDataFetcher()
+    results = {}  # case name -> [milliseconds per size]
+    for count in args.events:
+        earthquakes = make_earthquakes(count)
+        events = EventBatch.from_features(earthquakes)
+        for name, function in cases(fetcher, earthquakes, events):
+            results.setdefault(name, []).append(best_of(function, args.repeat) * 1000)
+
+    width = max(len(name) for name in results)
+    print(f"{'milliseconds':<{width}} " + " ".join(f"{count:>10}" for count in args.events))
+    for name, timings in results.items():
+        print(f"{name:<{width}} " + " ".join(f"{milliseconds:>10.1f}" for milliseconds in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Compares the old Python loop building LSTM training windows with the strided view of prepare_data_for_model.
+
+Run from the backend directory:  python -m benchmarks.bench_windowing
+"""
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+from earthquake_data_fetcher import EarthquakeDataFetcher
+from event_batch import EventBatch
+from benchmarks.bench_distance import best_of
+from benchmarks.synthetic import make_earthquakes
+
+SEQUENCE_LENGTH = 30
+
+
+def loop_windows(earthquakes, sequence_length):
+    """
+    The windowing prepare_data_for_model used before: slices appended one by one, then copied into an array.
+    """
+    magnitudes_scaled = MinMaxScaler().fit_transform(earthquakes.magnitudes.reshape(-1, 1))
+    X, y = [], []
+    for i in range(len(magnitudes_scaled) - sequence_length):
+        X.append(magnitudes_scaled[i:i + sequence_length])
+        y.append(magnitudes_scaled[i + sequence_length])
+    return np.array(X), np.array(y)
+
+
+def main():
+    fetcher = EarthquakeDataFetcher()
+    print(f"{'events':>8} {'loop (ms)':>12} {'loop MB':>8} {'view (ms)':>10} {'view MB':>8} {'speedup':>8} {'3 features (ms)':>16}")
+    for count in (10_000, 100_000, 500_000):
+        earthquakes = EventBatch.from_features(make_earthquakes(count, days=365 * 5))
+
+        loop_seconds = best_of(lambda: loop_windows(earthquakes, SEQUENCE_LENGTH))
+        view_seconds = best_of(lambda: fetcher.prepare_data_for_model(earthquakes, SEQUENCE_LENGTH, MinMaxScaler()))
+        features_seconds = best_of(lambda: fetcher.prepare_data_for_model(
+            earthquakes, SEQUENCE_LENGTH, MinMaxScaler(), features=("mag", "depth", "interval")))
+
+        loop_X, _ = loop_windows(earthquakes, SEQUENCE_LENGTH)
+        view_X, _ = fetcher.prepare_data_for_model(earthquakes, SEQUENCE_LENGTH, MinMaxScaler())
+        assert np.array_equal(loop_X, view_X)
+        owner = view_X
+        while owner.base is not None:  # The windows are views, the memory is the scaled data they read from
+            owner = owner.base
+
+        print(f"{count:>8} {loop_seconds * 1000:>12.1f} {loop_X.nbytes / 1e6:>8.1f} {view_seconds * 1000:>10.1f} "
+              f"{owner.nbytes / 1e6:>8.1f} {loop_seconds / view_seconds:>7.1f}x {features_seconds * 1000:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
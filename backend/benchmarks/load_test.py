@@ -0,0 +1,173 @@
+"""
+End-to-end load test of the Flask routes against the local fake USGS server. For every catalog size each route
+is served by a fresh process running the app on a threaded werkzeug server, and hammered by concurrent clients.
+Reports p50/p99 latency, throughput and the serving process's peak RSS, so memory is attributed per route.
+
+The response cache is on like in production, so after the warm-up requests mostly measure the serving path;
+--no-cache sends every request upstream. /earthquakes/train and /earthquakes/stream aren't covered, the first
+queues background training and the second never completes.
+
+Run from the backend directory:  python -m benchmarks.load_test [--events 1000 10000 100000 200000] [--routes stats heatmap]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+import numpy as np  # pip install numpy
+from benchmarks.synthetic import make_earthquakes
+from benchmarks.usgs_stub import FakeUSGS
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 200_000)
+LATITUDE, LONGITUDE = 35.68, 139.69  # Tokyo, where part of the synthetic catalog is clustered
+HISTORY_DAYS = 365
+
+
+def window_params(days=HISTORY_DAYS):
+    now = datetime.now(timezone.utc)
+    return {"starttime": (now - timedelta(days=days)).isoformat(), "endtime": now.isoformat(), "minmagnitude": 0}
+
+
+def routes():
+    """
+    Route name -> (method, path, query params, JSON body) of the requests sent to it.
+    """
+    locations = [{"latitude": LATITUDE + offset, "longitude": LONGITUDE + offset} for offset in (-1, -0.5, 0, 0.5, 1)]
+    return {
+        "earthquakes": ("GET", "/earthquakes", {**window_params(), "user_latitude": LATITUDE, "user_longitude": LONGITUDE}, None),
+        "earthquakes_ndjson": ("GET", "/earthquakes", {**window_params(), "format": "ndjson"}, None),
+        "heatmap": ("GET", "/earthquakes/heatmap", window_params(), None),
+        "heatmap_grid": ("GET", "/earthquakes/heatmap", {**window_params(), "zoom": 3}, None),
+        "nearby": ("GET", "/earthquakes/nearby", {"latitude": LATITUDE, "longitude": LONGITUDE}, None),
+        "data": ("GET", "/earthquakes/data", {"latitude": LATITUDE, "longitude": LONGITUDE}, None),
+        "stats": ("GET", "/earthquakes/stats", {**window_params(), "bucket": "1d"}, None),
+        "predict": ("GET", "/earthquakes/predict", {"latitude": LATITUDE, "longitude": LONGITUDE, "engine": "stats"}, None),
+        "predict_batch": ("POST", "/earthquakes/predict/batch", None, {"locations": locations, "engine": "stats"}),
+        "cache_stats": ("GET", "/earthquakes/cache/stats", None, None),
+        "metrics": ("GET", "/metrics", None, None),
+    }
+
+
+def clustered_earthquakes(count, fraction=0.5, spread_deg=1.0, seed=0):
+    """
+    Synthetic catalog with `fraction` of the events moved near the test location, so regional routes have
+    realistic amounts of data instead of the handful a uniform global spread leaves in any one region.
+    """
+    rng = random.Random(seed)
+    earthquakes = make_earthquakes(count, days=HISTORY_DAYS, seed=seed)
+    for earthquake in earthquakes[::max(round(1 / fraction), 1)]:
+        coordinates = earthquake["geometry"]["coordinates"]
+        coordinates[0] = round(LONGITUDE + rng.uniform(-spread_deg, spread_deg), 4)
+        coordinates[1] = round(LATITUDE + rng.uniform(-spread_deg, spread_deg), 4)
+    return earthquakes
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, kilobytes on Linux
+
+
+def serve_and_load(usgs_url, state_dir, route, request_count, concurrency, warmup, response_cache, results):
+    """
+    Child process: serves the app on a local port and sends request_count requests to one route from
+    concurrency client threads. Puts the route's measurements on the results queue.
+    """
+    os.environ.update({
+        "EVENT_STORE_ENABLED": "false",  # Every query goes through the fetcher to the stub
+        "TRAINING_ENABLED": "false",
+        "TRAINING_JOB_DB_PATH": os.path.join(state_dir, "training_jobs.db"),
+        "MODEL_REGISTRY_DIR": os.path.join(state_dir, "models"),
+        "RESPONSE_CACHE_ENABLED": "true" if response_cache else "false",
+    })
+    import logging
+    import requests
+    from werkzeug.serving import make_server
+    import app as earthquake_app
+
+    logging.getLogger().setLevel(logging.WARNING)  # Request logging would dominate the measurements
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    earthquake_app.get_fetcher().base_url = usgs_url
+    server = make_server("127.0.0.1", 0, earthquake_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    method, path, params, body = routes()[route]
+    url = f"http://127.0.0.1:{server.server_port}{path}"
+    sessions = threading.local()
+
+    def send(_):
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        start = time.perf_counter()
+        response = sessions.session.request(method, url, params=params, json=body, timeout=300)
+        response.content
+        return time.perf_counter() - start, response.status_code, len(response.content)
+
+    idle_rss = peak_rss_mb()
+    try:
+        for _ in range(warmup):
+            send(None)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            outcomes = list(executor.map(send, range(request_count)))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    latencies = np.array([latency for latency, _, _ in outcomes]) * 1000
+    errors = sum(1 for _, status, _ in outcomes if status >= 400)
+    results.put({
+        "route": route,
+        "requests": request_count,
+        "errors": errors,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "throughput": request_count / elapsed,
+        "response_kb": np.mean([size for _, _, size in outcomes]) / 1024,
+        "idle_rss_mb": idle_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Flask routes against a fake USGS API.")
+    parser.add_argument("--events", type=int, nargs="+", default=DEFAULT_SIZES, help="Catalog sizes served by the fake USGS API")
+    parser.add_argument("--routes", nargs="+", choices=sorted(routes()), default=list(routes()), help="Routes to test")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed requests sent first, e.g. to fill the cache")
+    parser.add_argument("--no-cache", dest="response_cache", action="store_false", help="Disable the response cache")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")  # A clean process per route, so peak RSS isn't inherited
+    print(f"{'events':>8} {'route':<18} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>8} "
+          f"{'resp KB':>9} {'idle MB':>8} {'peak MB':>8} {'upstream':>8}")
+    for count in args.events:
+        stub = FakeUSGS(clustered_earthquakes(count)).start()
+        try:
+            for route in args.routes:
+                upstream_before = stub.requests
+                results = context.Queue()
+                with tempfile.TemporaryDirectory() as state_dir:
+                    process = context.Process(target=serve_and_load, args=(
+                        stub.url, state_dir, route, args.requests, args.concurrency, args.warmup, args.response_cache, results))
+                    process.start()
+                    process.join()
+                if process.exitcode != 0:
+                    print(f"{count:>8} {route:<18} failed with exit code {process.exitcode}")
+                    continue
+                result = results.get()
+                print(f"{count:>8} {route:<18} {result['requests']:>8} {result['errors']:>6} {result['p50_ms']:>9.1f} "
+                      f"{result['p99_ms']:>9.1f} {result['throughput']:>8.1f} {result['response_kb']:>9.1f} "
+                      f"{result['idle_rss_mb']:>8.0f} {result['peak_rss_mb']:>8.0f} {stub.requests - upstream_before:>8}")
+        finally:
+            stub.stop()
+
+
+if __name__ == '__main__':
+    main()
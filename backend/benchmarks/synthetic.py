@@ -0,0 +1,31 @@
+import random
+from datetime import datetime, timezone, timedelta
+
+
+def make_earthquakes(count, days=365, seed=0):
+    """
+    Generates `count` synthetic USGS GeoJSON features spread over the last `days`, oldest first.
+    """
+    rng = random.Random(seed)
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    span_ms = int(timedelta(days=days).total_seconds() * 1000)
+    times = sorted(now_ms - rng.randrange(span_ms) for _ in range(count))
+    earthquakes = []
+    for i, time_ms in enumerate(times):
+        earthquakes.append({
+            "type": "Feature",
+            "id": f"syn{i:07d}",
+            "properties": {
+                "mag": round(min(rng.expovariate(2.3) + 1.0, 9.5), 1),  # Roughly Gutenberg-Richter with b=1
+                "place": f"{rng.randint(1, 200)} km of Synthetic Place",
+                "time": time_ms,
+                "updated": time_ms + rng.randint(60000, 3600000),
+                "type": "earthquake",
+            },
+            "geometry": {
+                "type": "Point",
+                "coordinates": [round(rng.uniform(-180, 180), 4), round(rng.uniform(-85, 85), 4),
+                                round(rng.uniform(0, 300), 2)],
+            },
+        })
+    return earthquakes
@@ -0,0 +1,178 @@
+"""
+Local stand-in for the USGS event query API, serving synthetic GeoJSON so benchmarks and load tests measure
+this backend rather than the network. It honors the filters the fetcher sends (time window, magnitude, bounding
+box, updatedafter, orderby, limit, offset), and like the real API it answers 400 Bad Request when a query without
+a limit matches more events than the search limit. Tests can also have it send ETags and answer 304 Not Modified,
+or fail the next requests with 503 Service Unavailable.
+
+Run from the backend directory:  python -m benchmarks.usgs_stub --events 100000 --port 8099
+and point the fetcher's base_url at the printed URL.
+"""
+import argparse
+import hashlib
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np  # pip install numpy
+from earthquake_data_fetcher import USGS_MAX_RESULTS
+from event_store import to_epoch_ms
+from benchmarks.synthetic import make_earthquakes
+
+
+class FakeUSGS:
+    """
+    Threaded HTTP server over a fixed list of GeoJSON features. The features are serialized once up front and the
+    filters run on NumPy columns, so even the 200k event case answers quickly and the stub's own cost stays small
+    next to what it's used to measure.
+    """
+
+    def __init__(self, earthquakes, host="127.0.0.1", port=0, result_cap=USGS_MAX_RESULTS, etags=False):
+        earthquakes = sorted(earthquakes, key=lambda earthquake: earthquake["properties"]["time"])
+        self.result_cap = result_cap
+        self.etags = etags  # Send an ETag with every body and answer matching If-None-Match with 304
+        self.failures = 0  # Number of upcoming requests answered with 503
+        self.requests = 0
+        self.not_modified = 0
+        self._bodies = [json.dumps(earthquake).encode() for earthquake in earthquakes]
+        self._times = np.array([earthquake["properties"]["time"] for earthquake in earthquakes], dtype=np.int64)
+        self._updated = np.array([earthquake["properties"].get("updated") or 0 for earthquake in earthquakes], dtype=np.int64)
+        self._magnitudes = np.array([earthquake["properties"].get("mag") for earthquake in earthquakes], dtype=float)
+        coordinates = np.array([earthquake["geometry"]["coordinates"][:2] for earthquake in earthquakes], dtype=float).reshape(-1, 2)
+        self._longitudes, self._latitudes = coordinates[:, 0], coordinates[:, 1]
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, format, *args):
+                pass  # One line per request would drown the benchmark output
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/fdsnws/event/1/query?format=geojson"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="usgs-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def query(self, params):
+        """
+        Indices of the features matching the query parameters, in the requested order.
+        """
+        low, high = 0, len(self._times)
+        if "starttime" in params:
+            low = np.searchsorted(self._times, to_epoch_ms(params["starttime"]), side="left")
+        if "endtime" in params:
+            high = np.searchsorted(self._times, to_epoch_ms(params["endtime"]), side="right")
+        index = np.arange(low, max(high, low))
+
+        mask = np.ones(len(index), dtype=bool)
+        if "minmagnitude" in params:
+            mask &= self._magnitudes[index] >= float(params["minmagnitude"])
+        if "maxmagnitude" in params:
+            mask &= self._magnitudes[index] <= float(params["maxmagnitude"])
+        if "minlatitude" in params:
+            mask &= self._latitudes[index] >= float(params["minlatitude"])
+        if "maxlatitude" in params:
+            mask &= self._latitudes[index] <= float(params["maxlatitude"])
+        if "minlongitude" in params:
+            mask &= self._longitudes[index] >= float(params["minlongitude"])
+        if "maxlongitude" in params:
+            mask &= self._longitudes[index] <= float(params["maxlongitude"])
+        if "updatedafter" in params:
+            mask &= self._updated[index] > to_epoch_ms(params["updatedafter"])
+        index = index[mask]
+
+        orderby = params.get("orderby", "time")
+        if orderby == "time":
+            index = index[::-1]
+        elif orderby == "magnitude":
+            index = index[np.argsort(-self._magnitudes[index], kind="stable")]
+        elif orderby == "magnitude-asc":
+            index = index[np.argsort(self._magnitudes[index], kind="stable")]
+
+        offset = int(params.get("offset", 1)) - 1  # The API's offset is 1-based
+        if "limit" not in params:
+            if len(index) - offset > self.result_cap:
+                raise ValueError(f"{len(index) - offset} matching events exceeds search limit of {self.result_cap}. "
+                                 f"Modify the search to match fewer events.")
+            return index[offset:]
+        limit = int(params["limit"])
+        if limit > self.result_cap:
+            raise ValueError(f"limit must be less than or equal to {self.result_cap}")
+        return index[offset:offset + limit]
+
+    def _handle(self, handler):
+        with self._lock:
+            self.requests += 1
+            failing = self.failures > 0
+            if failing:
+                self.failures -= 1
+        if failing:
+            self._send(handler, 503, "text/plain", b"Error 503: Service Unavailable\n")
+            return
+        try:
+            params = {name: values[0] for name, values in parse_qs(urlparse(handler.path).query).items()}
+            index = self.query(params)
+        except (ValueError, TypeError) as e:
+            self._send(handler, 400, "text/plain", f"Error 400: Bad Request\n\n{e}\n".encode())
+            return
+
+        body = b'{"type":"FeatureCollection","metadata":{"count":%d},"features":[%s]}' % (
+            len(index), b",".join(self._bodies[i] for i in index.tolist()))
+        if not self.etags:
+            self._send(handler, 200, "application/json", body)
+            return
+        etag = '"{}"'.format(hashlib.blake2b(body, digest_size=16).hexdigest())
+        if handler.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.not_modified += 1
+            self._send(handler, 304, None, b"", {"ETag": etag})
+            return
+        self._send(handler, 200, "application/json", body, {"ETag": etag})
+
+    def _send(self, handler, status, content_type, body, headers=None):
+        handler.send_response(status)
+        if content_type is not None:
+            handler.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        if status != 304:
+            handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic earthquakes through a fake USGS query API.")
+    parser.add_argument("--events", type=int, default=10_000, help="Number of synthetic events")
+    parser.add_argument("--days", type=int, default=365, help="Days of history the events are spread over")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    stub = FakeUSGS(make_earthquakes(args.events, days=args.days), port=args.port)
+    print(f"Serving {args.events} synthetic earthquakes at {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import zlib
+
+try:
+    import brotli  # pip install brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/x-ndjson", "text/plain", "text/csv", "text/html")
+
+
+def etag_for(body, encoding=None):
+    """
+    Strong ETag of a response body, specific to its content coding since gzip and brotli are different representations.
+    """
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return f"{digest}-{encoding}" if encoding else digest
+
+
+def parse_accept_encoding(header):
+    """
+    {coding: quality} from an Accept-Encoding header, with quality 0 meaning not acceptable.
+    """
+    qualities = {}
+    for part in (header or "").split(","):
+        coding, _, parameters = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        parameter, _, value = parameters.strip().partition("=")
+        if parameter.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+class ResponseCompressor:
+    """
+    Content negotiation and compression of response bodies, for whole bodies and for streamed ones.
+    Brotli is offered when the brotli package is installed and preferred over gzip at equal quality, since it
+    makes GeoJSON noticeably smaller. Levels are kept moderate, these bodies are compressed on every request.
+    """
+
+    def __init__(self, min_bytes=1024, gzip_level=5, brotli_quality=4):
+        self.min_bytes = min_bytes  # Smaller bodies don't gain enough to be worth the CPU
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def compressible(self, mimetype):
+        return mimetype in COMPRESSIBLE_MIMETYPES
+
+    def negotiate(self, accept_encoding):
+        """
+        The best supported coding the client accepts, or None to send the body as is.
+        """
+        qualities = parse_accept_encoding(accept_encoding)
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = qualities.get(encoding, qualities.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        if encoding == "gzip":
+            return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)  # No timestamp, equal bodies compress equally
+        raise ValueError(f"Unsupported content coding {encoding}")
+
+    def compress_chunks(self, chunks, encoding):
+        """
+        Compresses a streamed body (str or bytes chunks) on the fly, yielding compressed output as it becomes available.
+        """
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            compress, finish = compressor.process, compressor.finish
+        elif encoding == "gzip":
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+            compress, finish = compressor.compress, compressor.flush
+        else:
+            raise ValueError(f"Unsupported content coding {encoding}")
+        try:
+            for chunk in chunks:
+                output = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+                if output:
+                    yield output
+            yield finish()
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()  # Lets the wrapped generator run its cleanup when the client goes away
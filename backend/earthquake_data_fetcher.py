@@ -3,48 +3,140 @@ import json
 from datetime import datetime, timedelta, timezone
 from math import radians, sin, cos, atan2, sqrt
 import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np  # pip install numpy
 from sklearn.preprocessing import MinMaxScaler  # pip install scikit-learn
-import tensorflow as tf #Fixed: Import tensorflow as tf
-#from tensorflow import keras #Fixed: Not necessary and can cause confusion
-#from keras.models import Sequential, load_model #Fixed:  Using tf.keras instead
-#from keras.layers import LSTM, Dense #Fixed:  Using tf.keras instead
-#from keras.optimizers import Adam #Fixed: Using tf.keras instead
+from model_registry import get_model_registry, batch_predictor
+from spatial_index import annotate_distance
+from heatmap import aggregate_heatmap
+from response_cache import quantize_time
+from http_session import HttpClient
+from event_store import to_epoch_ms, from_epoch_ms
+from streaming import batched
+from event_batch import EventBatch
+from metrics import timed
+# TensorFlow is imported lazily (see model_registry.load_keras_model and create_lstm_model)
+# so that routes which never predict don't pay for the import.
 
 
 logging.basicConfig(filename='earthquake_fetcher.log', level=logging.ERROR,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+EARTH_RADIUS_KM = 6371
+UNIT_FACTORS = {"km": 1.0, "miles": 0.621371, "nm": 0.539957}  # nm: nautical miles
+USGS_MAX_RESULTS = 20000  # The API's search limit, queries matching more events are answered with 400 Bad Request
+MIN_SLICE_MS = 60 * 60 * 1000  # Slices over the search limit are split down to one hour
+MODEL_FEATURES = ("mag", "depth", "interval")  # Input columns prepare_data_for_model can build
+
+class SearchLimitExceeded(Exception):
+    """
+    The query matches more than USGS_MAX_RESULTS events, so the API refused it. Split it into smaller windows.
+    """
+
+
+def exceeds_search_limit(status_code, text):
+    """
+    Whether an API error response is the search limit one ("... exceeds search limit of 20000 ...").
+    """
+    return status_code == 400 and "search limit" in (text or "").lower()
+
+
+def order_earthquakes(earthquakes, orderby):
+    """
+    Reorders a list of earthquakes in ascending time order (as sliced fetches produce them) to the API's orderby.
+    """
+    if orderby in (None, "time"):
+        earthquakes.reverse()  # The API's default order is newest first
+    elif orderby in ("magnitude", "magnitude-asc"):
+        earthquakes.sort(key=lambda e: e['properties']['mag'] if e['properties'].get('mag') is not None else float('-inf'),
+                         reverse=orderby == "magnitude")
+    return earthquakes
+
+
 class EarthquakeDataFetcher:
     """
     Fetches earthquake data from the USGS API and provides data filtering, distance calculation, and ML-based prediction.
     """
 
-    def __init__(self, base_url="https://earthquake.usgs.gov/fdsnws/event/1/query?format=geojson", model_path="earthquake_model.h5"): #ADDED model_path
+    def __init__(self, base_url="https://earthquake.usgs.gov/fdsnws/event/1/query?format=geojson", model_path="earthquake_model.h5", event_store=None,
+                 response_cache=None, query_time_quantum=60, http_client=None, max_fetch_workers=4, sliced_fetch_min_days=30,
+                 region_models=None, feature_columns=("mag",)): #ADDED model_path
         self.base_url = base_url
-        self.model = None #Initialized the model to None in case training is needed first
+        self.feature_columns = tuple(feature_columns) #Input columns of newly trained models, see MODEL_FEATURES. Region models keep the ones they were trained on
+        self.region_models = region_models #Optional RegionModelRegistry, predictions for a region use its own model and scaler
+        self.max_fetch_workers = max_fetch_workers #Upper bound on concurrent upstream requests for sliced fetches
+        self.sliced_fetch_min_days = sliced_fetch_min_days #Shorter windows are fetched in one request
+        self._slice_executor = None
+        self._slice_executor_lock = threading.Lock()
+        self.http_client = http_client or HttpClient() #Pooled session with timeouts and retries
+        self.event_store = event_store #Local EventStore, queries it covers are answered without calling the API
+        self.response_cache = response_cache #Optional ResponseCache shared by identical queries
+        self.query_time_quantum = query_time_quantum #Seconds, cached query windows are widened to multiples of this
         self.model_path = model_path
         self.scaler = MinMaxScaler() #Initialize a scaler, good practice
-        try:
-            self.model = tf.keras.models.load_model(self.model_path) #Fixed: Using tf.keras
-            logging.info("Loaded existing earthquake model from {}".format(self.model_path))
-        except Exception as e:
-            logging.warning("Could not load existing model. {}".format(e))
-            logging.info("If this is the first run the model can be automatically trained with a boolean in predict_next_earthquake_ml")
+        self.model_registry = get_model_registry(model_path) #Shared per process, the model is loaded lazily on first use
+
+    @property
+    def model(self):
+        """
+        The current LSTM model, or None if no model has been trained yet.
+        """
+        return self.model_registry.get()
 
     def fetch_earthquakes(self, start_time, end_time, min_magnitude=None,
                            max_magnitude=None, min_latitude=None, max_latitude=None,
                            min_longitude=None, max_longitude=None, limit=None,
                            orderby=None):
         """
-        Fetches earthquake data from the USGS API with flexible filtering options.
+        Fetches earthquake data with flexible filtering options, from the local event store when it covers
+        the query and from the USGS API otherwise.
         """
         if not isinstance(start_time, str):
             raise TypeError("start_time must be a string")
         if not isinstance(end_time, str):
             raise TypeError("end_time must be a string")
 
-
+        if self.response_cache is None:
+            return self._fetch_earthquakes(start_time, end_time, min_magnitude, max_magnitude, min_latitude,
+                                           max_latitude, min_longitude, max_longitude, limit, orderby)
+
+        # Normalize the query so that logically equal requests share a cache entry
+        start_time = quantize_time(start_time, self.query_time_quantum)
+        end_time = quantize_time(end_time, self.query_time_quantum, round_up=True)
+        orderby = orderby or "time"  # The API's default order
+        key = (start_time, end_time, min_magnitude, max_magnitude, min_latitude, max_latitude,
+               min_longitude, max_longitude, limit, orderby)
+        earthquakes = self.response_cache.get_or_load(key, lambda: self._fetch_earthquakes(
+            start_time, end_time, min_magnitude, max_magnitude, min_latitude, max_latitude,
+            min_longitude, max_longitude, limit, orderby))
+        return list(earthquakes) if earthquakes is not None else None #The features are shared, callers must copy before modifying them
+
+    def _fetch_earthquakes(self, start_time, end_time, min_magnitude, max_magnitude, min_latitude,
+                           max_latitude, min_longitude, max_longitude, limit, orderby):
+        if self.event_store is not None:
+            try:
+                if self.event_store.covers(start_time, min_magnitude):
+                    with timed("store_query"):
+                        return self.event_store.query(start_time, end_time, min_magnitude, max_magnitude,
+                                                      min_latitude, max_latitude, min_longitude, max_longitude,
+                                                      limit, orderby)
+            except Exception:
+                logging.exception("Event store query failed, falling back to the API:")
+
+        params = self.build_query_params(start_time, end_time, min_magnitude, max_magnitude, min_latitude,
+                                         max_latitude, min_longitude, max_longitude, limit, orderby)
+        return self.fetch_from_api(params)
+
+    def build_query_params(self, start_time, end_time, min_magnitude=None,
+                           max_magnitude=None, min_latitude=None, max_latitude=None,
+                           min_longitude=None, max_longitude=None, limit=None,
+                           orderby=None):
+        """
+        Builds the USGS query parameters, leaving out filters that aren't set.
+        """
         params = {
             "format": "geojson",
             "starttime": start_time,
@@ -67,17 +159,26 @@ class EarthquakeDataFetcher:
             params["limit"] = limit
         if orderby is not None:
             params["orderby"] = orderby
+        return params
 
+    def fetch_from_api(self, params):
+        """
+        Queries the USGS API and returns the list of GeoJSON features, or None on failure.
+        Raises SearchLimitExceeded if the query matches too many events.
+        """
         try:
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = self.http_client.get_json(self.base_url, params)
             if "features" in data:
               return data["features"]
             else:
                 logging.warning("API returned no features.  Check query parameters.")
                 return None
 
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and exceeds_search_limit(e.response.status_code, e.response.text):
+                raise SearchLimitExceeded(f"More than {USGS_MAX_RESULTS} earthquakes match {params}") from e
+            logging.error(f"API request failed: {e}")
+            return None
         except requests.exceptions.RequestException as e:
             logging.error(f"API request failed: {e}")
             return None
@@ -89,12 +190,129 @@ class EarthquakeDataFetcher:
             return None
 
 
+    def fetch_from_api_split(self, params):
+        """
+        Same as fetch_from_api, but a query refused for exceeding the search limit is split into halves of its time
+        window, down to MIN_SLICE_MS, which are fetched one after the other. For background work that can't use
+        the parallel slices of iter_earthquakes_sliced, e.g. queries with updatedafter. Returns the earthquakes
+        deduplicated by id with the halves in ascending time order, or None on failure.
+        """
+        pending = [(to_epoch_ms(params["starttime"]), to_epoch_ms(params["endtime"]))]
+        earthquakes = []
+        seen = set()  # Both halves include the middle millisecond
+        while pending:
+            slice_start, slice_end = pending.pop()
+            try:
+                fetched = self.fetch_from_api({**params, "starttime": from_epoch_ms(slice_start).isoformat(),
+                                               "endtime": from_epoch_ms(slice_end).isoformat()})
+            except SearchLimitExceeded:
+                if slice_end - slice_start <= MIN_SLICE_MS:
+                    logging.error(f"More than {USGS_MAX_RESULTS} earthquakes in one hour from {from_epoch_ms(slice_start).isoformat()}")
+                    return None
+                middle = slice_start + (slice_end - slice_start) // 2
+                pending.append((middle, slice_end))
+                pending.append((slice_start, middle)) #Popped first, keeps the halves in time order
+                continue
+            if fetched is None:
+                return None
+            for earthquake in fetched:
+                if earthquake.get('id') not in seen:
+                    seen.add(earthquake.get('id'))
+                    earthquakes.append(earthquake)
+        return earthquakes
+
+    def _executor(self):
+        if self._slice_executor is None:
+            with self._slice_executor_lock:
+                if self._slice_executor is None:
+                    self._slice_executor = ThreadPoolExecutor(max_workers=self.max_fetch_workers, thread_name_prefix="usgs-slice")
+        return self._slice_executor
+
+    def iter_earthquakes_sliced(self, start_time, end_time, min_magnitude=None, max_magnitude=None,
+                                min_latitude=None, max_latitude=None, min_longitude=None, max_longitude=None,
+                                slices=None, descending=False):
+        """
+        Yields the earthquakes of a large window in ascending time order, or newest first (the API's default order)
+        with descending=True, deduplicated by id. The window is split into time slices fetched concurrently (one per
+        worker by default, one for windows shorter than sliced_fetch_min_days), and any slice the API refuses for
+        exceeding its search limit is split again. Raises RuntimeError if a slice can't be fetched.
+        """
+        start_ms, end_ms = to_epoch_ms(start_time), to_epoch_ms(end_time)
+        if slices is None:
+            long_window = end_ms - start_ms >= self.sliced_fetch_min_days * 24 * 60 * 60 * 1000
+            slices = self.max_fetch_workers if long_window else 1
+        step = max((end_ms - start_ms) // slices, 1)
+        bounds = [start_ms + i * step for i in range(slices)] + [end_ms]
+        bounds = sorted(set(bounds))
+
+        def submit(slice_start, slice_end):
+            return slice_start, slice_end, self._executor().submit(
+                contextvars.copy_context().run, self.fetch_earthquakes, #Keeps the request's profile in the worker
+                from_epoch_ms(slice_start).isoformat(), from_epoch_ms(slice_end).isoformat(),
+                min_magnitude, max_magnitude, min_latitude, max_latitude, min_longitude, max_longitude,
+                orderby="time" if descending else "time-asc")
+
+        ranges = list(zip(bounds, bounds[1:]))
+        pending = deque(submit(slice_start, slice_end) for slice_start, slice_end in (ranges[::-1] if descending else ranges))
+        seen = set()  # Slice boundaries are inclusive on both ends, so boundary events come back twice
+        while pending:
+            slice_start, slice_end, future = pending.popleft()
+            try:
+                earthquakes = future.result()
+            except SearchLimitExceeded:
+                if slice_end - slice_start > MIN_SLICE_MS:
+                    middle = slice_start + (slice_end - slice_start) // 2
+                    halves = [(slice_start, middle), (middle, slice_end)]
+                    for half_start, half_end in (halves if descending else halves[::-1]): #The half yielded first ends up in front
+                        pending.appendleft(submit(half_start, half_end))
+                    continue
+                earthquakes = None
+                logging.error(f"More than {USGS_MAX_RESULTS} earthquakes in one hour from {from_epoch_ms(slice_start).isoformat()}")
+            if earthquakes is None:
+                for _, _, other in pending:
+                    other.cancel()
+                raise RuntimeError(f"Could not fetch earthquakes between {from_epoch_ms(slice_start).isoformat()} and {from_epoch_ms(slice_end).isoformat()}")
+
+            for earthquake in earthquakes:
+                if earthquake.get('id') not in seen:
+                    seen.add(earthquake.get('id'))
+                    yield earthquake
+
+    def fetch_earthquakes_sliced(self, start_time, end_time, min_magnitude=None, max_magnitude=None,
+                                 min_latitude=None, max_latitude=None, min_longitude=None, max_longitude=None,
+                                 limit=None, orderby=None):
+        """
+        Same as fetch_earthquakes, but windows of sliced_fetch_min_days or more are fetched in parallel time
+        slices and are complete even past the API's search limit, as are shorter windows the API refuses for
+        matching too many events. Queries with a limit are fetched in one request. Returns None on failure.
+        """
+        window_ms = to_epoch_ms(end_time) - to_epoch_ms(start_time)
+        if limit is not None:
+            return self.fetch_earthquakes(start_time, end_time, min_magnitude, max_magnitude, min_latitude,
+                                          max_latitude, min_longitude, max_longitude, limit, orderby)
+        slices = None
+        if window_ms < self.sliced_fetch_min_days * 24 * 60 * 60 * 1000:
+            try:
+                return self.fetch_earthquakes(start_time, end_time, min_magnitude, max_magnitude, min_latitude,
+                                              max_latitude, min_longitude, max_longitude, limit, orderby)
+            except SearchLimitExceeded:
+                slices = self.max_fetch_workers  # Too many events for one request after all
+        try:
+            earthquakes = list(self.iter_earthquakes_sliced(start_time, end_time, min_magnitude, max_magnitude,
+                                                            min_latitude, max_latitude, min_longitude, max_longitude,
+                                                            slices))
+        except RuntimeError as e:
+            logging.error(f"Sliced fetch failed: {e}")
+            return None
+
+        return order_earthquakes(earthquakes, orderby)
+
     def calculate_distance(self, user_latitude, user_longitude, earthquake, units="km"):
         """
         Calculates the distance between the user's location and the earthquake's epicenter.
         """
         try:
-            earthquake_longitude, earthquake_latitude = earthquake['geometry']['coordinates']
+            earthquake_longitude, earthquake_latitude = earthquake['geometry']['coordinates'][:2] #GeoJSON coordinates also carry the depth
 
             # Validate coordinates
             if not -90 <= user_latitude <= 90 or not -180 <= user_longitude <= 180:
@@ -111,38 +329,110 @@ class EarthquakeDataFetcher:
             a = sin(dlat / 2)**2 + cos(user_latitude) * cos(earthquake_latitude) * sin(dlon / 2)**2
             c = 2 * atan2(sqrt(a), sqrt(1 - a))
 
-            distance_km = 6371 * c
+            distance_km = EARTH_RADIUS_KM * c
 
-            if units == "km":
-                return distance_km
-            elif units == "miles":
-                return distance_km * 0.621371
-            elif units == "nm":  # Nautical miles
-                return distance_km * 0.539957
-            else:
+            if units not in UNIT_FACTORS:
                 raise ValueError("Invalid units.  Must be 'km', 'miles', or 'nm'.")
+            return distance_km * UNIT_FACTORS[units]
         except ValueError as e:
-            print(f"Value Error: {e}")
+            logging.warning(f"Value Error: {e}")
             return None
         except KeyError as e:
-            print(f"Key Error: {e}")
+            logging.warning(f"Key Error: {e}")
             return None
 
+    def extract_coordinates(self, earthquakes):
+        """
+        Returns an (n, 2) array of (longitude, latitude) in GeoJSON order, with NaN rows for features missing coordinates.
+        """
+        if isinstance(earthquakes, EventBatch):
+            return earthquakes.coordinates
+        coordinates = np.full((len(earthquakes), 2), np.nan)
+        for i, earthquake in enumerate(earthquakes):
+            try:
+                coordinates[i] = earthquake['geometry']['coordinates'][:2]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return coordinates
+
+    def calculate_distances(self, user_latitude, user_longitude, coordinates, units="km"):
+        """
+        Vectorized calculate_distance: the distances from the user's location to every (longitude, latitude) row in one pass.
+        Rows with missing or out of range coordinates come back as NaN.
+        """
+        if not -90 <= user_latitude <= 90 or not -180 <= user_longitude <= 180:
+            raise ValueError("Invalid user coordinates: latitude must be between -90 and 90, longitude between -180 and 180")
+        if units not in UNIT_FACTORS:
+            raise ValueError("Invalid units.  Must be 'km', 'miles', or 'nm'.")
+
+        with timed("distance"):
+            coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+            longitudes, latitudes = coordinates[:, 0], coordinates[:, 1]
+            with np.errstate(invalid='ignore'): #NaN rows are expected and stay NaN
+                invalid = ~((np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180))
+
+            user_latitude, user_longitude = radians(user_latitude), radians(user_longitude)
+            latitudes, longitudes = np.radians(latitudes), np.radians(longitudes)
+
+            a = np.sin((latitudes - user_latitude) / 2)**2 + cos(user_latitude) * np.cos(latitudes) * np.sin((longitudes - user_longitude) / 2)**2
+            distances = 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a)) * UNIT_FACTORS[units]
+            distances[invalid] = np.nan
+            return distances
+
+    def annotate_distances(self, user_latitude, user_longitude, earthquakes, units="km"):
+        """
+        Returns copies of the earthquakes with properties.distance_km set (None where it can't be calculated).
+        """
+        distances = self.calculate_distances(user_latitude, user_longitude, self.extract_coordinates(earthquakes), units)
+        with timed("distance_annotation"):
+            return [annotate_distance(earthquake, None if distance != distance else distance) #NaN != NaN
+                    for earthquake, distance in zip(earthquakes, distances.tolist())]
+
+
+    def iter_annotated_distances(self, user_latitude, user_longitude, earthquakes, units="km", batch_size=1000):
+        """
+        Streaming annotate_distances: distances are calculated one vectorized batch at a time.
+        """
+        for batch in batched(earthquakes, batch_size):
+            yield from self.annotate_distances(user_latitude, user_longitude, batch, units)
+
+    def fetch_event_batch(self, start_time, end_time, min_magnitude=None, max_magnitude=None,
+                          min_latitude=None, max_latitude=None, min_longitude=None, max_longitude=None,
+                          limit=None, orderby=None):
+        """
+        Same as fetch_earthquakes_sliced but returns an EventBatch, read straight from the event store's
+        columns when it covers the query. Returns None on failure.
+        """
+        if self.event_store is not None:
+            try:
+                if self.event_store.covers(start_time, min_magnitude):
+                    with timed("store_query"):
+                        return self.event_store.query_batch(start_time, end_time, min_magnitude, max_magnitude,
+                                                            min_latitude, max_latitude, min_longitude, max_longitude,
+                                                            limit, orderby)
+            except Exception:
+                logging.exception("Event store query failed, falling back to the API:")
+
+        earthquakes = self.fetch_earthquakes_sliced(start_time, end_time, min_magnitude, max_magnitude, min_latitude,
+                                                    max_latitude, min_longitude, max_longitude, limit, orderby)
+        return EventBatch.from_features(earthquakes) if earthquakes is not None else None
 
     def get_heatmap_data(self, earthquakes):
         """
         Extracts latitude, longitude, and magnitude data for heatmap visualization.
+        Accepts GeoJSON features or an EventBatch; events without coordinates are skipped.
         """
-        heatmap_data = []
-        for earthquake in earthquakes:
-            try:
-                longitude, latitude = earthquake['geometry']['coordinates']
-                magnitude = earthquake['properties']['mag']
-                heatmap_data.append([latitude, longitude, magnitude])
-            except (KeyError, TypeError) as e:
-                logging.warning(f"Error extracting heatmap data for earthquake ID {earthquake.get('id', 'unknown')}: {e}")
-                continue
-        return heatmap_data
+        events = EventBatch.coerce(earthquakes)
+        magnitudes = [None if magnitude != magnitude else magnitude for magnitude in events.magnitudes.tolist()]
+        return [list(row) for row in zip(events.latitudes.tolist(), events.longitudes.tolist(), magnitudes)]
+
+    def get_heatmap_grid(self, earthquakes, cell_deg):
+        """
+        Aggregates the earthquakes (GeoJSON features or an EventBatch) into a HeatmapGrid of cell_deg degree
+        cells instead of one point per event.
+        """
+        events = EventBatch.coerce(earthquakes)
+        return aggregate_heatmap(events.coordinates, events.magnitudes, cell_deg)
 
     def convert_time(self, earthquake):
         """Converts the earthquake time (milliseconds since epoch) to a datetime object.
@@ -157,99 +447,265 @@ class EarthquakeDataFetcher:
             timestamp_ms = earthquake['properties']['time']
             return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
         except (KeyError, TypeError) as e:
-            print(f"Error converting time: {e}")
+            logging.error(f"Error converting time: {e}")
             return None
 
 
-    def prepare_data_for_model(self, earthquakes, sequence_length=30):
+    def model_features(self, earthquakes, features=("mag",)):
         """
-        Prepares the earthquake data for the LSTM model, including scaling and sequence creation.
+        (n, len(features)) array of the model input columns for an EventBatch sorted oldest first, in the batch's order.
+        Features: "mag", "depth" (missing depths become the median depth) and "interval", the hours since the
+        previous event (0 for the first).
         """
-        magnitudes = np.array([e['properties']['mag'] for e in earthquakes]).reshape(-1, 1) #Magnitude is the main driving force
-
-        # Scale the data
-        magnitudes_scaled = self.scaler.fit_transform(magnitudes) #Scale the magnitudes to 0-1, fit the scaler first so each location learns on their own scale
-
-        # Create sequences
-        X, y = [], []
-        for i in range(len(magnitudes_scaled) - sequence_length):
-            X.append(magnitudes_scaled[i:i + sequence_length])
-            y.append(magnitudes_scaled[i + sequence_length]) #The next value after the sequence
+        columns = []
+        for feature in features:
+            if feature == "mag":
+                columns.append(earthquakes.magnitudes)
+            elif feature == "depth":
+                depths = earthquakes.depths
+                known = depths[~np.isnan(depths)]
+                columns.append(np.where(np.isnan(depths), np.median(known) if len(known) else 0.0, depths))
+            elif feature == "interval":
+                columns.append(np.diff(earthquakes.times, prepend=earthquakes.times[:1]) / 3600000) #In hours, the batch is sorted oldest first
+            else:
+                raise ValueError("Unknown model feature {}, expected one of {}".format(feature, ", ".join(MODEL_FEATURES)))
+        return np.column_stack(columns) if columns else np.empty((len(earthquakes), 0))
 
-        return np.array(X), np.array(y)
+    def prepare_data_for_model(self, earthquakes, sequence_length=30, scaler=None, fit=True, features=("mag",)):
+        """
+        Prepares the earthquake data (GeoJSON features or an EventBatch, oldest first) for the LSTM model, including scaling and sequence creation.
+        Pass a scaler to keep the fitted state local to the caller, since the fetcher is shared between requests.
+        With fit=False the scaler is used as already fitted, e.g. the one saved with a region's model.
+        X has shape (samples, sequence_length, len(features)) and y holds the scaled magnitude following each sequence.
+        X is a read-only strided view over the scaled data, so the windows cost no extra memory.
+        """
+        if scaler is None:
+            scaler = self.scaler
+        if "mag" not in features:
+            raise ValueError("The model features must include mag, the prediction target")
+        data = self.model_features(EventBatch.coerce(earthquakes), features) #Magnitude is the main driving force
 
-    def create_lstm_model(self, sequence_length):
+        # Scale the data
+        if fit:
+            data_scaled = scaler.fit_transform(data) #Scale each feature to 0-1, fit the scaler first so each location learns on their own scale
+        else:
+            data_scaled = scaler.transform(data)
+
+        # Create sequences, one window per start position, each followed by its target
+        if len(data_scaled) <= sequence_length:
+            return np.empty((0, sequence_length, len(features))), np.empty((0, 1))
+        windows = np.lib.stride_tricks.sliding_window_view(data_scaled, sequence_length, axis=0) #(n - sequence_length + 1, features, sequence_length)
+        X = windows[:-1].transpose(0, 2, 1) #The last window has no next value to learn
+        target = features.index("mag")
+        y = data_scaled[sequence_length:, target:target + 1] #The next value after each sequence
+
+        return X, y
+
+    def create_lstm_model(self, sequence_length, n_features=1):
         """
         Creates a basic LSTM model.
         """
+        import tensorflow as tf
         model = tf.keras.models.Sequential() #Fixed: Using tf.keras
-        model.add(tf.keras.layers.LSTM(50, activation='relu', input_shape=(sequence_length, 1))) #Fixed: Using tf.keras
+        model.add(tf.keras.layers.LSTM(50, activation='relu', input_shape=(sequence_length, n_features))) #Fixed: Using tf.keras
         model.add(tf.keras.layers.Dense(1)) #Fixed: Using tf.keras
         model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=0.001), loss='mse') #Fixed: Using tf.keras
         return model
 
-    def train_model(self, X, y, sequence_length, epochs=10, batch_size=32): #Adjust epochs and batch size as needed
+    def train_model(self, X, y, sequence_length, epochs=10, batch_size=32, region=None, scaler=None, features=None): #Adjust epochs and batch size as needed
         """
-        Trains the LSTM model and saves it.
+        Trains the LSTM model and saves it, as the region's next version together with its scaler and feature
+        columns when a region is given, otherwise to the shared model_path.
         """
         logging.info("Training the LSTM model...")
 
         # Create the model
-        self.model = self.create_lstm_model(sequence_length)
+        model = self.create_lstm_model(sequence_length, X.shape[2]) #One input per feature column
 
         # Train the model
-        self.model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0) #Set verbose to 1 to see training progress
+        model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0) #Set verbose to 1 to see training progress
 
-        # Save the model
-        self.model.save(self.model_path) #Fixed: Using tf.keras
-        logging.info("Model saved to {}".format(self.model_path))
-        return self.model
+        # Save the model and share it with the other requests in this process
+        if region is not None and self.region_models is not None:
+            return self.region_models.put(region, model, scaler, features or self.feature_columns)[1]
+        return self.model_registry.put(model)
 
-    def predict_next_earthquake_ml(self, earthquakes, retrain = False):
+    def _retrain(self, X, y, sequence_length, region, scaler, features):
         """
-        Predicts the magnitude of the next earthquake using the LSTM model.
+        Trains a new model. Concurrent retrains of one region are serialized, and a request that waited for
+        another one's retrain reuses its result instead of training again. Returns (model, scaler, features).
+        """
+        if region is None:
+            return self.train_model(X, y, sequence_length), scaler, features
+        seen_version = self.region_models.current_version(region)
+        with self.region_models.training_lock(region):
+            if self.region_models.current_version(region) != seen_version:
+                entry = self.region_models.get(region)
+                if entry is not None:
+                    return entry[1], entry[2], entry[3]
+            return self.train_model(X, y, sequence_length, region=region, scaler=scaler, features=features), scaler, features
+
+    def train_region(self, earthquakes, region, sequence_length=30, features=None):
+        """
+        Trains a new model version for the region from GeoJSON features or an EventBatch, as done by the
+        background training jobs, on the given feature columns (feature_columns by default). Returns the region's
+        current version afterwards.
+        """
+        features = tuple(features or self.feature_columns)
+        earthquakes = EventBatch.coerce(earthquakes)
+        earthquakes = earthquakes.take(~np.isnan(earthquakes.magnitudes)).sorted_by_time() #Oldest first, the API returns newest first
+        if len(earthquakes) <= sequence_length:
+            raise ValueError("Not enough data to train.  Need more than {} earthquakes.".format(sequence_length))
+
+        scaler = MinMaxScaler()
+        X, y = self.prepare_data_for_model(earthquakes, sequence_length, scaler, features=features)
+        self._retrain(X, y, sequence_length, region, scaler, features)
+        return self.region_models.current_version(region)
+
+    def has_model(self, region=None):
+        """
+        True if a prediction for the region can be made without training first, from its own model or the shared one.
+        """
+        return self.has_region_model(region) or self.model is not None
+
+    def has_region_model(self, region):
+        """
+        True if the region has a model of its own, rather than falling back to the shared one.
+        """
+        return region is not None and self.region_models is not None and self.region_models.get(region) is not None
+
+    def predict_next_earthquake_ml(self, earthquakes, retrain = False, region=None):
+        """
+        Predicts the magnitude of the next earthquake using the LSTM model, from GeoJSON features or an EventBatch.
+        With a region (see RegionModelRegistry.cell_for) the region's own model and saved scaler are used, and
+        retraining creates a new version for that region instead of overwriting the shared model file.
         THIS IS NOT A RELIABLE PREDICTION METHOD.
         """
         sequence_length = 30 #The same sequence length used to train the model
+        earthquakes = EventBatch.coerce(earthquakes)
+        earthquakes = earthquakes.take(~np.isnan(earthquakes.magnitudes)).sorted_by_time() #Events without a magnitude can't be scaled, windows run oldest to newest
         if not earthquakes or len(earthquakes) < sequence_length: #We need as much data as sequence length to make a prediction
             logging.warning("Not enough data to make a prediction.  Need at least {} earthquakes.".format(sequence_length))
             return None
-
-        X, y = self.prepare_data_for_model(earthquakes, sequence_length) #Create the training data
-
-        #Check for existing model
-        if not self.model:
-            logging.warning("No model found. Training a new model...")
-            retrain = True #If there is no existing model then train a new one
-
-        if retrain:
-            try:
-                self.model = self.train_model(X, y, sequence_length)
-                logging.info("Training Completed")
-            except Exception as e:
-                logging.error("Could not train model {}".format(e))
-                return None
+        if self.region_models is None:
+            region = None
+
+        entry = self.region_models.get(region) if region is not None and not retrain else None
+        if entry is not None:
+            _, model, scaler, features = entry
+            X, y = self.prepare_data_for_model(earthquakes, sequence_length, scaler, fit=False, features=features) #Scale like the model's training data
+        else:
+            features = self.feature_columns
+            scaler = MinMaxScaler() #Local to this call, the fetcher is shared between requests
+            X, y = self.prepare_data_for_model(earthquakes, sequence_length, scaler, features=features) #Create the training data
+
+            #Check for existing model, regions without their own model fall back to the shared one
+            if not retrain:
+                model = self.model
+                if not model:
+                    logging.warning("No model found. Training a new model...")
+                    retrain = True #If there is no existing model then train a new one
+
+            if retrain:
+                try:
+                    model, scaler, features = self._retrain(X, y, sequence_length, region, scaler, features)
+                    logging.info("Training Completed")
+                except Exception as e:
+                    logging.error("Could not train model {}".format(e))
+                    return None
+                X, y = self.prepare_data_for_model(earthquakes, sequence_length, scaler, fit=False, features=features) #The scaler may come from a concurrent retrain
 
         # Prepare the last sequence for prediction
-        last_sequence = X[-1].reshape((1, sequence_length, 1)) #The model expects a 3D array (batch_size, sequence_length, features)
+        last_sequence = X[-1:] #The model expects a 3D array (batch_size, sequence_length, features)
 
         # Make the prediction
-        predicted_magnitude_scaled = self.model.predict(last_sequence, verbose = 0)[0][0] #Returns a scaled magnitude
+        with timed("inference"):
+            predicted_magnitude_scaled = model.predict(last_sequence, verbose = 0)[0][0] #Returns a scaled magnitude
 
         # Inverse transform to get the actual magnitude
-        predicted_magnitude = self.scaler.inverse_transform([[predicted_magnitude_scaled]])[0][0] #Transform it back to its original scale
+        predicted_magnitude = self._inverse_magnitude(scaler, features, predicted_magnitude_scaled) #Transform it back to its original scale
+
+        return self._prediction(predicted_magnitude, earthquakes.times)
+
+    def _inverse_magnitude(self, scaler, features, magnitude_scaled):
+        """
+        Undoes the scaling of a predicted magnitude, the mag column of a scaler fitted on all of the model's features.
+        """
+        target = features.index("mag")
+        return (magnitude_scaled - scaler.min_[target]) / scaler.scale_[target]
 
+    def _prediction(self, predicted_magnitude, times):
+        """
+        The prediction response for a predicted magnitude and the times of the events it was predicted from, oldest first.
+        """
         #For predicting the time, using a simple average of the time differences
-        times = [e['properties']['time'] for e in earthquakes]
-        time_intervals = []
-        for i in range(1, len(times)):
-            time_intervals.append(times[i] - times[i - 1])
-        average_time_interval_ms = sum(time_intervals) / len(time_intervals)
-        last_earthquake_time_ms = times[-1]
+        average_time_interval_ms = np.diff(times).mean().item()
+        last_earthquake_time_ms = times[-1].item()
         predicted_time_ms = last_earthquake_time_ms + average_time_interval_ms
         predicted_time = datetime.fromtimestamp(predicted_time_ms / 1000, tz=timezone.utc)
 
         return {
             "predicted_time": predicted_time.isoformat(),
             "predicted_magnitude": predicted_magnitude.item() #Returns a np.float32 which isn't JSON serializable so use .item() to return a regular float
-        }
\ No newline at end of file
+        }
+
+    def predict_batch(self, earthquake_batches, regions=None, compiled=True):
+        """
+        Predicts the next earthquake for many locations at once, from one EventBatch (or list of GeoJSON features)
+        per location and the matching region cells. The sequences of all locations sharing a model go through it
+        in a single batched call, with compiled=True through a cached tf.function (see batch_predictor).
+        Unlike predict_next_earthquake_ml this never trains: locations without enough data or without a model get None.
+        THIS IS NOT A RELIABLE PREDICTION METHOD.
+        """
+        sequence_length = 30 #The same sequence length used to train the model
+        if regions is None or self.region_models is None:
+            regions = [None] * len(earthquake_batches)
+
+        predictions = [None] * len(earthquake_batches)
+        groups = {} #id(model) -> (model, [(index, last sequence, scaler, features, times)])
+        for index, (earthquakes, region) in enumerate(zip(earthquake_batches, regions)):
+            earthquakes = EventBatch.coerce(earthquakes)
+            earthquakes = earthquakes.take(~np.isnan(earthquakes.magnitudes)).sorted_by_time() #Oldest first, like the single prediction
+            if len(earthquakes) <= sequence_length: #At least one full sequence before the last event
+                continue
+
+            entry = self.region_models.get(region) if region is not None else None
+            if entry is not None:
+                _, model, scaler, features = entry
+                X, _ = self.prepare_data_for_model(earthquakes, sequence_length, scaler, fit=False, features=features)
+            else:
+                model = self.model
+                if model is None:
+                    continue
+                features = self.feature_columns
+                scaler = MinMaxScaler() #Fitted per location, like the single prediction does with the shared model
+                X, _ = self.prepare_data_for_model(earthquakes, sequence_length, scaler, features=features)
+            groups.setdefault(id(model), (model, []))[1].append((index, X[-1:], scaler, features, earthquakes.times))
+
+        for model, members in groups.values():
+            sequences = np.concatenate([sequence for _, sequence, _, _, _ in members]) #(locations, sequence_length, features)
+            with timed("inference"):
+                if compiled:
+                    predicted_scaled = batch_predictor(model)(sequences)
+                else:
+                    predicted_scaled = model.predict(sequences, verbose=0)
+            for (index, _, scaler, features, times), magnitude_scaled in zip(members, predicted_scaled[:, 0]):
+                predicted_magnitude = self._inverse_magnitude(scaler, features, magnitude_scaled)
+                predictions[index] = self._prediction(predicted_magnitude, times)
+        return predictions
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """
+    Returns the process-wide EarthquakeDataFetcher shared by all requests.
+    """
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = EarthquakeDataFetcher()
+    return _fetcher
@@ -0,0 +1,96 @@
+import numpy as np  # pip install numpy
+
+
+class EventBatch:
+    """
+    Columnar view of earthquakes holding only the fields the analytics need, one NumPy array per field.
+    Times are milliseconds since epoch, missing depths and magnitudes are NaN.
+    """
+
+    __slots__ = ("ids", "times", "latitudes", "longitudes", "depths", "magnitudes")
+
+    def __init__(self, ids, times, latitudes, longitudes, depths, magnitudes):
+        self.ids = np.asarray(ids, dtype=object)
+        self.times = np.asarray(times, dtype=np.int64)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.depths = np.asarray(depths, dtype=float)
+        self.magnitudes = np.asarray(magnitudes, dtype=float)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [], [])
+
+    @classmethod
+    def from_features(cls, earthquakes):
+        """
+        Builds a batch from GeoJSON features, skipping features without a time or coordinates.
+        """
+        ids, times, latitudes, longitudes, depths, magnitudes = [], [], [], [], [], []
+        for earthquake in earthquakes:
+            try:
+                properties = earthquake['properties']
+                coordinates = earthquake['geometry']['coordinates']
+                time_ms = int(properties['time'])
+                longitude, latitude = float(coordinates[0]), float(coordinates[1])
+            except (KeyError, TypeError, ValueError, IndexError):
+                continue
+            ids.append(earthquake.get('id'))
+            times.append(time_ms)
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+            depths.append(coordinates[2] if len(coordinates) > 2 and coordinates[2] is not None else np.nan)
+            magnitudes.append(properties.get('mag') if properties.get('mag') is not None else np.nan)
+        return cls(ids, times, latitudes, longitudes, depths, magnitudes)
+
+    @classmethod
+    def coerce(cls, earthquakes):
+        """
+        Returns earthquakes unchanged if it's already a batch, otherwise converts the GeoJSON features.
+        """
+        return earthquakes if isinstance(earthquakes, cls) else cls.from_features(earthquakes)
+
+    def to_features(self):
+        """
+        Converts back to (minimal) GeoJSON features with only the columns this batch holds.
+        """
+        def value(number):
+            return None if number != number else number  # NaN != NaN
+
+        return [{
+            "type": "Feature",
+            "id": event_id,
+            "properties": {"mag": value(magnitude), "time": time_ms},
+            "geometry": {"type": "Point", "coordinates": [longitude, latitude, value(depth)]},
+        } for event_id, time_ms, latitude, longitude, depth, magnitude in zip(
+            self.ids.tolist(), self.times.tolist(), self.latitudes.tolist(), self.longitudes.tolist(),
+            self.depths.tolist(), self.magnitudes.tolist())]
+
+    def __len__(self):
+        return len(self.times)
+
+    def take(self, selection):
+        """
+        Returns a new batch with the rows selected by a boolean mask or an index array.
+        """
+        return EventBatch(self.ids[selection], self.times[selection], self.latitudes[selection],
+                          self.longitudes[selection], self.depths[selection], self.magnitudes[selection])
+
+    def sorted_by_time(self, descending=False):
+        order = np.argsort(self.times, kind='stable')
+        return self.take(order[::-1] if descending else order)
+
+    @property
+    def coordinates(self):
+        """
+        (n, 2) array of (longitude, latitude) in GeoJSON order.
+        """
+        return np.column_stack([self.longitudes, self.latitudes])
+
+    def highest_magnitude(self, default=0):
+        magnitudes = self.magnitudes[~np.isnan(self.magnitudes)]
+        return float(magnitudes.max()) if len(magnitudes) else default
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, column).nbytes for column in self.__slots__)
@@ -0,0 +1,88 @@
+import re
+import numpy as np  # pip install numpy
+from heatmap import seismic_energy
+
+BUCKET_UNITS_MS = {"m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000, "w": 7 * 24 * 60 * 60 * 1000}
+MAX_TIME_BUCKETS = 10000  # Keeps a tiny bucket over a long window from producing a huge response
+
+
+def parse_bucket(bucket):
+    """
+    Bucket size in milliseconds from strings like "30m", "6h", "1d" or "2w". Raises ValueError otherwise.
+    """
+    match = re.fullmatch(r"(\d+)([mhdw])", bucket.strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"bucket must be a positive number followed by one of {', '.join(BUCKET_UNITS_MS)}, e.g. 1d")
+    return int(match.group(1)) * BUCKET_UNITS_MS[match.group(2)]
+
+
+def histogram(values, bin_width):
+    """
+    Non-empty bins of width bin_width as [lower edge, count] rows, NaN values skipped.
+    """
+    values = np.asarray(values, dtype=float)
+    bins = np.floor(values[~np.isnan(values)] / bin_width).astype(np.int64)
+    lowers, counts = np.unique(bins, return_counts=True)
+    return [[round(lower * bin_width, 6), count] for lower, count in zip(lowers.tolist(), counts.tolist())]
+
+
+def count_buckets(start_ms, end_ms, bucket_ms):
+    """
+    Number of buckets covering [start_ms, end_ms). Raises ValueError above MAX_TIME_BUCKETS.
+    """
+    bucket_count = max(-(-(end_ms - start_ms) // bucket_ms), 1)
+    if bucket_count > MAX_TIME_BUCKETS:
+        raise ValueError(f"The window spans {bucket_count} buckets, at most {MAX_TIME_BUCKETS} are allowed. Use a larger bucket.")
+    return bucket_count
+
+
+def time_buckets(times, magnitudes, start_ms, end_ms, bucket_ms):
+    """
+    Per time bucket from start_ms: [bucket start ms, count, max magnitude, energy, cumulative energy] rows.
+    Every bucket of the window is listed, empty ones included, so the rows chart directly.
+    """
+    bucket_count = count_buckets(start_ms, end_ms, bucket_ms)
+    index = np.clip((times - start_ms) // bucket_ms, 0, bucket_count - 1)
+
+    counts = np.bincount(index, minlength=bucket_count)
+    energies = np.bincount(index, weights=np.nan_to_num(seismic_energy(magnitudes)), minlength=bucket_count)
+    max_magnitudes = np.full(bucket_count, np.nan)
+    np.fmax.at(max_magnitudes, index, magnitudes)  # fmax ignores NaN on either side
+    starts = start_ms + np.arange(bucket_count, dtype=np.int64) * bucket_ms
+
+    return [[bucket_start, count, max_magnitude if max_magnitude == max_magnitude else None, energy, cumulative]
+            for bucket_start, count, max_magnitude, energy, cumulative in zip(
+                starts.tolist(), counts.tolist(), max_magnitudes.tolist(), energies.tolist(), np.cumsum(energies).tolist())]
+
+
+def summarize(earthquakes, start_ms, end_ms, bucket_ms, magnitude_bin=0.5, depth_bin=10.0):
+    """
+    Aggregate statistics of an EventBatch over [start_ms, end_ms): totals, magnitude and depth distributions and
+    a time series. Energies are joules (see heatmap.seismic_energy), depths kilometers.
+    """
+    magnitudes = earthquakes.magnitudes[~np.isnan(earthquakes.magnitudes)]
+    depths = earthquakes.depths[~np.isnan(earthquakes.depths)]
+
+    return {
+        "count": len(earthquakes),
+        "magnitude": {
+            "max": float(magnitudes.max()) if len(magnitudes) else None,
+            "mean": float(magnitudes.mean()) if len(magnitudes) else None,
+            "bin_width": magnitude_bin,
+            "histogram": histogram(magnitudes, magnitude_bin),
+        },
+        "energy": float(seismic_energy(magnitudes).sum()),
+        "depth": {
+            "max": float(depths.max()) if len(depths) else None,
+            "mean": float(depths.mean()) if len(depths) else None,
+            "bin_width": depth_bin,
+            "histogram": histogram(depths, depth_bin),
+        },
+        "time": {
+            "start": start_ms,
+            "end": end_ms,
+            "bucket_ms": bucket_ms,
+            "columns": ["start", "count", "max_magnitude", "energy", "cumulative_energy"],
+            "buckets": time_buckets(earthquakes.times, earthquakes.magnitudes, start_ms, end_ms, bucket_ms),
+        },
+    }
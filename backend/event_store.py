@@ -0,0 +1,337 @@
+import os
+import sqlite3
+import uuid
+import threading
+import logging
+from datetime import datetime, timezone, timedelta
+import numpy as np  # pip install numpy
+from event_batch import EventBatch
+import json_codec
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS earthquake_event (
+    id TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    updated INTEGER NOT NULL,
+    latitude FLOAT NOT NULL,
+    longitude FLOAT NOT NULL,
+    depth FLOAT,
+    mag FLOAT,
+    feature TEXT NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_earthquake_event_time_lat_lon_mag
+    ON earthquake_event (time, latitude, longitude, mag);
+CREATE INDEX IF NOT EXISTS ix_earthquake_event_lat_lon
+    ON earthquake_event (latitude, longitude);
+CREATE TABLE IF NOT EXISTS event_sync_state (
+    key VARCHAR(80) NOT NULL,
+    value TEXT,
+    PRIMARY KEY (key)
+);
+"""
+
+SYNC_LEASE = "sync_lease"  # event_sync_state key of the lease held by the one process running the sync
+
+ORDER_BY = {
+    None: "time DESC",  # Same default as the USGS API
+    "time": "time DESC",
+    "time-asc": "time ASC",
+    "magnitude": "mag DESC",
+    "magnitude-asc": "mag ASC",
+}
+
+
+def to_epoch_ms(timestamp):
+    """
+    Converts an ISO 8601 string (naive values are treated as UTC, like the USGS API does) to milliseconds since epoch.
+    """
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def from_epoch_ms(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+
+
+class EventStore:
+    """
+    Persistent local copy of the USGS event catalog, stored in SQLite and indexed on (time, lat, lon, mag).
+    """
+
+    def __init__(self, db_path, max_sync_age_seconds=None):
+        self.db_path = db_path
+        self.max_sync_age_seconds = max_sync_age_seconds  # The catalog is stale once the last sync is older than this
+        self._local = threading.local()  # sqlite3 connections can't be shared between threads
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._write_lock:
+            self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers don't block the sync writer
+            self._local.connection = connection
+        return connection
+
+    def get_state(self, key, default=None):
+        row = self._connection().execute("SELECT value FROM event_sync_state WHERE key = ?", (key,)).fetchone()
+        return json_codec.loads(row[0]) if row else default
+
+    def set_state(self, key, value):
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "INSERT INTO event_sync_state (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (key, json_codec.dumps(value)))
+
+    def acquire_lease(self, name, owner, duration_seconds):
+        """
+        Takes or renews the named lease for owner, unless another owner holds one that hasn't expired. The check and
+        the write are a single statement, so it's safe between processes sharing the database. Returns whether owner
+        holds the lease.
+        """
+        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+        lease = {"owner": owner, "expires": now_ms + int(duration_seconds * 1000)}
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                before = connection.total_changes
+                connection.execute(
+                    "INSERT INTO event_sync_state (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value "
+                    "WHERE json_extract(event_sync_state.value, '$.owner') = ? "
+                    "OR json_extract(event_sync_state.value, '$.expires') < ?",
+                    (name, json_codec.dumps(lease), owner, now_ms))
+                return connection.total_changes > before
+
+    def release_lease(self, name, owner):
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "DELETE FROM event_sync_state WHERE key = ? AND json_extract(value, '$.owner') = ?", (name, owner))
+
+    def upsert(self, earthquakes):
+        """
+        Inserts new events and replaces stored ones whose `updated` timestamp is newer. Returns the number of rows written.
+        """
+        rows = []
+        for earthquake in earthquakes:
+            try:
+                properties = earthquake['properties']
+                coordinates = earthquake['geometry']['coordinates']
+                longitude, latitude = coordinates[:2]
+                depth = coordinates[2] if len(coordinates) > 2 else None
+                rows.append((earthquake['id'], properties['time'], properties.get('updated') or properties['time'],
+                             latitude, longitude, depth, properties.get('mag'), json_codec.dumps(earthquake)))
+            except (KeyError, TypeError, ValueError) as e:
+                logging.warning(f"Skipping malformed earthquake {earthquake.get('id', 'unknown')}: {e}")
+
+        if not rows:
+            return 0
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                before = connection.total_changes
+                connection.executemany(
+                    "INSERT INTO earthquake_event (id, time, updated, latitude, longitude, depth, mag, feature) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET time = excluded.time, updated = excluded.updated, "
+                    "latitude = excluded.latitude, longitude = excluded.longitude, depth = excluded.depth, "
+                    "mag = excluded.mag, feature = excluded.feature "
+                    "WHERE excluded.updated > earthquake_event.updated",
+                    rows)
+                return connection.total_changes - before
+
+    def covers(self, start_time, min_magnitude=None):
+        """
+        Whether the synced catalog is complete for queries starting at start_time (ISO 8601) with the given minimum
+        magnitude, and recent enough: a sync that stopped or keeps failing leaves the queries to the API again.
+        """
+        if not self.get_state("backfill_complete", False):
+            return False
+        if self.max_sync_age_seconds is not None:
+            last_synced = self.get_state("last_synced")
+            now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+            if last_synced is None or now_ms - last_synced > self.max_sync_age_seconds * 1000:
+                return False
+        synced_from = self.get_state("synced_from")
+        if synced_from is None or to_epoch_ms(start_time) < synced_from:
+            return False
+        sync_min_magnitude = self.get_state("min_magnitude")
+        if sync_min_magnitude is not None and (min_magnitude is None or min_magnitude < sync_min_magnitude):
+            return False
+        return True
+
+    def query(self, start_time, end_time, min_magnitude=None, max_magnitude=None, min_latitude=None,
+              max_latitude=None, min_longitude=None, max_longitude=None, limit=None, orderby=None):
+        """
+        Returns the stored GeoJSON features matching the same filters as the USGS query endpoint.
+        """
+        sql, args = self._select("feature", start_time, end_time, min_magnitude, max_magnitude, min_latitude,
+                                 max_latitude, min_longitude, max_longitude, limit, orderby)
+        return [json_codec.loads(row[0]) for row in self._connection().execute(sql, args)]
+
+    def query_batch(self, start_time, end_time, min_magnitude=None, max_magnitude=None, min_latitude=None,
+                    max_latitude=None, min_longitude=None, max_longitude=None, limit=None, orderby=None):
+        """
+        Same as query, but returns an EventBatch read from the indexed columns without decoding the GeoJSON.
+        """
+        sql, args = self._select("id, time, latitude, longitude, depth, mag", start_time, end_time, min_magnitude,
+                                 max_magnitude, min_latitude, max_latitude, min_longitude, max_longitude, limit, orderby)
+        rows = self._connection().execute(sql, args).fetchall()
+        if not rows:
+            return EventBatch.empty()
+        ids, times, latitudes, longitudes, depths, magnitudes = zip(*rows)
+        return EventBatch(ids, times, latitudes, longitudes,
+                          [np.nan if depth is None else depth for depth in depths],
+                          [np.nan if magnitude is None else magnitude for magnitude in magnitudes])
+
+    def _select(self, columns, start_time, end_time, min_magnitude, max_magnitude, min_latitude,
+                max_latitude, min_longitude, max_longitude, limit, orderby):
+        if orderby not in ORDER_BY:
+            raise ValueError(f"Unsupported orderby value: {orderby}")
+
+        clauses = ["time >= ?", "time <= ?"]
+        args = [to_epoch_ms(start_time), to_epoch_ms(end_time)]
+        if min_magnitude is not None:
+            clauses.append("mag >= ?")
+            args.append(min_magnitude)
+        if max_magnitude is not None:
+            clauses.append("mag <= ?")
+            args.append(max_magnitude)
+        if min_latitude is not None:
+            clauses.append("latitude >= ?")
+            args.append(min_latitude)
+        if max_latitude is not None:
+            clauses.append("latitude <= ?")
+            args.append(max_latitude)
+        if min_longitude is not None and min_longitude < -180:
+            # Box crossing the antimeridian, the USGS API accepts longitudes down to -360
+            clauses.append("(longitude >= ? OR longitude <= ?)")
+            args.extend([min_longitude + 360, max_longitude if max_longitude is not None else 180])
+        elif max_longitude is not None and max_longitude > 180:
+            clauses.append("(longitude >= ? OR longitude <= ?)")
+            args.extend([min_longitude if min_longitude is not None else -180, max_longitude - 360])
+        else:
+            if min_longitude is not None:
+                clauses.append("longitude >= ?")
+                args.append(min_longitude)
+            if max_longitude is not None:
+                clauses.append("longitude <= ?")
+                args.append(max_longitude)
+
+        sql = "SELECT {} FROM earthquake_event WHERE {} ORDER BY {}".format(columns, " AND ".join(clauses), ORDER_BY[orderby])
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return sql, args
+
+
+class EventSync(threading.Thread):
+    """
+    Background thread that backfills the event store and then keeps it current by only pulling events
+    updated after the last sync. Every worker process starts one, but only the holder of the store's sync lease
+    fetches; the others wait and take over if its lease runs out. Failed steps are retried after a backoff
+    doubling from retry_seconds up to max_retry_seconds.
+    """
+
+    def __init__(self, store, fetcher, interval_seconds=60, history_days=365 * 5, chunk_days=7, min_magnitude=None,
+                 lease_seconds=None, retry_seconds=5, max_retry_seconds=600):
+        super().__init__(name="event-sync", daemon=True)
+        self.store = store
+        self.fetcher = fetcher
+        self.interval_seconds = interval_seconds
+        self.history_days = history_days
+        self.chunk_days = chunk_days
+        self.min_magnitude = min_magnitude
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        # Outlasts the wait between syncs plus a slow sync step, renewed before every step
+        self.lease_seconds = lease_seconds or interval_seconds * 3 + 120
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        failures = 0
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    if not self.store.acquire_lease(SYNC_LEASE, self.owner, self.lease_seconds):
+                        self._stop_event.wait(self.interval_seconds)  # Another process is syncing
+                        continue
+                    synced = self.sync_once()
+                except Exception:
+                    logging.exception("Event store sync failed:")
+                    synced = False
+                if not synced:
+                    failures += 1
+                    self._stop_event.wait(min(self.retry_seconds * 2 ** (failures - 1), self.max_retry_seconds))
+                    continue
+                failures = 0
+                if self.store.get_state("backfill_complete", False):
+                    self._stop_event.wait(self.interval_seconds)
+        finally:
+            self.store.release_lease(SYNC_LEASE, self.owner)
+
+    def _fetch(self, start_ms, end_ms, updated_after_ms=None):
+        params = self.fetcher.build_query_params(
+            start_time=from_epoch_ms(start_ms).isoformat(),
+            end_time=from_epoch_ms(end_ms).isoformat(),
+            min_magnitude=self.min_magnitude,
+            orderby="time-asc")
+        if updated_after_ms is not None:
+            params["updatedafter"] = from_epoch_ms(updated_after_ms).isoformat()
+        return self.fetcher.fetch_from_api_split(params)  # Dense chunks and long catch-ups exceed the search limit
+
+    def sync_once(self):
+        """
+        Runs one sync step: a backfill chunk while the backfill is incomplete, otherwise an incremental update.
+        Returns whether the step succeeded.
+        """
+        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+        if self.store.get_state("synced_from") is None or self.store.get_state("min_magnitude") != self.min_magnitude:
+            # First run, or the synced magnitude range changed: start a fresh backfill
+            self.store.set_state("synced_from", now_ms - int(timedelta(days=self.history_days).total_seconds() * 1000))
+            self.store.set_state("min_magnitude", self.min_magnitude)
+            self.store.set_state("backfilled_to", None)
+            self.store.set_state("backfill_complete", False)
+            # Anything updated while the backfill runs is picked up by the first incremental sync
+            self.store.set_state("last_updated", now_ms)
+
+        if not self.store.get_state("backfill_complete", False):
+            chunk_start = self.store.get_state("backfilled_to") or self.store.get_state("synced_from")
+            chunk_end = min(chunk_start + int(timedelta(days=self.chunk_days).total_seconds() * 1000), now_ms)
+            earthquakes = self._fetch(chunk_start, chunk_end)
+            if earthquakes is None:
+                return False
+            self.store.upsert(earthquakes)
+            self.store.set_state("backfilled_to", chunk_end)
+            if chunk_end >= now_ms:
+                self.store.set_state("backfill_complete", True)
+                self.store.set_state("last_synced", now_ms)
+                logging.info("Event store backfill complete")
+            return True
+
+        last_updated = self.store.get_state("last_updated")
+        earthquakes = self._fetch(self.store.get_state("synced_from"), now_ms, updated_after_ms=last_updated)
+        if earthquakes is None:
+            return False
+        self.store.upsert(earthquakes)
+        updated = [e['properties'].get('updated') for e in earthquakes if e.get('properties', {}).get('updated')]
+        if updated:
+            self.store.set_state("last_updated", max(updated))
+        self.store.set_state("last_synced", now_ms)
+        return True
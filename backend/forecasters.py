@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+import numpy as np  # pip install numpy
+from event_batch import EventBatch
+
+FORECAST_ENGINES = ("stats", "lstm")  # stats answers from NumPy alone, lstm loads TensorFlow
+MAGNITUDE_BIN = 0.1  # USGS magnitudes are reported to one decimal
+DEFAULT_B_VALUE = 1.0  # Typical tectonic b-value, used when too few events are above completeness
+MIN_B_VALUE_EVENTS = 20  # Fewer complete events give an unstable b-value estimate
+EXCEEDANCE_MAGNITUDES = (5.0, 6.0, 7.0)
+EXCEEDANCE_DAYS = 30
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def magnitude_of_completeness(magnitudes, bin_width=MAGNITUDE_BIN):
+    """
+    Magnitude above which the catalog is taken to be complete, by the maximum curvature method:
+    the most populated magnitude bin.
+    """
+    bins = np.round(np.asarray(magnitudes, dtype=float) / bin_width).astype(np.int64)
+    values, counts = np.unique(bins, return_counts=True)
+    return round(float(values[np.argmax(counts)] * bin_width), 6)
+
+
+def b_value(magnitudes, completeness, bin_width=MAGNITUDE_BIN):
+    """
+    Gutenberg-Richter b-value by Aki's maximum likelihood estimate, with Utsu's correction for binned magnitudes.
+    Returns None when it's undefined, i.e. all complete magnitudes sit in the lowest bin.
+    """
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    complete = magnitudes[magnitudes >= completeness - bin_width / 2]
+    if not len(complete) or complete.max() < completeness + bin_width / 2:
+        return None
+    excess = complete.mean() - (completeness - bin_width / 2)
+    return float(np.log10(np.e) / excess)
+
+
+def forecast(earthquakes, start_ms=None, end_ms=None):
+    """
+    Statistical forecast for a region from its event history (GeoJSON features or an EventBatch), computed with
+    NumPy only. Events above the magnitude of completeness are modeled as a Poisson process whose magnitudes
+    follow the Gutenberg-Richter law. The observation window defaults to the span of the events; pass the
+    queried window when it's known, since a quiet end of the window lowers the rate.
+    Returns None if there are fewer than two events with a magnitude.
+    """
+    earthquakes = EventBatch.coerce(earthquakes)
+    earthquakes = earthquakes.take(~np.isnan(earthquakes.magnitudes))
+    if len(earthquakes) < 2:
+        return None
+
+    times = earthquakes.times
+    start_ms = int(times.min()) if start_ms is None else start_ms
+    end_ms = int(times.max()) if end_ms is None else end_ms
+    window_days = max((end_ms - start_ms) / DAY_MS, 1 / 24)  # At least an hour, so a burst doesn't divide by zero
+
+    completeness = magnitude_of_completeness(earthquakes.magnitudes)
+    complete = earthquakes.magnitudes >= completeness - MAGNITUDE_BIN / 2
+    b = b_value(earthquakes.magnitudes, completeness) if complete.sum() >= MIN_B_VALUE_EVENTS else None
+    b_estimated = b is not None
+    b = b if b_estimated else DEFAULT_B_VALUE
+    rate_per_day = complete.sum() / window_days  # Events at or above completeness
+
+    # The next event comes after an exponential waiting time with mean 1 / rate, whose magnitude
+    # has the Gutenberg-Richter mean of the complete events
+    predicted_time_ms = max(end_ms, int(times.max())) + DAY_MS / rate_per_day
+    predicted_magnitude = completeness - MAGNITUDE_BIN / 2 + np.log10(np.e) / b
+
+    exceedance = {}
+    for magnitude in EXCEEDANCE_MAGNITUDES:
+        rate = rate_per_day * 10 ** (-b * (magnitude - (completeness - MAGNITUDE_BIN / 2)))  # From the bin's lower edge, like the rate
+        exceedance[f"{magnitude:g}"] = float(1 - np.exp(-rate * EXCEEDANCE_DAYS))
+
+    return {
+        "predicted_time": datetime.fromtimestamp(predicted_time_ms / 1000, tz=timezone.utc).isoformat(),
+        "predicted_magnitude": float(predicted_magnitude),
+        "engine": "stats",
+        "b_value": b,
+        "b_value_estimated": b_estimated,
+        "magnitude_of_completeness": completeness,
+        "rate_per_day": float(rate_per_day),
+        "exceedance_probability_days": EXCEEDANCE_DAYS,
+        "exceedance_probability": exceedance,  # Chance of at least one event of each magnitude or above
+    }
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from math import ceil
+import numpy as np  # pip install numpy
+
+TILE_CELLS = 64  # Cells across one map tile, so a zoom level's cell size matches what a tile can show
+MAX_ZOOM = 20  # Finest zoom level served, its cell size is also the smallest accepted cell_deg
+
+
+def cell_size_for_zoom(zoom):
+    """
+    Grid cell size in degrees for a web map zoom level (zoom 0 shows the whole world in one tile).
+    """
+    return 360 / (2 ** zoom) / TILE_CELLS
+
+
+def viewport_cell_count(cell_deg, min_latitude=None, max_latitude=None, min_longitude=None, max_longitude=None):
+    """
+    Upper bound on the grid cells of cell_deg degrees a viewport can return, the whole world where a bound is missing.
+    """
+    latitude_span = min((90 if max_latitude is None else max_latitude) - (-90 if min_latitude is None else min_latitude), 180)
+    longitude_span = min((180 if max_longitude is None else max_longitude) - (-180 if min_longitude is None else min_longitude), 360)
+    return ceil(max(latitude_span, 0) / cell_deg) * ceil(max(longitude_span, 0) / cell_deg)
+
+
+def seismic_energy(magnitudes):
+    """
+    Radiated energy in joules from the Gutenberg-Richter relation log10(E) = 1.5 M + 4.8.
+    """
+    return np.power(10.0, 1.5 * np.asarray(magnitudes, dtype=float) + 4.8)
+
+
+class HeatmapGrid:
+    """
+    Events binned into a global latitude/longitude grid: per cell the event count, maximum magnitude and total energy.
+    """
+
+    def __init__(self, cell_deg, latitudes, longitudes, counts, max_magnitudes, energies):
+        self.cell_deg = cell_deg
+        self.latitudes = latitudes  # Cell centers
+        self.longitudes = longitudes
+        self.counts = counts
+        self.max_magnitudes = max_magnitudes
+        self.energies = energies
+
+    def to_json(self, min_latitude=None, max_latitude=None, min_longitude=None, max_longitude=None):
+        """
+        Returns the non-empty cells inside the viewport as [latitude, longitude, count, max_magnitude, energy] rows.
+        """
+        mask = np.ones(len(self.counts), dtype=bool)
+        if min_latitude is not None:
+            mask &= self.latitudes >= min_latitude
+        if max_latitude is not None:
+            mask &= self.latitudes <= max_latitude
+        if min_longitude is not None and min_longitude < -180:
+            mask &= (self.longitudes >= min_longitude + 360) | (self.longitudes <= (max_longitude if max_longitude is not None else 180))
+        elif max_longitude is not None and max_longitude > 180:
+            mask &= (self.longitudes >= (min_longitude if min_longitude is not None else -180)) | (self.longitudes <= max_longitude - 360)
+        else:
+            if min_longitude is not None:
+                mask &= self.longitudes >= min_longitude
+            if max_longitude is not None:
+                mask &= self.longitudes <= max_longitude
+
+        # max_magnitude is NaN for cells where no event has a magnitude
+        cells = [[latitude, longitude, count, max_magnitude if max_magnitude == max_magnitude else None, energy]
+                 for latitude, longitude, count, max_magnitude, energy in zip(
+                     self.latitudes[mask].tolist(), self.longitudes[mask].tolist(), self.counts[mask].tolist(),
+                     self.max_magnitudes[mask].tolist(), self.energies[mask].tolist())]
+        return {"cell_deg": self.cell_deg, "cells": cells}
+
+
+def aggregate_heatmap(coordinates, magnitudes, cell_deg):
+    """
+    Bins (longitude, latitude) rows into a grid of cell_deg degrees. Rows with missing coordinates are skipped,
+    missing magnitudes count towards the cell but add no energy.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    valid = ~np.isnan(coordinates).any(axis=1)
+    longitudes, latitudes, magnitudes = coordinates[valid, 0], coordinates[valid, 1], magnitudes[valid]
+
+    columns = ceil(360 / cell_deg)
+    rows = ceil(180 / cell_deg)
+    x = np.clip(((longitudes + 180) // cell_deg).astype(np.int64), 0, columns - 1)
+    y = np.clip(((latitudes + 90) // cell_deg).astype(np.int64), 0, rows - 1)
+    cell_ids, inverse = np.unique(y * columns + x, return_inverse=True)
+
+    counts = np.bincount(inverse, minlength=len(cell_ids))
+    energies = np.bincount(inverse, weights=np.nan_to_num(seismic_energy(magnitudes)), minlength=len(cell_ids))
+    max_magnitudes = np.full(len(cell_ids), -np.inf)
+    np.fmax.at(max_magnitudes, inverse, magnitudes)  # fmax ignores NaN magnitudes
+    max_magnitudes[np.isneginf(max_magnitudes)] = np.nan
+
+    return HeatmapGrid(cell_deg,
+                       (cell_ids // columns + 0.5) * cell_deg - 90,
+                       (cell_ids % columns + 0.5) * cell_deg - 180,
+                       counts, max_magnitudes, energies)
+
+
+class HeatmapTileCache:
+    """
+    Small LRU cache of computed HeatmapGrids whose entries expire after ttl_seconds.
+    """
+
+    def __init__(self, max_entries=32, ttl_seconds=60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached grid for key, calling compute() to build it on a miss. A None result isn't cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        grid = compute()
+        if grid is None:
+            return None
+        with self._lock:
+            self._entries[key] = (time.monotonic(), grid)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return grid
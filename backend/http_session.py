@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import json_codec
+from metrics import timed, UPSTREAM_REQUESTS
+
+
+def create_session(pool_size=10, retries=3, backoff_factor=0.5, backoff_jitter=0.5):
+    """
+    Creates a requests Session with a connection pool and bounded retries with exponential backoff and jitter.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # The last response is returned and raise_for_status reports it
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+class HttpClient:
+    """
+    Pooled, retrying HTTP client for the USGS API. Responses carrying an ETag or Last-Modified header are
+    remembered, and later identical requests are sent as conditional requests so a 304 can reuse the body.
+    The remembered bodies are kept encoded and bounded to max_conditional_bytes in total, least recently used first out.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=30, pool_size=10, retries=3, max_conditional_bytes=32 * 1024 * 1024):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = create_session(pool_size, retries)
+        self.max_conditional_bytes = max_conditional_bytes
+        self._validated = OrderedDict()  # (url, params) -> (etag, last_modified, content)
+        self._validated_bytes = 0
+        self._lock = threading.Lock()
+
+    def get_json(self, url, params=None):
+        """
+        GETs url and returns the decoded JSON body. Raises requests exceptions on HTTP and network errors,
+        and ValueError if the body isn't JSON.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        headers = {}
+        with self._lock:
+            validated = self._validated.get(key)
+        if validated is not None:
+            etag, last_modified, _ = validated
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        with timed("upstream_fetch"):
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        UPSTREAM_REQUESTS.inc(status=response.status_code)
+        if response.status_code == 304 and validated is not None:
+            with self._lock:
+                if key in self._validated:
+                    self._validated.move_to_end(key)
+            content = validated[2]
+        else:
+            response.raise_for_status()
+            content = response.content
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if (etag or last_modified) and len(content) <= self.max_conditional_bytes:
+                self._remember(key, (etag, last_modified, content))
+
+        with timed("json_decode"):
+            return json_codec.loads(content)  # Decoded per call, callers may modify what they get
+
+    def _remember(self, key, validated):
+        with self._lock:
+            previous = self._validated.pop(key, None)
+            if previous is not None:
+                self._validated_bytes -= len(previous[2])
+            self._validated[key] = validated
+            self._validated_bytes += len(validated[2])
+            while self._validated_bytes > self.max_conditional_bytes:
+                _, evicted = self._validated.popitem(last=False)
+                self._validated_bytes -= len(evicted[2])
@@ -0,0 +1,64 @@
+import json
+import logging
+
+try:
+    import orjson  # pip install orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKENDS = ("orjson", "json")  # orjson is several times faster on event lists, json is the stdlib fallback
+
+_backend = "orjson" if orjson is not None else "json"
+# NumPy values encode as lists and numbers, non-string keys as strings like the stdlib does, and datetimes go
+# through default so both backends render them the same way
+_ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                   if orjson is not None else 0)
+
+
+def set_backend(name):
+    """
+    Selects the backend used by dumps and loads. Asking for orjson when it isn't installed keeps the stdlib.
+    Returns the backend in use.
+    """
+    global _backend
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"JSON backend must be one of {', '.join(JSON_BACKENDS)}, got {name}")
+    if name == "orjson" and orjson is None:
+        logging.warning("orjson is not installed, using the json module")
+        name = "json"
+    _backend = name
+    return _backend
+
+
+def get_backend():
+    return _backend
+
+
+def dumps_bytes(obj, default=None, sort_keys=False):
+    """
+    Compact UTF-8 encoded JSON. default is called for objects the encoder doesn't support, as with json.dumps.
+    """
+    if _backend == "orjson":
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+        except TypeError:
+            pass  # E.g. integers over 64 bits, which the stdlib handles
+    return json.dumps(obj, default=default, sort_keys=sort_keys, separators=(",", ":")).encode()
+
+
+def dumps(obj, default=None, sort_keys=False):
+    """
+    Same as dumps_bytes, as a str.
+    """
+    if _backend == "orjson":
+        return dumps_bytes(obj, default, sort_keys).decode()
+    return json.dumps(obj, default=default, sort_keys=sort_keys, separators=(",", ":"))
+
+
+def loads(data):
+    """
+    Decodes JSON from a str or UTF-8 bytes. Raises json.JSONDecodeError (orjson's error subclasses it) on invalid input.
+    """
+    if _backend == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,214 @@
+import asyncio
+import queue
+import threading
+import time
+import logging
+from collections import deque
+import json_codec
+
+USGS_HOUR_FEED = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson"
+HEARTBEAT_SECONDS = 15  # Comment lines keep proxies from closing idle streams and reveal disconnected clients
+
+
+class FeedFilter:
+    """
+    Per-subscriber filter on minimum magnitude and a bounding box. A box with min_longitude > max_longitude
+    crosses the antimeridian.
+    """
+
+    def __init__(self, min_magnitude=None, min_latitude=None, max_latitude=None, min_longitude=None, max_longitude=None):
+        self.min_magnitude = min_magnitude
+        self.min_latitude = min_latitude
+        self.max_latitude = max_latitude
+        self.min_longitude = min_longitude
+        self.max_longitude = max_longitude
+
+    def matches(self, feature):
+        try:
+            magnitude = feature['properties'].get('mag')
+            longitude, latitude = feature['geometry']['coordinates'][:2]
+        except (KeyError, TypeError, ValueError):
+            return False
+        if self.min_magnitude is not None and (magnitude is None or magnitude < self.min_magnitude):
+            return False
+        if self.min_latitude is not None and latitude < self.min_latitude:
+            return False
+        if self.max_latitude is not None and latitude > self.max_latitude:
+            return False
+        if self.min_longitude is not None and self.max_longitude is not None and self.min_longitude > self.max_longitude:
+            return longitude >= self.min_longitude or longitude <= self.max_longitude
+        if self.min_longitude is not None and longitude < self.min_longitude:
+            return False
+        if self.max_longitude is not None and longitude > self.max_longitude:
+            return False
+        return True
+
+
+class Subscription:
+    """
+    One connected client: a bounded queue of (sequence, change) items. A client that falls max_pending
+    changes behind is dropped rather than letting the queue grow.
+    """
+
+    def __init__(self, feed_filter, max_pending=1000):
+        self.filter = feed_filter
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def offer(self, sequence, change):
+        if self.overflowed or not self.filter.matches(change["feature"]):
+            return
+        try:
+            self.queue.put_nowait((sequence, change))
+        except queue.Full:
+            self.overflowed = True
+
+
+class AsyncSubscription(Subscription):
+    """
+    Subscription consumed from an event loop: the poller thread hands changes over to the loop, which queues
+    them on an asyncio.Queue, so a waiting client holds no thread.
+    """
+
+    def __init__(self, feed_filter, loop, max_pending=1000):
+        super().__init__(feed_filter, max_pending)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    def offer(self, sequence, change):
+        if self.overflowed or not self.filter.matches(change["feature"]):
+            return
+        self.loop.call_soon_threadsafe(self._put, sequence, change)
+
+    def _put(self, sequence, change):
+        try:
+            self.queue.put_nowait((sequence, change))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class FeedPoller(threading.Thread):
+    """
+    Single background poller of the USGS real-time feed, shared by every stream subscriber so that upstream load
+    doesn't grow with the number of clients. Each poll is diffed against the last one by id and updated time,
+    and new or updated events are fanned out to the matching subscriptions. It only polls while someone is
+    subscribed. The last history_size changes are kept so reconnecting clients can resume from Last-Event-ID.
+    """
+
+    def __init__(self, http_client, feed_url=USGS_HOUR_FEED, interval_seconds=30, history_size=500):
+        super().__init__(name="usgs-feed-poller", daemon=True)
+        self.http_client = http_client
+        self.feed_url = feed_url
+        self.interval_seconds = interval_seconds
+        self._seen = None  # id -> updated of the last poll, None until the first poll primed it
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)  # (sequence, change)
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def subscribe(self, feed_filter, last_event_id=None, subscription=None):
+        """
+        Registers a subscription (a new Subscription for feed_filter unless one is given), replaying the kept
+        changes after last_event_id if the client is resuming.
+        """
+        subscription = subscription or Subscription(feed_filter)
+        with self._lock:
+            if last_event_id is not None:
+                for sequence, change in self._history:
+                    if sequence > last_event_id:
+                        subscription.offer(sequence, change)
+            self._subscriptions.add(subscription)
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def run(self):
+        while True:
+            if not self.subscriber_count:
+                self._seen = None  # Nobody listened in the meantime, so don't report the whole feed as new
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                self.poll_once()
+            except Exception:
+                logging.exception("Polling the USGS feed failed:")
+            time.sleep(self.interval_seconds)
+
+    def poll_once(self):
+        """
+        Fetches the feed once and publishes the events that are new or updated since the previous poll.
+        Returns the number of changes.
+        """
+        features = self.http_client.get_json(self.feed_url).get("features", [])
+        current = {feature.get("id"): (feature.get("properties") or {}).get("updated") for feature in features}
+
+        if self._seen is None:
+            self._seen = current  # The first poll only establishes the baseline
+            return 0
+
+        changes = []
+        for feature in features:
+            previous = self._seen.get(feature.get("id"), False)
+            if previous is False:
+                changes.append({"type": "new", "feature": feature})
+            elif previous != current[feature.get("id")]:
+                changes.append({"type": "updated", "feature": feature})
+        self._seen = current  # Events that aged out of the feed are forgotten
+
+        with self._lock:
+            for change in changes:
+                self._sequence += 1
+                self._history.append((self._sequence, change))
+                for subscription in self._subscriptions:
+                    subscription.offer(self._sequence, change)
+        return len(changes)
+
+
+def sse_events(poller, feed_filter, last_event_id=None, heartbeat_seconds=HEARTBEAT_SECONDS):
+    """
+    Subscribes to the poller once the response is first read, so a response that is never sent (a HEAD request,
+    a client gone before the body) leaves no subscription behind. Yields the changes as Server-Sent Events, with
+    a comment line when idle, and unsubscribes when the client goes away.
+    """
+    subscription = poller.subscribe(feed_filter, last_event_id)
+    try:
+        yield f"retry: {poller.interval_seconds * 1000}\n\n"
+        while not subscription.overflowed:
+            try:
+                sequence, change = subscription.queue.get(timeout=heartbeat_seconds)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {sequence}\nevent: {change['type']}\ndata: {json_codec.dumps(change['feature'])}\n\n"
+        yield "event: overflow\ndata: {}\n\n"  # The client was too slow, it reconnects with Last-Event-ID
+    finally:
+        poller.unsubscribe(subscription)
+
+
+async def async_sse_events(poller, feed_filter, last_event_id=None, heartbeat_seconds=HEARTBEAT_SECONDS):
+    """
+    sse_events with an AsyncSubscription, awaiting changes instead of blocking a thread.
+    """
+    subscription = poller.subscribe(feed_filter, last_event_id, AsyncSubscription(feed_filter, asyncio.get_running_loop()))
+    try:
+        yield f"retry: {poller.interval_seconds * 1000}\n\n"
+        while not subscription.overflowed:
+            try:
+                sequence, change = await asyncio.wait_for(subscription.queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {sequence}\nevent: {change['type']}\ndata: {json_codec.dumps(change['feature'])}\n\n"
+        yield "event: overflow\ndata: {}\n\n"
+    finally:
+        poller.unsubscribe(subscription)
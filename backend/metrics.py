@@ -0,0 +1,165 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Seconds
+PROFILE_HEADER = "X-Profile"  # Requests sending it get a Server-Timing breakdown of their stages
+
+
+def _label_text(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense: per label set, counts of observations <= each bound,
+    plus their sum and count.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)  # First bound >= value, len(buckets) for +Inf
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(series[-1])}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The process's metrics, rendered in the Prometheus text exposition format. Collectors are callables
+    returning (name, type, documentation, value) tuples read at scrape time, e.g. cache statistics.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, metric_type, documentation, value in collect():
+                lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}", f"{name} {_number(value)}"])
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("earthquake_stage_seconds", "Time spent in each hot-path stage.", ("stage",))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("earthquake_http_request_seconds", "Request handling time until the response is built.", ("method", "endpoint", "status"))
+UPSTREAM_REQUESTS = REGISTRY.counter("earthquake_upstream_requests_total", "Requests sent to USGS, by response status.", ("status",))
+
+_profile = contextvars.ContextVar("earthquake_profile", default=None)
+
+
+def start_profile():
+    """
+    Starts collecting the stage timings of the current request (context), see server_timing.
+    """
+    timings = []
+    _profile.set(timings)
+    return timings
+
+
+def stop_profile():
+    _profile.set(None)
+
+
+@contextmanager
+def timed(stage):
+    """
+    Records the duration of the block in STAGE_SECONDS, and in the current request's profile if one is active.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _profile.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing(timings, total_seconds=None):
+    """
+    Server-Timing header value summing the timings per stage, e.g. upstream_fetch;dur=812.4;desc="3 calls".
+    Stages running in parallel threads are summed, so they can add up to more than the total.
+    """
+    stages = {}
+    for stage, elapsed in list(timings):
+        total, calls = stages.get(stage, (0.0, 0))
+        stages[stage] = (total + elapsed, calls + 1)
+    entries = [f'{stage};dur={total * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+               for stage, (total, calls) in stages.items()]
+    if total_seconds is not None:
+        entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,275 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import logging
+import weakref
+from collections import OrderedDict
+from math import floor
+import numpy as np  # pip install numpy
+from sklearn.preprocessing import MinMaxScaler  # pip install scikit-learn
+from metrics import timed
+
+
+def load_keras_model(model_path):
+    """
+    Loads a Keras model from disk. TensorFlow is imported here rather than at module
+    level so that routes which never predict don't pay for the import.
+    """
+    with timed("model_load"):
+        import tensorflow as tf
+        return tf.keras.models.load_model(model_path)
+
+
+_predictors = weakref.WeakKeyDictionary()
+_predictors_lock = threading.Lock()
+
+
+def batch_predictor(model):
+    """
+    Returns a function running the model on a batch of sequences through a cached tf.function, which avoids
+    the per-call setup of model.predict. The batch dimension is left open so batches of any size reuse one trace.
+    """
+    with _predictors_lock:
+        predictor = _predictors.get(model)
+        if predictor is None:
+            import tensorflow as tf
+            model_ref = weakref.ref(model)  # The cache must not keep the model alive
+            function = tf.function(lambda X: model_ref()(X, training=False),
+                                   input_signature=[tf.TensorSpec([None, *model.input_shape[1:]], tf.float32)])
+            predictor = lambda X: function(tf.convert_to_tensor(X, dtype=tf.float32)).numpy()
+            _predictors[model] = predictor
+        return predictor
+
+
+class ModelRegistry:
+    """
+    Holds a single Keras model per worker process, loaded lazily on first use and
+    reloaded only when the model file's mtime changes.
+    """
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self._model = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.model_path)
+        except OSError:
+            return None
+
+    def get(self):
+        """
+        Returns the current model, or None if no model file exists yet.
+        """
+        mtime = self._file_mtime()
+        if mtime is None:
+            return self._model  # A model trained in-process may not have been persisted
+        if self._model is not None and mtime == self._mtime:
+            return self._model
+
+        with self._lock:
+            # Another thread may have loaded it while we waited for the lock
+            if self._model is not None and mtime == self._mtime:
+                return self._model
+            try:
+                self._model = load_keras_model(self.model_path)
+                self._mtime = mtime
+                logging.info("Loaded earthquake model from {}".format(self.model_path))
+            except Exception as e:
+                logging.warning("Could not load existing model. {}".format(e))
+                logging.info("If this is the first run the model can be automatically trained with a boolean in predict_next_earthquake_ml")
+            return self._model
+
+    def put(self, model):
+        """
+        Saves a freshly trained model and makes it the current one.
+        """
+        with self._lock:
+            model.save(self.model_path)
+            self._model = model
+            self._mtime = self._file_mtime()
+            logging.info("Model saved to {}".format(self.model_path))
+        return model
+
+    def warm_up(self):
+        """
+        Loads the model ahead of the first request. Returns True if a model is available.
+        """
+        return self.get() is not None
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_model_registry(model_path):
+    """
+    Returns the process-wide registry for the given model path.
+    """
+    with _registries_lock:
+        registry = _registries.get(model_path)
+        if registry is None:
+            registry = ModelRegistry(model_path)
+            _registries[model_path] = registry
+        return registry
+
+
+def region_cell(latitude, longitude, cell_deg):
+    """
+    Key of the grid cell of cell_deg degrees containing the point, e.g. "2_4_19".
+    """
+    return "{:g}_{}_{}".format(cell_deg, floor((latitude + 90) / cell_deg), floor((longitude + 180) / cell_deg))
+
+
+def scaler_to_dict(scaler):
+    return {
+        "data_min": scaler.data_min_.tolist(),
+        "data_max": scaler.data_max_.tolist(),
+        "feature_range": list(scaler.feature_range),
+    }
+
+
+def scaler_from_dict(params):
+    """
+    Rebuilds a fitted MinMaxScaler; fitting on the stored min and max reproduces the original transform.
+    """
+    scaler = MinMaxScaler(feature_range=tuple(params["feature_range"]))
+    return scaler.fit(np.array([params["data_min"], params["data_max"]]))
+
+
+class RegionModelRegistry:
+    """
+    Versioned LSTM models per region cell, each saved with the parameters of the scaler it was trained with.
+
+    Layout: <root>/<cell>/v<N>/model.h5 and scaler.json (with the feature columns the scaler was fitted on), plus
+    <root>/<cell>/CURRENT holding the active version.
+    Versions are written to a temporary directory and renamed into place, and CURRENT is replaced atomically,
+    so concurrent retrains (even from other processes) never leave a half-written model behind.
+    Hot models are kept in an in-memory LRU.
+    """
+
+    def __init__(self, root_dir, cell_deg=2.0, max_models=16, keep_versions=3):
+        self.root_dir = root_dir
+        self.cell_deg = cell_deg
+        self.max_models = max_models
+        self.keep_versions = keep_versions
+        self._models = OrderedDict()  # cell -> (version, model, scaler, features)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._training_locks = {}
+        os.makedirs(root_dir, exist_ok=True)
+
+    def cell_for(self, latitude, longitude):
+        return region_cell(latitude, longitude, self.cell_deg)
+
+    def training_lock(self, cell):
+        """
+        Lock serializing retrains of one cell within this process.
+        """
+        with self._lock:
+            return self._training_locks.setdefault(cell, threading.Lock())
+
+    def current_version(self, cell):
+        try:
+            with open(os.path.join(self.root_dir, cell, "CURRENT")) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def get(self, cell):
+        """
+        Returns (version, model, scaler, features) for the cell's current version, or None if it has no model yet.
+        """
+        version = self.current_version(cell)
+        if version is None:
+            return None
+        with self._lock:
+            entry = self._models.get(cell)
+            if entry is not None and entry[0] == version:
+                self._models.move_to_end(cell)
+                return entry
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(cell, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(cell)
+                if entry is not None and entry[0] == version:
+                    return entry
+            version_dir = os.path.join(self.root_dir, cell, "v{}".format(version))
+            try:
+                model = load_keras_model(os.path.join(version_dir, "model.h5"))
+                with open(os.path.join(version_dir, "scaler.json")) as f:
+                    params = json.load(f)
+                scaler = scaler_from_dict(params)
+                features = tuple(params.get("features", ("mag",)))  # Versions saved before multi-feature models
+            except Exception as e:
+                logging.warning("Could not load model {} for region {}. {}".format(version, cell, e))
+                return None
+            logging.info("Loaded model {} for region {}".format(version, cell))
+            return self._remember(cell, (version, model, scaler, features))
+
+    def put(self, cell, model, scaler, features=("mag",)):
+        """
+        Saves a newly trained model, its fitted scaler and the feature columns it takes as the cell's next version
+        and makes it current. Returns (version, model, scaler, features).
+        """
+        features = tuple(features)
+        cell_dir = os.path.join(self.root_dir, cell)
+        os.makedirs(cell_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=cell_dir)
+        try:
+            model.save(os.path.join(temp_dir, "model.h5"))
+            with open(os.path.join(temp_dir, "scaler.json"), "w") as f:
+                json.dump({**scaler_to_dict(scaler), "features": list(features)}, f)
+
+            version = max(self._versions(cell), default=0) + 1
+            while True:
+                version_dir = os.path.join(cell_dir, "v{}".format(version))
+                try:
+                    os.rename(temp_dir, version_dir)
+                    break
+                except OSError:
+                    if not os.path.exists(version_dir):
+                        raise
+                    version += 1  # Another process took this version number first
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        if version > (self.current_version(cell) or 0):  # A newer version saved concurrently stays current
+            self._write_current(cell, version)
+        self._prune(cell, version)
+        logging.info("Saved model {} for region {}".format(version, cell))
+        return self._remember(cell, (version, model, scaler, features))
+
+    def _write_current(self, cell, version):
+        cell_dir = os.path.join(self.root_dir, cell)
+        fd, temp_path = tempfile.mkstemp(prefix=".CURRENT-", dir=cell_dir)
+        with os.fdopen(fd, "w") as f:
+            f.write(str(version))
+        os.replace(temp_path, os.path.join(cell_dir, "CURRENT"))
+
+    def _versions(self, cell):
+        try:
+            names = os.listdir(os.path.join(self.root_dir, cell))
+        except OSError:
+            return []
+        return [int(name[1:]) for name in names if name.startswith("v") and name[1:].isdigit()]
+
+    def _prune(self, cell, current):
+        for version in sorted(self._versions(cell))[:-self.keep_versions]:
+            if version != current:
+                shutil.rmtree(os.path.join(self.root_dir, cell, "v{}".format(version)), ignore_errors=True)
+
+    def _remember(self, cell, entry):
+        with self._lock:
+            self._models[cell] = entry
+            self._models.move_to_end(cell)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return entry
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+APPROX_FEATURE_BYTES = 3000  # Rough in-memory size of one parsed USGS GeoJSON feature
+
+
+def quantize_time(timestamp, quantum_seconds, round_up=False):
+    """
+    Rounds an ISO 8601 timestamp down (or up) to a multiple of quantum_seconds, so that logically equal
+    windows built from datetime.now() share a cache key. Naive timestamps are treated as UTC.
+    """
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    seconds = parsed.timestamp()
+    quantized = (-(-seconds // quantum_seconds) if round_up else seconds // quantum_seconds) * quantum_seconds
+    return datetime.fromtimestamp(quantized, tz=timezone.utc).isoformat()
+
+
+def estimate_size(value):
+    return len(value) * APPROX_FEATURE_BYTES if isinstance(value, list) else APPROX_FEATURE_BYTES
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    LRU cache with a TTL and an approximate memory bound. Concurrent misses for the same key are coalesced
+    so only one of them calls the loader, the others wait for its result.
+    """
+
+    def __init__(self, ttl_seconds=60, max_bytes=256 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._in_flight = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for key, or calls loader() once to produce it. None results aren't cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                self._remove(key)
+
+            call = self._in_flight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                call = self._in_flight[key] = _InFlight()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None and call.value is not None:
+                    self._store(key, call.value)
+            call.done.set()
+        return call.value
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None on a miss. For callers that load values themselves,
+        e.g. async code that can't block in get_or_load.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if value is None:
+            return
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self._size += size
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "approx_bytes": self._size,
+            }
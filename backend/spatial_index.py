@@ -0,0 +1,126 @@
+import threading
+import time
+import logging
+from datetime import datetime, timezone, timedelta
+from math import cos, radians
+import numpy as np  # pip install numpy
+from sklearn.neighbors import BallTree  # pip install scikit-learn
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.195  # Along a meridian
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Returns (min_latitude, max_latitude, min_longitude, max_longitude) enclosing a circle of radius_km.
+    The longitude span widens with latitude; near the poles it covers every longitude. Boxes crossing the
+    antimeridian extend past -180/180, which the USGS API and the event store both accept.
+    """
+    delta_latitude = radius_km / KM_PER_DEGREE
+    min_latitude = max(latitude - delta_latitude, -90)
+    max_latitude = min(latitude + delta_latitude, 90)
+
+    widest_latitude = max(abs(min_latitude), abs(max_latitude))
+    if widest_latitude >= 89.9:
+        return min_latitude, max_latitude, -180, 180
+    delta_longitude = delta_latitude / cos(radians(widest_latitude))
+    if delta_longitude >= 180:
+        return min_latitude, max_latitude, -180, 180
+    return min_latitude, max_latitude, longitude - delta_longitude, longitude + delta_longitude
+
+
+def annotate_distance(earthquake, distance_km):
+    """
+    Returns a copy of the earthquake with properties.distance_km set, leaving the (possibly cached) original untouched.
+    """
+    return {**earthquake, 'properties': {**earthquake.get('properties', {}), 'distance_km': distance_km}}
+
+
+class SpatialIndex:
+    """
+    Ball tree over earthquake epicenters using the haversine metric, for k-nearest and radius queries in km.
+    """
+
+    def __init__(self, earthquakes):
+        self.earthquakes = []
+        coordinates = []
+        for earthquake in earthquakes:
+            try:
+                longitude, latitude = earthquake['geometry']['coordinates'][:2]
+                if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                    coordinates.append((latitude, longitude))
+                    self.earthquakes.append(earthquake)
+            except (KeyError, TypeError, ValueError) as e:
+                logging.warning(f"Skipping earthquake {earthquake.get('id', 'unknown')} in spatial index: {e}")
+        self._tree = BallTree(np.radians(coordinates), metric='haversine') if coordinates else None
+
+    def __len__(self):
+        return len(self.earthquakes)
+
+    def within_radius(self, latitude, longitude, radius_km, k=None, sort_by_distance=True):
+        """
+        Returns (earthquake, distance_km) pairs within radius_km of the point, nearest first unless
+        sort_by_distance is False, in which case the original order is kept. k keeps only the k nearest.
+        """
+        if self._tree is None:
+            return []
+        point = np.radians([[latitude, longitude]])
+        indices, distances = self._tree.query_radius(point, r=radius_km / EARTH_RADIUS_KM,
+                                                     return_distance=True, sort_results=True)
+        indices, distances = indices[0], distances[0] * EARTH_RADIUS_KM
+        if k is not None:
+            indices, distances = indices[:k], distances[:k]
+        if not sort_by_distance:
+            order = np.argsort(indices, kind='stable')
+            indices, distances = indices[order], distances[order]
+        return [(self.earthquakes[i], float(d)) for i, d in zip(indices, distances)]
+
+    def nearest(self, latitude, longitude, k):
+        """
+        Returns the k nearest (earthquake, distance_km) pairs, nearest first.
+        """
+        if self._tree is None:
+            return []
+        point = np.radians([[latitude, longitude]])
+        distances, indices = self._tree.query(point, k=min(k, len(self.earthquakes)))
+        return [(self.earthquakes[i], float(d) * EARTH_RADIUS_KM) for i, d in zip(indices[0], distances[0])]
+
+
+class RecentEventIndex:
+    """
+    Spatial index over the event store's last `days` of events, rebuilt at most every `refresh_seconds`.
+    """
+
+    def __init__(self, event_store, days, refresh_seconds=60):
+        self.event_store = event_store
+        self.days = days
+        self.refresh_seconds = refresh_seconds
+        self._index = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the current SpatialIndex, or None while the event store doesn't cover the window yet. While one thread
+        rebuilds an expired index the others keep getting the previous one, only the first build is waited for.
+        """
+        index = self._index
+        if index is not None and time.monotonic() - self._built_at < self.refresh_seconds:
+            return index
+        if not self._lock.acquire(blocking=index is None):
+            return index
+
+        try:
+            if self._index is not None and time.monotonic() - self._built_at < self.refresh_seconds:
+                return self._index
+            now = datetime.now(timezone.utc)
+            start_time = (now - timedelta(days=self.days)).isoformat()
+            if not self.event_store.covers(start_time):
+                self._index = None  # Stale or incomplete, requests go back to the API
+                return None
+            index = SpatialIndex(self.event_store.query(start_time, now.isoformat()))
+            self._index, self._built_at = index, time.monotonic()
+            logging.info(f"Rebuilt spatial index over {len(index)} events")
+            return index
+        finally:
+            self._lock.release()
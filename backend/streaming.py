@@ -0,0 +1,74 @@
+import itertools
+import logging
+from flask import Response
+import json_codec
+
+OUTPUT_FORMATS = ("json", "ndjson", "json-stream")  # json is built in memory, the others are streamed
+
+
+def batched(iterable, size):
+    """
+    Yields lists of up to size items from iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def prime(iterable):
+    """
+    Pulls the first item so that upstream errors are raised before the response status has been sent.
+    """
+    iterator = iter(iterable)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], iterator)
+
+
+def ndjson_lines(items, trailer=None):
+    """
+    Serializes items as newline-delimited JSON. trailer, if given, is called at the end and its result
+    written as a last line.
+    """
+    try:
+        for item in items:
+            yield json_codec.dumps(item) + "\n"
+        if trailer is not None:
+            yield json_codec.dumps(trailer()) + "\n"
+    except Exception as e:
+        logging.exception("Error while streaming earthquakes:")
+        yield json_codec.dumps({"error": f"Stream interrupted: {e}"}) + "\n"
+
+
+def json_array_chunks(items, prefix="[", suffix="]", chunk_size=200):
+    """
+    Serializes items as a JSON array written chunk by chunk. suffix may be a callable, evaluated once all
+    items have been written. An error mid-stream leaves the document unterminated so clients see it as truncated.
+    """
+    yield prefix
+    try:
+        first = True
+        for batch in batched(items, chunk_size):
+            chunk = ",".join(json_codec.dumps(item) for item in batch)
+            yield chunk if first else "," + chunk
+            first = False
+    except Exception:
+        logging.exception("Error while streaming earthquakes:")
+        return
+    yield suffix() if callable(suffix) else suffix
+
+
+def stream_response(items, output_format, prefix="[", suffix="]", trailer=None):
+    """
+    Streams items as NDJSON or as a chunked JSON array. For NDJSON, trailer() supplies the last line;
+    for JSON, prefix and suffix wrap the array.
+    """
+    items = prime(items)
+    if output_format == "ndjson":
+        return Response(ndjson_lines(items, trailer), mimetype="application/x-ndjson")
+    return Response(json_array_chunks(items, prefix, suffix), mimetype="application/json")
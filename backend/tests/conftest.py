@@ -0,0 +1,38 @@
+import logging
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Modules are imported by bare name from backend/
+# Makes the modules' logging.basicConfig a no-op, so the tests don't append to the tracked earthquake_fetcher.log
+logging.getLogger().addHandler(logging.NullHandler())
+
+from benchmarks.synthetic import make_earthquakes
+from benchmarks.usgs_stub import FakeUSGS
+from earthquake_data_fetcher import EarthquakeDataFetcher
+from http_session import HttpClient
+
+STUB_EVENTS = 2000
+STUB_DAYS = 60
+STUB_RESULT_CAP = 500  # Low enough that a few weeks of the stub's events exceed the search limit
+
+
+@pytest.fixture
+def earthquakes():
+    return make_earthquakes(STUB_EVENTS, days=STUB_DAYS)
+
+
+@pytest.fixture
+def usgs(earthquakes):
+    stub = FakeUSGS(earthquakes, result_cap=STUB_RESULT_CAP).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def fetcher(usgs, tmp_path):
+    fetcher = EarthquakeDataFetcher(base_url=usgs.url, model_path=str(tmp_path / "earthquake_model.h5"),
+                                    http_client=HttpClient(retries=0), max_fetch_workers=4, sliced_fetch_min_days=30)
+    yield fetcher
+    if fetcher._slice_executor is not None:
+        fetcher._slice_executor.shutdown(wait=True)
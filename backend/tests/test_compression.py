@@ -0,0 +1,86 @@
+import datetime
+import gzip
+import json
+import numpy as np
+import pytest
+from werkzeug.http import parse_etags
+import json_codec
+from compression import ResponseCompressor, etag_for, parse_accept_encoding
+
+BODY = json.dumps([{"id": f"ev{i}", "properties": {"mag": 3.0, "place": "somewhere"}} for i in range(200)]).encode()
+
+
+@pytest.fixture
+def compressor():
+    compressor = ResponseCompressor(min_bytes=1024)
+    compressor.encodings = ("gzip",)  # Whether brotli is installed or not
+    return compressor
+
+
+def test_accept_encoding_qualities():
+    assert parse_accept_encoding("gzip;q=0.5, br, identity;q=x, ") == {"gzip": 0.5, "br": 1.0, "identity": 0.0}
+    assert parse_accept_encoding(None) == {}
+
+
+@pytest.mark.parametrize("header, expected", [("gzip, deflate", "gzip"), ("GZIP;q=0.1", "gzip"), ("*", "gzip"),
+                                              ("gzip;q=0", None), ("*;q=0", None), ("deflate", None), (None, None)])
+def test_negotiation(compressor, header, expected):
+    assert compressor.negotiate(header) == expected
+
+
+def test_compressed_bodies_and_their_etags_are_stable(compressor):
+    first, second = compressor.compress(BODY, "gzip"), compressor.compress(BODY, "gzip")
+
+    assert first == second and gzip.decompress(first) == BODY
+    assert etag_for(BODY, "gzip") != etag_for(BODY)  # Each representation has its own tag
+    assert etag_for(BODY, "gzip") == etag_for(BODY, "gzip")
+    assert etag_for(BODY + b" ") != etag_for(BODY)
+    # A client revalidating with the tag it was sent gets a 304
+    if_none_match = f'"{etag_for(BODY, "gzip")}"'
+    assert parse_etags(if_none_match).contains_weak(etag_for(BODY, "gzip"))
+    assert not parse_etags(if_none_match).contains_weak(etag_for(BODY))
+
+
+def test_streamed_compression_closes_the_wrapped_stream(compressor):
+    closed = []
+
+    def chunks():
+        try:
+            yield "["
+            yield b"1,2"
+            yield "]"
+        finally:
+            closed.append(True)
+
+    assert gzip.decompress(b"".join(compressor.compress_chunks(chunks(), "gzip"))) == b"[1,2]"
+    assert closed
+
+    closed.clear()
+    stream = compressor.compress_chunks(chunks(), "gzip")
+    next(stream)
+    stream.close()  # The client went away mid-stream
+    assert closed
+    with pytest.raises(ValueError):
+        compressor.compress(BODY, "zstd")
+
+
+@pytest.mark.parametrize("backend", json_codec.JSON_BACKENDS)
+def test_json_backends_encode_alike(backend):
+    previous = json_codec.get_backend()
+    try:
+        json_codec.set_backend(backend)
+        value = {"mag": 3.5, "ids": ["a"], 1: None, "big": 2 ** 70}
+        assert json_codec.loads(json_codec.dumps_bytes(value)) == {"mag": 3.5, "ids": ["a"], "1": None, "big": 2 ** 70}
+        assert json_codec.dumps({"b": 1, "a": 2}, sort_keys=True) == '{"a":2,"b":1}'
+        assert json_codec.dumps(datetime.date(2024, 1, 2), default=str) == '"2024-01-02"'
+        if json_codec.get_backend() == "orjson":
+            assert json_codec.dumps(np.array([1, 2])) == "[1,2]"
+        with pytest.raises(json.JSONDecodeError):
+            json_codec.loads(b"{")
+    finally:
+        json_codec.set_backend(previous)
+
+
+def test_unknown_json_backend_is_rejected():
+    with pytest.raises(ValueError):
+        json_codec.set_backend("simplejson")
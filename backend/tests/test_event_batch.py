@@ -0,0 +1,55 @@
+from datetime import datetime, timezone, timedelta
+import numpy as np
+from event_batch import EventBatch
+from event_store import EventStore, EventSync
+from conftest import STUB_DAYS
+
+
+def feature(id, time_ms, longitude, latitude, depth=10.0, magnitude=3.0):
+    return {"type": "Feature", "id": id, "properties": {"mag": magnitude, "time": time_ms},
+            "geometry": {"type": "Point", "coordinates": [longitude, latitude, depth]}}
+
+
+def test_from_features_skips_unusable_features_and_keeps_missing_values_as_nan():
+    batch = EventBatch.from_features([
+        feature("a", 2000, 10.0, 20.0),
+        feature("b", 1000, -10.0, -20.0, depth=None, magnitude=None),
+        {"id": "no-time", "properties": {}, "geometry": {"coordinates": [0, 0, 0]}},
+        {"id": "no-geometry", "properties": {"time": 1}},
+    ])
+
+    assert batch.ids.tolist() == ["a", "b"]
+    assert np.isnan(batch.depths[1]) and np.isnan(batch.magnitudes[1])
+    assert batch.coordinates.tolist() == [[10.0, 20.0], [-10.0, -20.0]]
+    assert batch.to_features()[1]["properties"]["mag"] is None  # NaN back to null
+    assert EventBatch.from_features(batch.to_features()).ids.tolist() == ["a", "b"]
+
+
+def test_take_sort_and_highest_magnitude():
+    batch = EventBatch.from_features([feature("a", 3000, 0, 0, magnitude=2.0), feature("b", 1000, 0, 0, magnitude=None),
+                                      feature("c", 2000, 0, 0, magnitude=4.5)])
+
+    assert batch.sorted_by_time().ids.tolist() == ["b", "c", "a"]
+    assert batch.sorted_by_time(descending=True).ids.tolist() == ["a", "c", "b"]
+    assert batch.highest_magnitude() == 4.5
+    assert batch.take(batch.magnitudes < 3).ids.tolist() == ["a"]
+    assert EventBatch.empty().highest_magnitude() == 0 and len(EventBatch.empty()) == 0
+    assert EventBatch.coerce(batch) is batch
+
+
+def test_store_batch_matches_the_stored_features(tmp_path, fetcher):
+    store = EventStore(str(tmp_path / "event_store.db"))
+    sync = EventSync(store, fetcher, history_days=STUB_DAYS + 1, chunk_days=7)
+    for _ in range(100):
+        if store.get_state("backfill_complete"):
+            break
+        sync.sync_once()
+
+    now = datetime.now(timezone.utc)
+    query = ((now - timedelta(days=30)).isoformat(), now.isoformat(), 2.0, None, -30, 30, -60, 60, None, "time")
+    batch = store.query_batch(*query)
+    expected = EventBatch.from_features(store.query(*query))
+
+    assert len(batch) > 0
+    for column in EventBatch.__slots__:
+        np.testing.assert_array_equal(getattr(batch, column), getattr(expected, column))
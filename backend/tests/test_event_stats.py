@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import event_stats
+from event_batch import EventBatch
+from heatmap import seismic_energy
+
+HOUR_MS = event_stats.BUCKET_UNITS_MS["h"]
+
+
+@pytest.mark.parametrize("bucket, expected", [("30m", 30 * 60 * 1000), ("6h", 6 * HOUR_MS), (" 1d ", 24 * HOUR_MS),
+                                              ("2w", 14 * 24 * HOUR_MS)])
+def test_parse_bucket(bucket, expected):
+    assert event_stats.parse_bucket(bucket) == expected
+
+
+@pytest.mark.parametrize("bucket", ["0d", "1y", "d", "-1d", "1.5h", "1 d", ""])
+def test_parse_bucket_rejects_invalid_sizes(bucket):
+    with pytest.raises(ValueError):
+        event_stats.parse_bucket(bucket)
+
+
+def test_bucket_count_limit():
+    assert event_stats.count_buckets(0, event_stats.MAX_TIME_BUCKETS * HOUR_MS, HOUR_MS) == event_stats.MAX_TIME_BUCKETS
+    assert event_stats.count_buckets(0, 1, HOUR_MS) == 1  # A partial bucket still counts
+    assert event_stats.count_buckets(5, 5, HOUR_MS) == 1
+    with pytest.raises(ValueError):
+        event_stats.count_buckets(0, event_stats.MAX_TIME_BUCKETS * HOUR_MS + 1, HOUR_MS)
+
+
+def test_summary_buckets_and_histograms():
+    batch = EventBatch(["a", "b", "c", "d"], [0, HOUR_MS // 2, 2 * HOUR_MS, 3 * HOUR_MS - 1], [0] * 4, [0] * 4,
+                       [5.0, 12.0, np.nan, 14.0], [2.0, 4.5, np.nan, 3.2])
+    summary = event_stats.summarize(batch, 0, 3 * HOUR_MS, HOUR_MS)
+
+    assert summary["count"] == 4
+    assert summary["magnitude"]["max"] == 4.5
+    assert summary["magnitude"]["histogram"] == [[2.0, 1], [3.0, 1], [4.5, 1]]
+    assert summary["depth"]["histogram"] == [[0.0, 1], [10.0, 2]]
+    buckets = summary["time"]["buckets"]
+    assert [bucket[:3] for bucket in buckets] == [[0, 2, 4.5], [HOUR_MS, 0, None], [2 * HOUR_MS, 2, 3.2]]
+    assert buckets[-1][4] == pytest.approx(summary["energy"]) == pytest.approx(seismic_energy([2.0, 4.5, 3.2]).sum())
@@ -0,0 +1,138 @@
+import copy
+import time
+from datetime import datetime, timezone, timedelta
+import pytest
+from benchmarks.usgs_stub import FakeUSGS
+from event_store import EventStore, EventSync, SYNC_LEASE
+from conftest import STUB_DAYS, STUB_EVENTS
+
+
+def now_ms():
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+def days_ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def backfill(sync):
+    for _ in range(100):
+        sync.sync_once()
+        if sync.store.get_state("backfill_complete"):
+            return
+    raise AssertionError("Backfill did not complete")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EventStore(str(tmp_path / "event_store.db"), max_sync_age_seconds=300)
+
+
+def test_backfill_stores_every_event(store, fetcher, usgs):
+    sync = EventSync(store, fetcher, history_days=STUB_DAYS + 1, chunk_days=7)
+    assert not store.covers(days_ago(7))
+
+    backfill(sync)
+
+    stored = store.query(days_ago(STUB_DAYS + 1), datetime.now(timezone.utc).isoformat(), orderby="time-asc")
+    assert len(stored) == STUB_EVENTS
+    assert [earthquake["properties"]["time"] for earthquake in stored] == sorted(usgs._times.tolist())
+    assert store.covers(days_ago(7))
+
+
+def test_covers_only_the_synced_window_and_magnitudes(store, fetcher):
+    backfill(EventSync(store, fetcher, history_days=30, chunk_days=7, min_magnitude=2.0))
+
+    assert store.covers(days_ago(20), min_magnitude=2.5)
+    assert not store.covers(days_ago(40), min_magnitude=2.5)
+    assert not store.covers(days_ago(20))
+    assert not store.covers(days_ago(20), min_magnitude=1.5)
+
+
+def test_incremental_sync_picks_up_updated_and_new_events(store, fetcher, earthquakes):
+    sync = EventSync(store, fetcher, history_days=STUB_DAYS + 1, chunk_days=7)
+    backfill(sync)
+
+    revised = copy.deepcopy(earthquakes[-1])
+    revised["properties"].update(mag=9.0, updated=now_ms() + 60000)
+    new = copy.deepcopy(earthquakes[-2])
+    new["id"] = "new0000001"
+    new["properties"]["updated"] = now_ms() + 60000
+    upstream = FakeUSGS(earthquakes[:-1] + [revised, new]).start()
+    try:
+        fetcher.base_url = upstream.url
+        sync.sync_once()
+    finally:
+        upstream.stop()
+
+    stored = {earthquake["id"]: earthquake for earthquake in store.query(days_ago(STUB_DAYS + 1), datetime.now(timezone.utc).isoformat())}
+    assert len(stored) == STUB_EVENTS + 1
+    assert stored[revised["id"]]["properties"]["mag"] == 9.0
+    assert "new0000001" in stored
+
+
+def test_covers_goes_stale_when_the_sync_stops(store, fetcher):
+    sync = EventSync(store, fetcher, history_days=30, chunk_days=7)
+    backfill(sync)
+    assert store.covers(days_ago(7))
+
+    store.set_state("last_synced", now_ms() - 301 * 1000)
+    assert not store.covers(days_ago(7))
+
+    sync.sync_once()
+    assert store.covers(days_ago(7))
+
+
+def test_lease_has_one_holder_until_it_expires(store):
+    other_process = EventStore(store.db_path)
+
+    assert store.acquire_lease(SYNC_LEASE, "a", 60)
+    assert not other_process.acquire_lease(SYNC_LEASE, "b", 60)
+    assert store.acquire_lease(SYNC_LEASE, "a", 0.001)  # Renewed by its holder
+    time.sleep(0.01)
+    assert other_process.acquire_lease(SYNC_LEASE, "b", 60)
+    assert not store.acquire_lease(SYNC_LEASE, "a", 60)
+
+    other_process.release_lease(SYNC_LEASE, "b")
+    assert store.acquire_lease(SYNC_LEASE, "a", 60)
+
+
+def test_only_the_lease_holder_syncs(store, fetcher, usgs):
+    store.acquire_lease(SYNC_LEASE, "other-process", 60)
+    standby = EventSync(store, fetcher, interval_seconds=0.05, history_days=30, chunk_days=7)
+    standby.start()
+    time.sleep(0.3)
+    assert usgs.requests == 0
+
+    store.release_lease(SYNC_LEASE, "other-process")  # The holder stopped, the standby takes over
+    deadline = time.monotonic() + 10
+    while not store.get_state("backfill_complete") and time.monotonic() < deadline:
+        time.sleep(0.05)
+    standby.stop()
+    standby.join()
+
+    assert store.get_state("backfill_complete")
+    assert store.get_state(SYNC_LEASE) is None  # Released on stop
+
+
+def test_backfill_splits_chunks_over_the_search_limit(store, fetcher, earthquakes):
+    upstream = FakeUSGS(earthquakes, result_cap=100).start()
+    try:
+        fetcher.base_url = upstream.url
+        backfill(EventSync(store, fetcher, history_days=STUB_DAYS + 1, chunk_days=30))
+    finally:
+        upstream.stop()
+
+    assert len(store.query(days_ago(STUB_DAYS + 1), datetime.now(timezone.utc).isoformat())) == STUB_EVENTS
+
+
+def test_failed_steps_back_off(store, fetcher, usgs):
+    usgs.failures = 1000
+    sync = EventSync(store, fetcher, history_days=30, chunk_days=7, retry_seconds=0.2)
+    sync.start()
+    time.sleep(1)
+    sync.stop()
+    sync.join()
+
+    assert 2 <= usgs.requests <= 4  # Retried after 0.2, 0.4, 0.8 s instead of in a tight loop
+    assert not store.get_state("backfill_complete")
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import forecasters
+from event_batch import EventBatch
+
+DAY_MS = forecasters.DAY_MS
+
+
+def gutenberg_richter(count, b, completeness, seed=7):
+    """
+    Magnitudes reported to one decimal, drawn from the Gutenberg-Richter law above the completeness bin's lower edge.
+    """
+    rng = np.random.default_rng(seed)
+    continuous = completeness - forecasters.MAGNITUDE_BIN / 2 + rng.exponential(1 / (b * np.log(10)), count)
+    return np.round(continuous, 1)
+
+
+def catalog(magnitudes, days):
+    count = len(magnitudes)
+    times = np.linspace(0, days * DAY_MS, count).astype(np.int64)
+    return EventBatch([f"ev{i}" for i in range(count)], times, np.zeros(count), np.zeros(count), np.full(count, 10.0), magnitudes)
+
+
+def test_completeness_is_the_most_populated_bin():
+    assert forecasters.magnitude_of_completeness(gutenberg_richter(5000, 1.0, 2.0)) == 2.0
+    assert forecasters.magnitude_of_completeness([1.0, 1.5, 1.5, 2.3]) == 1.5
+
+
+@pytest.mark.parametrize("b", [0.8, 1.0, 1.3])
+def test_b_value_recovers_the_synthetic_catalog(b):
+    magnitudes = gutenberg_richter(20000, b, 2.0)
+    assert forecasters.b_value(magnitudes, 2.0) == pytest.approx(b, rel=0.03)
+
+
+def test_b_value_is_undefined_when_every_magnitude_is_in_the_lowest_bin():
+    assert forecasters.b_value([2.0] * 50, 2.0) is None
+
+
+def test_forecast_rates_follow_gutenberg_richter():
+    magnitudes = gutenberg_richter(20000, 1.0, 2.0)
+    result = forecasters.forecast(catalog(magnitudes, 1000), 0, 1000 * DAY_MS)
+
+    assert result["b_value_estimated"]
+    assert result["magnitude_of_completeness"] == 2.0
+    assert result["rate_per_day"] == pytest.approx(20.0)
+    # Rate of magnitude 5 and above, counted from the same bin edges as the catalog
+    observed_per_day = (magnitudes >= 5.0 - forecasters.MAGNITUDE_BIN / 2).sum() / 1000
+    expected_per_day = result["rate_per_day"] * 10 ** (-result["b_value"] * (5.0 - 1.95))
+    assert expected_per_day == pytest.approx(observed_per_day, rel=0.35)
+    assert result["exceedance_probability"]["5"] == pytest.approx(1 - np.exp(-expected_per_day * forecasters.EXCEEDANCE_DAYS))
+    probabilities = [result["exceedance_probability"][key] for key in ("5", "6", "7")]
+    assert probabilities == sorted(probabilities, reverse=True)
+
+
+def test_forecast_falls_back_to_the_default_b_value():
+    result = forecasters.forecast(catalog(gutenberg_richter(forecasters.MIN_B_VALUE_EVENTS - 5, 1.0, 2.0), 10))
+    assert result["b_value"] == forecasters.DEFAULT_B_VALUE and not result["b_value_estimated"]
+    assert forecasters.forecast(catalog(np.array([3.0, np.nan]), 10)) is None
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from heatmap import aggregate_heatmap, cell_size_for_zoom, viewport_cell_count, seismic_energy, HeatmapTileCache
+
+
+def cells_by_center(grid_json):
+    return {(latitude, longitude): (count, max_magnitude, energy)
+            for latitude, longitude, count, max_magnitude, energy in grid_json["cells"]}
+
+
+def test_events_are_binned_by_cell():
+    coordinates = [(10.2, 20.3), (10.9, 20.1), (-179.9, -89.9), (180.0, 90.0), (np.nan, 5.0)]  # (longitude, latitude)
+    grid = aggregate_heatmap(coordinates, [3.0, np.nan, 5.0, 6.0, 7.0], 1.0)
+    cells = cells_by_center(grid.to_json())
+
+    assert cells[(20.5, 10.5)][:2] == (2, 3.0)  # The missing magnitude counts but adds no energy
+    assert cells[(20.5, 10.5)][2] == pytest.approx(seismic_energy(3.0))
+    assert cells[(-89.5, -179.5)][0] == 1
+    assert cells[(89.5, 179.5)][0] == 1  # The edges of the world fall in the last cell
+    assert sum(count for count, _, _ in cells.values()) == 4  # Missing coordinates are skipped
+
+
+def test_cell_without_magnitudes_has_no_max_magnitude():
+    cells = cells_by_center(aggregate_heatmap([(0.5, 0.5)], [np.nan], 1.0).to_json())
+    assert cells[(0.5, 0.5)] == (1, None, 0.0)
+
+
+def test_viewport_across_the_antimeridian():
+    coordinates = [(179.5, 0.5), (-179.5, 0.5), (0.5, 0.5), (175.5, 30.5)]
+    grid = aggregate_heatmap(coordinates, [4.0] * 4, 1.0)
+
+    east = {longitude for _, longitude in cells_by_center(grid.to_json(-10, 10, 170, 190))}
+    west = {longitude for _, longitude in cells_by_center(grid.to_json(-10, 10, -190, -170))}
+    assert east == west == {179.5, -179.5}
+    assert {longitude for _, longitude in cells_by_center(grid.to_json(-10, 10, -10, 10))} == {0.5}
+
+
+def test_cell_sizes_and_viewport_cell_counts():
+    assert cell_size_for_zoom(0) == 360 / 64
+    assert cell_size_for_zoom(3) == cell_size_for_zoom(2) / 2
+    assert viewport_cell_count(1.0) == 180 * 360
+    assert viewport_cell_count(1.0, -10, 10, 170, 190) == 20 * 20
+    assert viewport_cell_count(1.0, 10, -10) == 0
+
+
+def test_tile_cache_expires_and_skips_failures():
+    cache = HeatmapTileCache(max_entries=2, ttl_seconds=60)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert cache.get_or_compute("a", lambda: compute("grid")) == "grid"
+    assert cache.get_or_compute("a", lambda: compute("other")) == "grid"
+    assert cache.get_or_compute("failed", lambda: compute(None)) is None
+    cache.get_or_compute("b", lambda: compute("b"))
+    cache.get_or_compute("c", lambda: compute("c"))  # Evicts the least recently used
+    assert cache.get_or_compute("a", lambda: compute("again")) == "again"
+    assert calls == ["grid", None, "b", "c", "again"]
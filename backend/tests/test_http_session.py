@@ -0,0 +1,53 @@
+import pytest
+import requests
+from benchmarks.usgs_stub import FakeUSGS
+from http_session import HttpClient
+
+
+@pytest.fixture
+def usgs_with_etags(earthquakes):
+    stub = FakeUSGS(earthquakes, etags=True).start()
+    yield stub
+    stub.stop()
+
+
+def test_retries_server_errors(usgs):
+    usgs.failures = 1
+    body = HttpClient(retries=2).get_json(usgs.url, {"limit": 10})
+    assert len(body["features"]) == 10
+    assert usgs.requests == 2
+
+
+def test_raises_once_retries_are_used_up(usgs):
+    usgs.failures = 5
+    with pytest.raises(requests.exceptions.HTTPError):
+        HttpClient(retries=1).get_json(usgs.url, {"limit": 10})
+    assert usgs.requests == 2
+
+
+def test_search_limit_error_is_not_retried(usgs):
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        HttpClient(retries=2).get_json(usgs.url)
+    assert error.value.response.status_code == 400
+    assert usgs.requests == 1
+
+
+def test_not_modified_reuses_the_remembered_body(usgs_with_etags):
+    client = HttpClient(retries=0)
+    first = client.get_json(usgs_with_etags.url, {"limit": 10})
+    first["features"].clear()  # Callers get their own copy
+
+    second = client.get_json(usgs_with_etags.url, {"limit": 10})
+    assert usgs_with_etags.not_modified == 1
+    assert len(second["features"]) == 10
+
+
+def test_remembered_bodies_stay_within_their_byte_limit(usgs_with_etags):
+    client = HttpClient(retries=0, max_conditional_bytes=16 * 1024)
+    for limit in (5, 10, 15, 20, 500):
+        client.get_json(usgs_with_etags.url, {"limit": limit})
+    assert client._validated_bytes <= 16 * 1024
+    assert (usgs_with_etags.url, (("limit", 500),)) not in client._validated  # Larger than the whole limit
+
+    client.get_json(usgs_with_etags.url, {"limit": 20})
+    assert usgs_with_etags.not_modified == 1
@@ -0,0 +1,55 @@
+import asyncio
+from live_feed import FeedFilter, FeedPoller, sse_events, async_sse_events
+
+
+def feature(longitude, latitude, magnitude=3.0):
+    return {"id": f"ev{longitude}", "geometry": {"coordinates": [longitude, latitude, 10.0]}, "properties": {"mag": magnitude}}
+
+
+def test_filter_bbox_across_the_antimeridian():
+    feed_filter = FeedFilter(min_latitude=-10, max_latitude=10, min_longitude=170, max_longitude=-170)
+
+    assert feed_filter.matches(feature(175, 0))
+    assert feed_filter.matches(feature(-175, 0))
+    assert feed_filter.matches(feature(180, 0)) and feed_filter.matches(feature(-180, 0))
+    assert not feed_filter.matches(feature(0, 0))
+    assert not feed_filter.matches(feature(175, 20))
+
+
+def test_filter_bbox_and_magnitude():
+    feed_filter = FeedFilter(min_magnitude=4.0, min_longitude=-10, max_longitude=10)
+
+    assert feed_filter.matches(feature(5, 80, 4.5))
+    assert not feed_filter.matches(feature(5, 0, 3.9))
+    assert not feed_filter.matches(feature(20, 0, 4.5))
+    assert not feed_filter.matches({"id": "no-geometry", "properties": {"mag": 5.0}})
+    assert not FeedFilter(min_magnitude=1.0).matches(feature(0, 0, None))
+
+
+def test_stream_subscribes_only_once_read():
+    poller = FeedPoller(http_client=None)
+    events = sse_events(poller, FeedFilter())
+    assert poller.subscriber_count == 0
+
+    events.close()  # A response that was never sent, e.g. a HEAD request
+    assert poller.subscriber_count == 0
+
+    events = sse_events(poller, FeedFilter())
+    assert next(events).startswith("retry:")
+    assert poller.subscriber_count == 1
+    events.close()  # The client went away
+    assert poller.subscriber_count == 0
+
+
+def test_async_stream_subscribes_only_once_read():
+    async def stream():
+        poller = FeedPoller(http_client=None)
+        events = async_sse_events(poller, FeedFilter())
+        counts = [poller.subscriber_count]
+        await events.__anext__()
+        counts.append(poller.subscriber_count)
+        await events.aclose()
+        counts.append(poller.subscriber_count)
+        return counts
+
+    assert asyncio.run(stream()) == [0, 1, 0]
@@ -0,0 +1,55 @@
+import contextvars
+from metrics import MetricsRegistry, start_profile, stop_profile, timed, server_timing, STAGE_SECONDS
+
+
+def test_counter_and_histogram_render_in_prometheus_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests.", ("status",))
+    latency = registry.histogram("latency_seconds", "Latency.", ("endpoint",), buckets=(0.1, 1))
+    registry.collector(lambda: [("cache_entries", "gauge", "Entries.", 3)])
+
+    requests.inc(status=200)
+    requests.inc(2, status=200)
+    requests.inc(status=500)
+    for value in (0.05, 0.1, 0.5, 5):
+        latency.observe(value, endpoint='/a"b')
+
+    lines = registry.render().splitlines()
+    assert 'requests_total{status="200"} 3' in lines
+    assert 'requests_total{status="500"} 1' in lines
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="0.1"} 2' in lines  # Bounds are inclusive, labels escaped
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{endpoint="/a\\"b"} 4' in lines
+    assert 'latency_seconds_sum{endpoint="/a\\"b"} 5.65' in lines
+    assert lines[-3:] == ["# HELP cache_entries Entries.", "# TYPE cache_entries gauge", "cache_entries 3"]
+
+
+def test_timed_records_into_the_request_profile_only():
+    def request():
+        profile = start_profile()
+        with timed("upstream_fetch"):
+            pass
+        with timed("upstream_fetch"):
+            pass
+        with timed("serialization"):
+            pass
+        stop_profile()
+        with timed("after"):
+            pass
+        return profile
+
+    def observations(stage):
+        return sum(STAGE_SECONDS._series.get((stage,), [0])[:-1])
+
+    before = observations("upstream_fetch"), observations("after")
+    profile = contextvars.copy_context().run(request)
+
+    assert [stage for stage, _ in profile] == ["upstream_fetch", "upstream_fetch", "serialization"]
+    assert (observations("upstream_fetch"), observations("after")) == (before[0] + 2, before[1] + 1)  # Every stage is recorded globally
+
+
+def test_server_timing_sums_stages():
+    header = server_timing([("upstream_fetch", 0.5), ("upstream_fetch", 0.25), ("serialization", 0.001)], 1.0)
+    assert header == ('upstream_fetch;dur=750.0;desc="2 calls", serialization;dur=1.0;desc="1 call", '
+                      'total;dur=1000.0')
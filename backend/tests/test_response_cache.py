@@ -0,0 +1,64 @@
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from response_cache import ResponseCache
+
+
+def window(days):
+    now = datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).isoformat(), now.isoformat()
+
+
+def test_concurrent_identical_queries_share_one_upstream_request(fetcher, usgs):
+    fetcher.response_cache = ResponseCache(ttl_seconds=60)
+    start_time, end_time = window(3)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def fetch():
+        barrier.wait()
+        results.append(fetcher.fetch_earthquakes(start_time, end_time))
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert usgs.requests == 1
+    assert len(results) == 8 and all(result == results[0] for result in results)
+    stats = fetcher.response_cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] + stats["coalesced"] == 7
+
+
+def test_coalesced_waiters_get_the_loader_error():
+    cache = ResponseCache()
+    loading = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def loader():
+        loading.set()
+        release.wait()
+        raise ValueError("upstream failed")
+
+    def load():
+        try:
+            cache.get_or_load("key", loader)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=load)
+    leader.start()
+    loading.wait()
+    waiters = [threading.Thread(target=load) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    while cache.coalesced < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join()
+
+    assert len(errors) == 4
+    assert cache.get("key") is None  # Failures aren't cached
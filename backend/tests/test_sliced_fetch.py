@@ -0,0 +1,64 @@
+from datetime import datetime, timezone, timedelta
+import pytest
+from benchmarks.usgs_stub import FakeUSGS
+from earthquake_data_fetcher import SearchLimitExceeded
+from conftest import STUB_DAYS, STUB_EVENTS, STUB_RESULT_CAP
+
+
+def window(days):
+    now = datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).isoformat(), now.isoformat()
+
+
+def test_single_request_over_the_search_limit_raises(fetcher):
+    with pytest.raises(SearchLimitExceeded):
+        fetcher.fetch_earthquakes(*window(STUB_DAYS + 1))
+
+
+def test_sliced_fetch_splits_slices_over_the_search_limit(fetcher, usgs):
+    earthquakes = fetcher.fetch_earthquakes_sliced(*window(STUB_DAYS + 1))
+
+    assert len(earthquakes) == STUB_EVENTS
+    times = [earthquake["properties"]["time"] for earthquake in earthquakes]
+    assert times == sorted(times, reverse=True)  # The API's default order
+    assert usgs.requests > STUB_EVENTS // STUB_RESULT_CAP
+
+
+def test_short_window_over_the_search_limit_falls_back_to_slices(fetcher):
+    fetcher.sliced_fetch_min_days = STUB_DAYS + 10
+    earthquakes = fetcher.fetch_earthquakes_sliced(*window(STUB_DAYS + 1), orderby="time-asc")
+
+    assert len(earthquakes) == STUB_EVENTS
+    times = [earthquake["properties"]["time"] for earthquake in earthquakes]
+    assert times == sorted(times)
+
+
+def test_events_on_slice_boundaries_are_returned_once(earthquakes, fetcher):
+    step_ms = 12 * 60 * 60 * 1000
+    for earthquake in earthquakes:  # Every slice boundary falls on some events' time
+        earthquake["properties"]["time"] -= earthquake["properties"]["time"] % step_ms
+    end_ms = int(datetime.now(timezone.utc).timestamp() * 1000) // step_ms * step_ms
+    start_ms = end_ms - 64 * step_ms
+    expected = {earthquake["id"] for earthquake in earthquakes if start_ms <= earthquake["properties"]["time"] <= end_ms}
+    upstream = FakeUSGS(earthquakes, result_cap=STUB_RESULT_CAP).start()
+    try:
+        fetcher.base_url = upstream.url
+        ids = [earthquake["id"] for earthquake in fetcher.iter_earthquakes_sliced(
+            datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc).isoformat(),
+            datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc).isoformat(), slices=64)]
+    finally:
+        upstream.stop()
+
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected
+
+
+def test_slice_that_cannot_be_split_fails(earthquakes, fetcher):
+    for earthquake in earthquakes:
+        earthquake["properties"]["time"] = earthquakes[0]["properties"]["time"]  # All in the same millisecond
+    upstream = FakeUSGS(earthquakes, result_cap=STUB_RESULT_CAP).start()
+    try:
+        fetcher.base_url = upstream.url
+        assert fetcher.fetch_earthquakes_sliced(*window(STUB_DAYS + 1)) is None
+    finally:
+        upstream.stop()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from spatial_index import SpatialIndex, bounding_box, EARTH_RADIUS_KM, KM_PER_DEGREE
+
+
+def event(id, latitude, longitude):
+    return {"id": id, "geometry": {"coordinates": [longitude, latitude, 10.0]}, "properties": {"time": 0}}
+
+
+def haversine_km(latitude, longitude, other_latitude, other_longitude):
+    latitude, longitude, other_latitude, other_longitude = np.radians([latitude, longitude, other_latitude, other_longitude])
+    a = np.sin((other_latitude - latitude) / 2) ** 2 + np.cos(latitude) * np.cos(other_latitude) * np.sin((other_longitude - longitude) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+@pytest.fixture
+def events():
+    rng = np.random.default_rng(3)
+    return [event(f"ev{i}", latitude, longitude)
+            for i, (latitude, longitude) in enumerate(zip(rng.uniform(-60, 60, 500), rng.uniform(-180, 180, 500)))]
+
+
+def test_nearest_matches_brute_force(events):
+    index = SpatialIndex(events)
+    matches = index.nearest(35.0, 139.0, 10)
+
+    expected = sorted(events, key=lambda e: haversine_km(35.0, 139.0, e["geometry"]["coordinates"][1], e["geometry"]["coordinates"][0]))[:10]
+    assert [earthquake["id"] for earthquake, _ in matches] == [earthquake["id"] for earthquake in expected]
+    distances = [distance for _, distance in matches]
+    assert distances == sorted(distances)
+    assert len(index.nearest(35.0, 139.0, 10000)) == len(events)
+
+
+def test_within_radius_matches_brute_force(events):
+    index = SpatialIndex(events)
+    matches = index.within_radius(0.0, 0.0, 2000)
+
+    expected = {e["id"] for e in events if haversine_km(0.0, 0.0, e["geometry"]["coordinates"][1], e["geometry"]["coordinates"][0]) <= 2000}
+    assert {earthquake["id"] for earthquake, _ in matches} == expected
+    assert all(distance <= 2000 for _, distance in matches)
+    assert [pair[0]["id"] for pair in index.within_radius(0.0, 0.0, 2000, k=3)] == [pair[0]["id"] for pair in matches[:3]]
+
+    in_order = index.within_radius(0.0, 0.0, 2000, sort_by_distance=False)
+    positions = [events.index(earthquake) for earthquake, _ in in_order]
+    assert positions == sorted(positions)
+
+
+def test_radius_query_across_the_antimeridian():
+    index = SpatialIndex([event("east", 0.0, 179.5), event("west", 0.0, -179.5), event("far", 0.0, 170.0)])
+    assert sorted(earthquake["id"] for earthquake, _ in index.within_radius(0.0, 180.0, 100)) == ["east", "west"]
+
+
+def test_invalid_coordinates_are_skipped():
+    index = SpatialIndex([event("ok", 10.0, 10.0), event("bad", 95.0, 10.0), {"id": "missing"}])
+    assert len(index) == 1
+    assert SpatialIndex([]).nearest(0.0, 0.0, 5) == []
+
+
+def test_bounding_box_encloses_the_radius():
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(60.0, 10.0, 500)
+    assert max_latitude - 60.0 == pytest.approx(500 / KM_PER_DEGREE)
+    assert max_longitude - 10.0 > 500 / KM_PER_DEGREE  # Wider in longitude away from the equator
+    assert bounding_box(89.0, 0.0, 500)[2:] == (-180, 180)
+    assert bounding_box(0.0, 179.0, 500)[3] > 180  # Crosses the antimeridian
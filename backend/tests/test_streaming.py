@@ -0,0 +1,53 @@
+import json
+from datetime import datetime, timezone, timedelta
+import pytest
+from streaming import json_array_chunks, ndjson_lines, prime
+from conftest import STUB_DAYS, STUB_EVENTS
+
+
+def failing_after(count):
+    for i in range(count):
+        yield {"id": i}
+    raise RuntimeError("upstream failed")
+
+
+def test_ndjson_error_becomes_the_last_line():
+    lines = [json.loads(line) for line in ndjson_lines(failing_after(3), trailer=lambda: {"count": 3})]
+
+    assert lines[:3] == [{"id": 0}, {"id": 1}, {"id": 2}]
+    assert lines[3] == {"error": "Stream interrupted: upstream failed"}  # Instead of the trailer
+    assert len(lines) == 4
+
+
+def test_ndjson_trailer_is_written_last():
+    lines = [json.loads(line) for line in ndjson_lines(iter([{"id": 0}]), trailer=lambda: {"count": 1})]
+    assert lines == [{"id": 0}, {"count": 1}]
+
+
+def test_json_array_error_leaves_the_document_unterminated():
+    body = "".join(json_array_chunks(failing_after(5), chunk_size=2))
+
+    assert body.startswith("[")
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(body)
+    assert json.loads("".join(json_array_chunks(iter([{"id": 0}, {"id": 1}]), chunk_size=1))) == [{"id": 0}, {"id": 1}]
+
+
+def test_prime_raises_before_the_first_item():
+    def failing():
+        raise RuntimeError("upstream failed")
+        yield
+
+    with pytest.raises(RuntimeError):
+        prime(failing())
+    assert list(prime(iter(()))) == []
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_sliced_iteration_order(fetcher, descending):
+    now = datetime.now(timezone.utc)
+    times = [earthquake["properties"]["time"] for earthquake in fetcher.iter_earthquakes_sliced(
+        (now - timedelta(days=STUB_DAYS + 1)).isoformat(), now.isoformat(), descending=descending)]
+
+    assert len(times) == STUB_EVENTS  # Some slices are over the search limit and get split
+    assert times == sorted(times, reverse=descending)
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS training_job (
+    id VARCHAR(32) NOT NULL,
+    region VARCHAR(80) NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    submitted_at FLOAT NOT NULL,
+    started_at FLOAT,
+    finished_at FLOAT,
+    model_version INTEGER,
+    event_count INTEGER,
+    error TEXT,
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_training_job_active_region
+    ON training_job (region) WHERE status IN ('queued', 'running');
+"""
+
+JOB_COLUMNS = ("id", "region", "status", "submitted_at", "started_at", "finished_at", "model_version", "event_count", "error")
+
+
+class JobStore:
+    """
+    Training jobs table in SQLite, shared by the web workers and the training processes.
+    At most one queued or running job exists per region.
+    """
+
+    def __init__(self, db_path, stale_after_seconds=3600):
+        self.db_path = db_path
+        self.stale_after_seconds = stale_after_seconds  # Active jobs older than this are assumed lost
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, job_id):
+        row = self._connection().execute(
+            "SELECT {} FROM training_job WHERE id = ?".format(", ".join(JOB_COLUMNS)), (job_id,)).fetchone()
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def active_for_region(self, region):
+        row = self._connection().execute(
+            "SELECT id FROM training_job WHERE region = ? AND status IN ('queued', 'running')", (region,)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def create(self, region, event_count):
+        """
+        Inserts a queued job for the region. Returns (job, created); created is False when an active job
+        for the region already exists, in which case that job is returned.
+        """
+        connection = self._connection()
+        with connection:
+            # Jobs stuck longer than stale_after_seconds (e.g. the server died mid-training) don't block new ones
+            connection.execute(
+                "UPDATE training_job SET status = 'failed', finished_at = ?, error = 'Timed out' "
+                "WHERE region = ? AND status IN ('queued', 'running') AND submitted_at < ?",
+                (time.time(), region, time.time() - self.stale_after_seconds))
+            try:
+                job_id = uuid.uuid4().hex
+                connection.execute(
+                    "INSERT INTO training_job (id, region, status, submitted_at, event_count) VALUES (?, ?, 'queued', ?, ?)",
+                    (job_id, region, time.time(), event_count))
+            except sqlite3.IntegrityError:
+                return self.active_for_region(region), False
+        return self.get(job_id), True
+
+    def update(self, job_id, **fields):
+        assignments = ", ".join("{} = ?".format(column) for column in fields)
+        connection = self._connection()
+        with connection:
+            connection.execute("UPDATE training_job SET {} WHERE id = ?".format(assignments), (*fields.values(), job_id))
+
+
+def _run_training_job(job_id, db_path, registry_root, cell_deg, region, events, features):
+    """
+    Runs in a training process: trains the region's model and saves it as a new version in the registry.
+    """
+    # Imported here so the web process doesn't need them just to submit jobs
+    from earthquake_data_fetcher import EarthquakeDataFetcher
+    from model_registry import RegionModelRegistry
+
+    JobStore(db_path).update(job_id, status="running", started_at=time.time())
+    fetcher = EarthquakeDataFetcher(region_models=RegionModelRegistry(registry_root, cell_deg))
+    return fetcher.train_region(events, region, features=features)
+
+
+class TrainingQueue:
+    """
+    Runs model training in a bounded pool of worker processes, so HTTP workers never block on model.fit.
+    Submitting for a region that already has a queued or running job returns that job instead.
+    """
+
+    def __init__(self, job_store, region_models, max_workers=1, features=("mag",)):
+        self.job_store = job_store
+        self.region_models = region_models
+        self.max_workers = max_workers
+        self.features = tuple(features)  # Input columns of the models trained
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that runs server threads (and possibly TensorFlow) isn't safe
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def submit(self, region, events):
+        """
+        Queues training of the region's model on events (an EventBatch). Returns the job as a dict.
+        """
+        job, created = self.job_store.create(region, len(events))
+        if not created:
+            return job
+
+        try:
+            future = self._pool().submit(_run_training_job, job["id"], self.job_store.db_path,
+                                         self.region_models.root_dir, self.region_models.cell_deg, region, events,
+                                         self.features)
+        except Exception as e:
+            self.job_store.update(job["id"], status="failed", finished_at=time.time(), error=str(e))
+            raise
+        future.add_done_callback(lambda done: self._finished(job["id"], done))
+        logging.info(f"Queued training job {job['id']} for region {region}")
+        return job
+
+    def _finished(self, job_id, future):
+        try:
+            version = future.result()
+            self.job_store.update(job_id, status="succeeded", finished_at=time.time(), model_version=version)
+            logging.info(f"Training job {job_id} finished, model version {version}")
+        except Exception as e:
+            logging.error(f"Training job {job_id} failed: {e}")
+            self.job_store.update(job_id, status="failed", finished_at=time.time(), error=str(e))
+
+    def get(self, job_id):
+        return self.job_store.get(job_id)